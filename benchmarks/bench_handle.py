@@ -0,0 +1,171 @@
+"""
+Microbenchmarks on generated logs:
+  - parse_log_line over every line of a multi-language log
+  - get_safe_code_snippet on a large source file (cold and warm index)
+  - handle_new_log end to end against the local LLM/webhook/SMTP stubs
+
+Usage: python -m benchmarks.bench_handle [entries] [llm_latency_ms]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+import statistics
+
+import main
+from core import parser, analyzer, notifier
+from core.segmenter import RecordSegmenter
+from benchmarks import generator
+from benchmarks.stubs import StubLLMServer, StubWebhookServer, StubSMTPServer
+
+START_PATTERN = r'\d{4}-\d{2}-\d{2} '
+
+def summarize(samples):
+    """Latency samples (seconds) -> milliseconds summary."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def generated_entries(count, seed=0):
+    """Returns `count` error entries (ERROR line + trace), segmented like the monitor would."""
+    segmenter = RecordSegmenter(start_patterns=[START_PATTERN])
+    entries = []
+    for line in generator.generate_lines(lines=count * 40, error_ratio=0.2, seed=seed):
+        for record in segmenter.feed(line):
+            if '| ERROR |' in record:
+                entries.append(record)
+        if len(entries) >= count:
+            break
+    return entries[:count]
+
+def bench_parse_log_line(lines=200000, error_ratio=0.05, seed=0):
+    log_lines = [line.rstrip("\n") for line in generator.generate_lines(lines=lines, error_ratio=error_ratio, seed=seed)]
+    start = time.perf_counter()
+    matches = sum(1 for line in log_lines if parser.parse_log_line(line))
+    elapsed = time.perf_counter() - start
+    return {
+        'lines': len(log_lines),
+        'matches': matches,
+        'seconds': elapsed,
+        'lines_per_second': len(log_lines) / elapsed,
+    }
+
+def bench_code_snippet(file_lines=200000, lookups=2000, seed=0):
+    rng = random.Random(seed)
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+        for i in range(file_lines):
+            f.write(f"    value_{i} = compute(value_{i - 1}) if value_{i - 1} else None\n")
+        path = f.name
+    try:
+        analyzer.snippet_cache = analyzer.SnippetCache()
+        start = time.perf_counter()
+        analyzer.get_safe_code_snippet(path, file_lines // 2)
+        cold = time.perf_counter() - start
+
+        samples = []
+        for _ in range(lookups):
+            line_number = rng.randint(1, file_lines)
+            start = time.perf_counter()
+            analyzer.get_safe_code_snippet(path, line_number)
+            samples.append(time.perf_counter() - start)
+    finally:
+        os.unlink(path)
+    return {'file_lines': file_lines, 'cold_ms': cold * 1000, 'warm': summarize(samples)}
+
+def stub_config(llm, webhooks, smtp, project_path):
+    return {
+        'monitoring': {'trigger_levels': ['ERROR', 'CRITICAL', 'FATAL', 'EXCEPTION']},
+        'ai_analysis': {
+            'enabled': True,
+            'model': 'openai/stub-model',
+            'api_base': llm.url,
+            'model_api_key': 'stub-key',
+            'enable_code_context': True,
+            'cache': {'enabled': False},
+        },
+        'notifications': {
+            'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack')},
+            'discord': {'enabled': True, 'webhook_url': webhooks.url_for('/discord')},
+            'email': {
+                'enabled': True,
+                'smtp_server': '127.0.0.1',
+                'smtp_port': smtp.port,
+                'starttls': False,
+                'sender_email': 'bench@example.com',
+                'password': 'stub',
+                'recipients': ['oncall@example.com'],
+            },
+        },
+    }
+
+def bench_handle_new_log(entries=50, llm_latency=0.05, webhook_latency=0.01, smtp_latency=0.01, seed=0):
+    with StubLLMServer(latency=llm_latency) as llm, \
+            StubWebhookServer(latency=webhook_latency) as webhooks, \
+            StubSMTPServer(latency=smtp_latency) as smtp, \
+            tempfile.TemporaryDirectory() as project_path:
+        config = stub_config(llm, webhooks, smtp, project_path)
+        notifier._dispatcher = None
+        dispatcher = notifier.get_dispatcher(config)
+
+        samples = []
+        wall_start = time.perf_counter()
+        for entry in generated_entries(entries, seed):
+            start = time.perf_counter()
+            main.handle_new_log(entry, 'bench-service', project_path, config)
+            samples.append(time.perf_counter() - start)
+        dispatcher.join()
+        wall = time.perf_counter() - wall_start
+
+        stats = dispatcher.stats()
+        dispatcher.close()
+        notifier._dispatcher = None
+        notifier.close_smtp_connections()
+
+        return {
+            'entries': len(samples),
+            'llm_latency_ms': llm_latency * 1000,
+            'handle_new_log': summarize(samples),
+            'wall_seconds': wall,
+            'llm_requests': len(llm.requests),
+            'webhook_posts': len(webhooks.requests),
+            'emails': len(smtp.requests),
+            'notifications': {
+                name: {key: channel[key] for key in ('sent', 'failed', 'dropped', 'avg_latency')}
+                for name, channel in stats.items()
+            },
+        }
+
+def run(entries=50, llm_latency=0.05):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {
+        'parse_log_line': bench_parse_log_line(),
+        'get_safe_code_snippet': bench_code_snippet(),
+        'handle_new_log': bench_handle_new_log(entries=entries, llm_latency=llm_latency),
+    }
+
+    parse = results['parse_log_line']
+    print(f"parse_log_line: {parse['lines_per_second']:,.0f} lines/s ({parse['matches']} matches in {parse['lines']} lines)")
+    snippet = results['get_safe_code_snippet']
+    print(f"get_safe_code_snippet: cold {snippet['cold_ms']:.1f} ms, warm p50 {snippet['warm']['p50_ms']:.3f} ms")
+    handle = results['handle_new_log']
+    print(f"handle_new_log ({handle['entries']} entries, LLM latency {handle['llm_latency_ms']:.0f} ms): "
+          f"p50 {handle['handle_new_log']['p50_ms']:.1f} ms, p95 {handle['handle_new_log']['p95_ms']:.1f} ms, "
+          f"{handle['webhook_posts']} webhook posts, {handle['emails']} emails")
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(entries=int(args[0]) if len(args) > 0 else 50,
+        llm_latency=float(args[1]) / 1000 if len(args) > 1 else 0.05)
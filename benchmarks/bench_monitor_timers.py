@@ -0,0 +1,94 @@
+"""
+Benchmark: per-event threading.Timer debounce (the old LogMonitor._reset_timer)
+vs. the shared DeadlineScheduler, under a sustained write rate.
+
+Usage: python -m benchmarks.bench_monitor_timers [monitors] [events_per_sec] [seconds]
+"""
+import sys
+import time
+import threading
+
+from core.scheduler import DeadlineScheduler
+
+class LegacyTimerDebounce:
+    """The pre-scheduler implementation: cancel and start a new Timer per event."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.timer = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush)
+            self.timer.start()
+
+    def flush(self):
+        pass
+
+class SchedulerDebounce:
+    def __init__(self, delay, scheduler):
+        self.delay = delay
+        self.scheduler = scheduler
+
+    def reset(self):
+        self.scheduler.schedule(self, self.delay, self.flush)
+
+    def flush(self):
+        pass
+
+def drive(debouncers, events_per_sec, seconds):
+    """Calls reset() on every debouncer at the given rate and samples the thread count."""
+    peak_threads = threading.active_count()
+    interval = 1.0 / events_per_sec
+    batch = max(1, events_per_sec // 1000)   # events per ~1 ms tick
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    next_tick = wall_start
+    events = 0
+
+    while time.monotonic() - wall_start < seconds:
+        for _ in range(batch):
+            for debouncer in debouncers:
+                debouncer.reset()
+            events += 1
+        peak_threads = max(peak_threads, threading.active_count())
+        next_tick += interval * batch
+        sleep_for = next_tick - time.monotonic()
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+
+    return {
+        'events': events * len(debouncers),
+        'cpu_seconds': time.process_time() - cpu_start,
+        'wall_seconds': time.monotonic() - wall_start,
+        'peak_threads': peak_threads,
+    }
+
+def run(monitors=4, events_per_sec=5000, seconds=2.0, delay=0.5):
+    results = {}
+
+    legacy = [LegacyTimerDebounce(delay) for _ in range(monitors)]
+    results['threading.Timer'] = drive(legacy, events_per_sec, seconds)
+    for debouncer in legacy:
+        debouncer.timer.cancel()
+    time.sleep(0.1)
+
+    scheduler = DeadlineScheduler()
+    shared = [SchedulerDebounce(delay, scheduler) for _ in range(monitors)]
+    results['DeadlineScheduler'] = drive(shared, events_per_sec, seconds)
+    scheduler.stop()
+
+    print(f"{monitors} monitors x {events_per_sec} writes/s for {seconds}s")
+    for name, result in results.items():
+        print(f"  {name:<18} events={result['events']:>7}  cpu={result['cpu_seconds']:6.2f}s  "
+              f"peak_threads={result['peak_threads']}")
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(monitors=int(args[0]) if len(args) > 0 else 4,
+        events_per_sec=int(args[1]) if len(args) > 1 else 5000,
+        seconds=float(args[2]) if len(args) > 2 else 2.0)
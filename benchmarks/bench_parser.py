@@ -0,0 +1,71 @@
+"""
+Microbenchmark: per-line parse_log_line loop vs. single-pass parse_entry.
+
+Usage: python -m benchmarks.bench_parser [frames]
+"""
+import sys
+import timeit
+
+from core import parser
+
+def build_java_trace(frames):
+    lines = ["2024-01-31 12:00:01 ERROR Unhandled exception",
+             "java.lang.IllegalStateException: connection pool exhausted"]
+    for i in range(frames):
+        if i % 10 == 0:
+            lines.append(f"\tat com.example.service.Handler.handle{i}(Handler.java:{i + 1})")
+        else:
+            lines.append(f"\tat org.framework.internal.Dispatcher.invoke{i}(Dispatcher.java:{i + 1})")
+    return "\n".join(lines) + "\n"
+
+def build_noisy_python_entry(lines):
+    """A Python traceback followed by a long tail of unrelated log lines."""
+    out = ["2024-01-31 12:00:01 ERROR Traceback (most recent call last):",
+           '  File "/usr/lib/python3.11/site-packages/flask/app.py", line 1478, in wsgi_app',
+           '  File "app/views.py", line 42, in index',
+           "ZeroDivisionError: division by zero"]
+    for i in range(lines):
+        out.append(f"2024-01-31 12:00:{i % 60:02d} INFO worker-{i % 8} processed request id={i} in {i % 97} ms")
+    return "\n".join(out) + "\n"
+
+def per_line_best_match(entry):
+    """The original handle_new_log loop, kept here as the baseline."""
+    best_match = None
+    for line in reversed(entry.strip().split('\n')):
+        parsed = parser.parse_log_line(line)
+        if parsed:
+            if not parser.is_library_path(parsed['filepath']):
+                best_match = parsed
+                break
+            if not best_match:
+                best_match = parsed
+    return best_match
+
+def full_per_line_scan(entry):
+    return [p for p in map(parser.parse_log_line, entry.strip().split('\n')) if p]
+
+def run(frames=2000, repeat=5, number=20):
+    scenarios = [(f'java trace, {frames} frames', build_java_trace(frames)),
+                 (f'python trace + {frames} noise lines', build_noisy_python_entry(frames))]
+
+    results = {}
+    for scenario, entry in scenarios:
+        assert full_per_line_scan(entry) == parser.parse_entry(entry)['frames']
+        assert per_line_best_match(entry) == parser.parse_entry(entry)['best_match']
+        print(scenario)
+
+        timings = {}
+        for name, func in [('parse_log_line (all frames)', full_per_line_scan),
+                           ('parse_log_line (best match)', per_line_best_match),
+                           ('parse_entry', parser.parse_entry)]:
+            best = min(timeit.repeat(lambda: func(entry), repeat=repeat, number=number)) / number
+            timings[name] = best
+            print(f"  {name:<30} {best * 1000:8.3f} ms/entry")
+
+        speedup = timings['parse_log_line (all frames)'] / timings['parse_entry']
+        print(f"  parse_entry speedup over per-line scan: {speedup:.1f}x")
+        results[scenario] = timings
+    return results
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
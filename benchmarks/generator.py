@@ -0,0 +1,136 @@
+"""
+Synthetic log generator with realistic stack traces for every language in
+parser.PATTERNS.
+
+Usage: python -m benchmarks.generator OUTPUT [--lines N] [--error-ratio R] [--seed S]
+"""
+import random
+import argparse
+from datetime import datetime, timedelta
+
+LANGUAGES = ['python', 'node', 'php', 'ruby', 'java', 'rust', 'go', 'cpp']
+
+INFO_MESSAGES = [
+    "GET /api/v1/users/{id} 200 in {ms} ms",
+    "worker-{worker} processed job {id} in {ms} ms",
+    "cache hit ratio {ratio}% over the last {id} requests",
+    "connection pool size={worker} idle={ms}",
+    "scheduled task sync_accounts finished, {id} rows updated",
+]
+
+def _python_trace(rng, depth):
+    frames = ["Traceback (most recent call last):"]
+    for i in range(depth):
+        if i < depth // 2:
+            frames.append(f'  File "/usr/lib/python3.11/site-packages/flask/app.py", line {rng.randint(100, 2000)}, in wsgi_app')
+            frames.append("    response = self.full_dispatch_request()")
+        else:
+            frames.append(f'  File "app/services/billing.py", line {rng.randint(10, 400)}, in charge_{i}')
+            frames.append("    total = amount / quantity")
+    frames.append("ZeroDivisionError: division by zero")
+    return frames
+
+def _node_trace(rng, depth):
+    frames = ["TypeError: Cannot read properties of undefined (reading 'id')"]
+    for i in range(depth):
+        path = "/app/node_modules/express/lib/router/layer.js" if i % 3 else "/app/src/routes/orders.js"
+        frames.append(f"    at handler{i} ({path}:{rng.randint(1, 300)}:{rng.randint(1, 80)})")
+    return frames
+
+def _php_trace(rng, depth):
+    frames = [f"PHP Fatal error:  Uncaught Error: Call to a member function save() on null in /var/www/html/app/Order.php:{rng.randint(10, 300)}"]
+    for i in range(depth):
+        frames.append(f"#{i} /var/www/html/vendor/laravel/framework/src/Router.php({rng.randint(10, 900)}): dispatch()")
+    return frames
+
+def _ruby_trace(rng, depth):
+    frames = ["NoMethodError (undefined method `name' for nil:NilClass):"]
+    for i in range(depth):
+        frames.append(f"app/controllers/users_controller.rb:{rng.randint(5, 200)}:in `show'")
+    return frames
+
+def _java_trace(rng, depth):
+    frames = ["java.lang.NullPointerException: Cannot invoke \"Order.getId()\" because \"order\" is null"]
+    for i in range(depth):
+        if i % 4 == 0:
+            frames.append(f"\tat com.example.orders.OrderService.process(OrderService.java:{rng.randint(10, 500)})")
+        else:
+            frames.append(f"\tat org.springframework.web.servlet.FrameworkServlet.service{i}(FrameworkServlet.java:{rng.randint(10, 900)})")
+    frames.append(f"\t... {rng.randint(10, 60)} more")
+    return frames
+
+def _rust_trace(rng, depth):
+    return [f"thread 'main' panicked at src/main.rs:{rng.randint(5, 200)}:{rng.randint(1, 40)}:",
+            "index out of bounds: the len is 3 but the index is 7",
+            "note: run with `RUST_BACKTRACE=1` environment variable to display a backtrace"]
+
+def _go_trace(rng, depth):
+    frames = ["panic: runtime error: invalid memory address or nil pointer dereference", "", "goroutine 1 [running]:"]
+    for i in range(depth):
+        frames.append(f"main.handler{i}(0xc000012345)")
+        frames.append(f"\t/home/app/cmd/server/main.go:{rng.randint(5, 300)} +0x{rng.randint(16, 4095):x}")
+    return frames
+
+def _cpp_trace(rng, depth):
+    return [f"src/engine/physics.cpp:{rng.randint(5, 900)}:{rng.randint(1, 40)}: error: 'velocity' was not declared in this scope"]
+
+TRACE_BUILDERS = {
+    'python': _python_trace,
+    'node': _node_trace,
+    'php': _php_trace,
+    'ruby': _ruby_trace,
+    'java': _java_trace,
+    'rust': _rust_trace,
+    'go': _go_trace,
+    'cpp': _cpp_trace,
+}
+
+def generate_trace(lang, rng=None, depth=8):
+    """Returns the lines of one stack trace in the given language."""
+    rng = rng or random.Random()
+    return TRACE_BUILDERS[lang](rng, depth)
+
+def generate_lines(lines=10000, error_ratio=0.01, languages=None, seed=0, depth=8, start=None):
+    """
+    Yields log lines: mostly INFO noise, with an ERROR line followed by a stack
+    trace in a random language for about `error_ratio` of the records.
+    """
+    rng = random.Random(seed)
+    languages = languages or LANGUAGES
+    timestamp = start or datetime(2024, 1, 31, 12, 0, 0)
+    emitted = 0
+    while emitted < lines:
+        timestamp += timedelta(milliseconds=rng.randint(1, 50))
+        stamp = timestamp.strftime('%Y-%m-%d %H:%M:%S,') + f"{timestamp.microsecond // 1000:03d}"
+        if rng.random() < error_ratio:
+            lang = rng.choice(languages)
+            yield f"{stamp} | ERROR | Unhandled exception in request {rng.randint(1, 10**6)}\n"
+            emitted += 1
+            for frame in generate_trace(lang, rng, depth):
+                yield frame + "\n"
+                emitted += 1
+        else:
+            message = rng.choice(INFO_MESSAGES).format(
+                id=rng.randint(1, 10**6), ms=rng.randint(1, 900), worker=rng.randint(1, 16), ratio=rng.randint(50, 99))
+            yield f"{stamp} | INFO | {message}\n"
+            emitted += 1
+
+def write_log(path, **kwargs):
+    """Writes a generated log to `path`. Returns the number of bytes written."""
+    size = 0
+    with open(path, 'w') as f:
+        for line in generate_lines(**kwargs):
+            f.write(line)
+            size += len(line)
+    return size
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("output")
+    arg_parser.add_argument("--lines", type=int, default=100000)
+    arg_parser.add_argument("--error-ratio", type=float, default=0.01)
+    arg_parser.add_argument("--depth", type=int, default=8)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    written = write_log(args.output, lines=args.lines, error_ratio=args.error_ratio, depth=args.depth, seed=args.seed)
+    print(f"Wrote {written / (1024 * 1024):.1f} MB to {args.output}")
@@ -0,0 +1,55 @@
+"""
+Runs every benchmark and saves the results as JSON for regression tracking.
+
+Usage: python -m benchmarks.run_all [--output PATH] [--quick]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+from benchmarks import bench_parser, bench_monitor_timers, bench_handle
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(__file__), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(quick=False):
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': {},
+    }
+    benchmarks = results['benchmarks']
+    if quick:
+        benchmarks['parser'] = bench_parser.run(frames=500, repeat=3, number=5)
+        benchmarks['monitor_timers'] = bench_monitor_timers.run(seconds=0.5)
+        benchmarks['handle'] = bench_handle.run(entries=10)
+    else:
+        benchmarks['parser'] = bench_parser.run()
+        benchmarks['monitor_timers'] = bench_monitor_timers.run()
+        benchmarks['handle'] = bench_handle.run()
+    return results
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/<timestamp>.json)")
+    arg_parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast sanity run")
+    args = arg_parser.parse_args()
+
+    results = run(quick=args.quick)
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
@@ -0,0 +1,258 @@
+"""
+Local stand-ins for the external services the analyzer talks to, so the
+end-to-end path can be benchmarked without network access or API keys.
+
+- StubLLMServer: OpenAI-compatible /chat/completions endpoint (plain and
+  streamed). Point litellm at it with model "openai/<anything>" and api_base=server.url.
+- StubWebhookServer: accepts Slack/Discord webhook posts and Discord message edits.
+- StubSMTPServer: minimal plaintext SMTP server (EHLO, AUTH, MAIL/RCPT/DATA).
+
+Every stub has a configurable latency and records what it received.
+"""
+import json
+import time
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+class _StubServer:
+    """Runs a server on 127.0.0.1 (random port) in a background thread."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _make_server(self):
+        raise NotImplementedError
+
+    def record(self, item):
+        with self._lock:
+            self.requests.append(item)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._server = self._make_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+# ==========================================
+#  LLM
+# ==========================================
+class StubLLMServer(_StubServer):
+    """
+    Answers chat completion requests with a fixed reply after `latency` seconds.
+    Streamed requests get the reply word by word, `token_latency` seconds apart.
+    Reported usage counts are rough (4 characters per token).
+    """
+
+    def __init__(self, latency=0.0, reply="The variable is None here; add a guard before using it.", token_latency=0.0):
+        super().__init__(latency)
+        self.reply = reply
+        self.token_latency = token_latency
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def _make_server(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                stub.record(body)
+                time.sleep(stub.latency)
+                if body.get('stream'):
+                    self.stream(body)
+                    return
+                prompt_chars = sum(len(str(m.get('content', ''))) for m in body.get('messages', []))
+                response = {
+                    "id": f"chatcmpl-stub-{len(stub.requests)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get('model', 'stub'),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": stub.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_chars // 4,
+                        "completion_tokens": len(stub.reply) // 4,
+                        "total_tokens": (prompt_chars + len(stub.reply)) // 4,
+                    },
+                }
+                data = json.dumps(response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                words = stub.reply.split(' ')
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": "chatcmpl-stub-stream",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get('model', 'stub'),
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": word if i == 0 else f" {word}"},
+                            "finish_reason": "stop" if i == len(words) - 1 else None,
+                        }],
+                    }
+                    try:
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                    except OSError:
+                        return
+                    time.sleep(stub.token_latency)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        return _StubHTTPServer(('127.0.0.1', 0), Handler)
+
+# ==========================================
+#  WEBHOOKS
+# ==========================================
+class StubWebhookServer(_StubServer):
+    """
+    Accepts JSON posts on any path (Slack and Discord webhooks) and replies
+    `status`. Like Discord, `?wait=true` posts get the message id back, and
+    PATCH requests (message edits) are recorded too. `responses` is a list of
+    (status, headers) answered first, in order, e.g. to simulate a 429.
+    """
+
+    def __init__(self, latency=0.0, status=200, responses=()):
+        super().__init__(latency)
+        self.status = status
+        self.responses = list(responses)
+
+    def next_response(self):
+        with self._lock:
+            return self.responses.pop(0) if self.responses else (self.status, {})
+
+    def url_for(self, path="/webhook"):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def _make_server(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.record({'method': 'POST', 'path': self.path, 'body': json.loads(body or b"{}")})
+                time.sleep(stub.latency)
+                data = b"ok"
+                if 'wait=true' in self.path:
+                    data = json.dumps({'id': str(len(stub.requests))}).encode('utf-8')
+                status, headers = stub.next_response()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_PATCH(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.record({'method': 'PATCH', 'path': self.path, 'body': json.loads(body or b"{}")})
+                time.sleep(stub.latency)
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+        return _StubHTTPServer(('127.0.0.1', 0), Handler)
+
+# ==========================================
+#  SMTP
+# ==========================================
+class StubSMTPServer(_StubServer):
+    """
+    Speaks just enough SMTP for smtplib: EHLO, AUTH (accepts anything),
+    MAIL, RCPT, DATA, RSET, NOOP and QUIT. No TLS, so the email channel must
+    be configured with `starttls: false`. `latency` is applied per message.
+    """
+
+    def _make_server(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b"\r\n")
+
+            def handle(self):
+                self.reply("220 stub ESMTP ready")
+                envelope = {}
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self.wfile.write(b"250-stub\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                    elif verb == 'HELO':
+                        self.reply("250 stub")
+                    elif verb == 'AUTH':
+                        self.reply("235 Authentication successful")
+                    elif verb == 'MAIL':
+                        envelope = {'from': command[10:].strip('<> '), 'to': []}
+                        self.reply("250 OK")
+                    elif verb == 'RCPT':
+                        envelope.setdefault('to', []).append(command[8:].strip('<> '))
+                        self.reply("250 OK")
+                    elif verb == 'DATA':
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        for data_line in self.rfile:
+                            if data_line in (b".\r\n", b".\n"):
+                                break
+                            data.append(data_line)
+                        time.sleep(stub.latency)
+                        stub.record({**envelope, 'data': b"".join(data).decode('utf-8', 'replace')})
+                        self.reply("250 OK queued")
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply("250 OK")
+                    elif verb == 'QUIT':
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        return server
@@ -1,10 +1,113 @@
 import os
+import time
+import queue
 import logging
+import threading
+from array import array
+from itertools import accumulate
+from collections import OrderedDict
 from litellm import completion
+from core import cache, metrics
+from core.prompt import build_prompt
 
 logger = logging.getLogger(__name__)
 logging.getLogger('LiteLLM').setLevel(logging.WARNING)
 
+INDEX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_STREAM_DEADLINE = 120
+SYSTEM_PROMPT = "You are an expert developer and debugging assistant. Provide clear, concise explanations and exact code fixes."
+_STREAM_END = object()
+
+class SnippetCache:
+    """
+    LRU cache of per-file line-offset indexes, keyed by (path, mtime, size).
+
+    The index is a compact array of the byte offset at which every line starts,
+    so a window of lines is served with a single seek + read instead of loading
+    the whole file. Any change to the file changes its key, so a stale index is
+    never used.
+    """
+
+    def __init__(self, max_files=128):
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_index(f, size):
+        """Scans the file in 1 MiB chunks, recording the offset after every newline."""
+        offsets = array('Q', [0])
+        base = 0
+        while True:
+            chunk = f.read(INDEX_CHUNK_SIZE)
+            if not chunk:
+                break
+            segments = chunk.split(b"\n")
+            segments.pop()  # text after the last newline in this chunk
+            offsets.extend(map(base.__add__, accumulate(len(segment) + 1 for segment in segments)))
+            base += len(chunk)
+        # A final newline doesn't start another line
+        if len(offsets) > 1 and offsets[-1] == size:
+            offsets.pop()
+        return offsets
+
+    def _get_index(self, full_path, f):
+        stat = os.fstat(f.fileno())
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            offsets = self._indexes.get(key)
+            if offsets is not None:
+                self._indexes.move_to_end(key)
+                self.hits += 1
+                return offsets, stat.st_size
+            self.misses += 1
+
+        offsets = self._build_index(f, stat.st_size)
+        with self._lock:
+            # Drop indexes of older versions of the same file
+            for stale in [k for k in self._indexes if k[0] == full_path]:
+                del self._indexes[stale]
+            self._indexes[key] = offsets
+            while len(self._indexes) > self.max_files:
+                self._indexes.popitem(last=False)
+        return offsets, stat.st_size
+
+    def read_window(self, full_path, line_number, context_window):
+        """Returns (first_line_index, lines) for the lines around line_number (1-based)."""
+        with open(full_path, 'rb') as f:
+            offsets, size = self._get_index(full_path, f)
+            total_lines = len(offsets) if size else 0
+
+            # Calculate the safe window (avoiding negative numbers or going past the end)
+            start_index = max(0, line_number - context_window - 1)
+            end_index = min(total_lines, line_number + context_window)
+            if start_index >= end_index:
+                return start_index, []
+
+            start_offset = offsets[start_index]
+            end_offset = offsets[end_index] if end_index < total_lines else size
+            f.seek(start_offset)
+            data = f.read(end_offset - start_offset)
+
+        # Split like the index: only on "\n" (splitlines would also break on \f, \v, \x85, ...)
+        lines = data.decode('utf-8').split("\n")
+        if data.endswith(b"\n"):
+            lines.pop()
+        return start_index, [line.rstrip("\r") for line in lines]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'files': len(self._indexes),
+                'index_bytes': sum(offsets.itemsize * len(offsets) for offsets in self._indexes.values()),
+            }
+
+snippet_cache = SnippetCache()
+
 def get_safe_code_snippet(full_path, line_number, context_window=10):
     """
     Reads the file LOCALLY and returns only a specific window of code.
@@ -14,27 +117,114 @@ def get_safe_code_snippet(full_path, line_number, context_window=10):
         return f"File not found at: {full_path}"
 
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-            
-            # Calculate the safe window (avoiding negative numbers or going past the end)
-            start_index = max(0, line_number - context_window - 1)
-            end_index = min(len(all_lines), line_number + context_window)
-            
-            snippet_lines = all_lines[start_index:end_index]
+        start_index, snippet_lines = snippet_cache.read_window(full_path, line_number, context_window)
+
+        # Add line numbers and an arrow pointing to the exact error line
+        formatted_snippet = []
+        for i, line in enumerate(snippet_lines):
+            current_line_num = start_index + i + 1
+            pointer = ">> " if current_line_num == line_number else "   "
+            formatted_snippet.append(f"{pointer}{current_line_num}: {line.rstrip()}")
             
-            # Add line numbers and an arrow pointing to the exact error line
-            formatted_snippet = []
-            for i, line in enumerate(snippet_lines):
-                current_line_num = start_index + i + 1
-                pointer = ">> " if current_line_num == line_number else "   "
-                formatted_snippet.append(f"{pointer}{current_line_num}: {line.rstrip()}")
-                
-            return "\n".join(formatted_snippet)
+        return "\n".join(formatted_snippet)
             
     except Exception as e:
         return f"Error reading local file: {str(e)}"
 
+def _stream_completion(model, request, deadline):
+    """
+    Streams a completion and collects the text until the stream ends or
+    `deadline` seconds pass. The stream is consumed in a helper thread, so a
+    model that stalls mid-answer cannot hold us past the deadline.
+    Returns (text, complete).
+    """
+    chunks = queue.Queue()
+
+    def consume():
+        try:
+            for chunk in completion(**request, stream=True, timeout=deadline):
+                choices = getattr(chunk, 'choices', None)
+                text = choices[0].delta.content if choices else None
+                if text:
+                    chunks.put(text)
+            chunks.put(_STREAM_END)
+        except Exception as e:
+            chunks.put(e)
+
+    threading.Thread(target=consume, name="llm-stream", daemon=True).start()
+
+    start = time.perf_counter()
+    ends_at = start + deadline
+    parts = []
+    while True:
+        remaining = ends_at - time.perf_counter()
+        try:
+            if remaining <= 0:
+                raise queue.Empty
+            item = chunks.get(timeout=remaining)
+        except queue.Empty:
+            return "".join(parts), False
+        if item is _STREAM_END:
+            return "".join(parts), True
+        if isinstance(item, Exception):
+            if not parts:
+                raise item
+            logger.warning(f"AI stream broke off after {len(parts)} chunks: {item}")
+            return "".join(parts), False
+        if not parts:
+            ttft = time.perf_counter() - start
+            metrics.LLM_TTFT.labels(model).observe(ttft)
+            logger.info(f"First token from {model} after {ttft:.2f}s")
+        parts.append(item)
+
+def build_code_context(parsed_data, project_path, ai_config):
+    """The prompt section with the code around the error, or None when disabled or unknown."""
+    if not (ai_config.get('enable_code_context') and parsed_data):
+        return None
+    file_path = parsed_data['filepath']
+    line_num = parsed_data['lineno']
+    lang_type = parsed_data.get('type', 'text')
+
+    # Resolve the full path based on the project_root in config
+    full_path = os.path.join(project_path, file_path)
+    snippet = get_safe_code_snippet(full_path, line_num)
+
+    code_context = f"Here is the surrounding code from `{file_path}` around line {line_num}:\n"
+    code_context += f"```{lang_type}\n{snippet}\n```\n\n"
+    return code_context
+
+def complete(model, messages, ai_config):
+    """One (non-streamed) completion call, with latency, error and token metrics. Raises on failure."""
+    start = time.perf_counter()
+    try:
+        # LiteLLM standardizes this call for OpenAI, Anthropic, Gemini, Ollama, etc.
+        response = completion(
+            model=model,
+            messages=messages,
+            api_base=ai_config.get('api_base'),
+            api_key=ai_config.get('model_api_key')
+        )
+        content = response.choices[0].message.content
+    except Exception:
+        metrics.LLM_ERRORS.labels(model).inc()
+        raise
+    finally:
+        metrics.LLM_SECONDS.labels(model).observe(time.perf_counter() - start)
+
+    usage = getattr(response, 'usage', None)
+    for kind in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{kind}_tokens', None)
+        if isinstance(tokens, int):
+            metrics.LLM_TOKENS.labels(model, kind).inc(tokens)
+    return content
+
+def is_cached(log_entry, parsed_data, config):
+    """True when analyze_error would answer this entry from the cache right away."""
+    if not config.get('ai_analysis', {}).get('enabled', False):
+        return False
+    response_cache = cache.get_cache(config)
+    return bool(response_cache) and response_cache.contains(cache.error_fingerprint(log_entry, parsed_data))
+
 def analyze_error(log_entry, parsed_data, project_path, config):
     """
     Constructs the prompt and sends it to the configured AI provider.
@@ -43,34 +233,26 @@ def analyze_error(log_entry, parsed_data, project_path, config):
     if not ai_config.get('enabled', False):
         return "AI Analysis is disabled in config."
 
-    # 1. Base Prompt
-    prompt = f"I found an error in my logs:\n`{log_entry.strip()}`\n\n"
-
-    # 2. Add Code Context (If enabled and parser found a file)
-    if ai_config.get('enable_code_context') and parsed_data:
-        file_path = parsed_data['filepath']
-        line_num = parsed_data['lineno']
-        lang_type = parsed_data.get('type', 'text')
-        
-        # Resolve the full path based on the project_root in config
-        project_root = project_path 
-        full_path = os.path.join(project_root, file_path)
-        
-        snippet = get_safe_code_snippet(full_path, line_num)
-        
-        prompt += f"Here is the surrounding code from `{file_path}` around line {line_num}:\n"
-        prompt += f"```{lang_type}\n{snippet}\n```\n\n"
-    else:
-        prompt += "(No local code context was provided. Please give a general fix based on the log message.)\n\n"
-
-    prompt += "Please explain what might be causing this error and suggest a code fix."
-
-    # 3. Setup API Key (from env vars if configured)
-    api_key = ai_config.get('model_api_key')
-
-    # 4. Prepare LiteLLM Call
+    # 0. Repeated errors are answered from the cache without calling the model
+    response_cache = cache.get_cache(config)
+    fingerprint = None
+    if response_cache:
+        fingerprint = cache.error_fingerprint(log_entry, parsed_data)
+        cached = response_cache.get(fingerprint)
+        if cached is not None:
+            metrics.LLM_CACHE_HITS.inc()
+            logger.info(f"AI analysis served from cache ({fingerprint[:12]}).")
+            return cached
+
+    # 1. Code Context (If enabled and parser found a file)
+    code_context = build_code_context(parsed_data, project_path, ai_config)
+
+    # 2. Prompt, with the log entry compacted to fit the token budget
+    prompt = build_prompt(log_entry, code_context, ai_config['model'], ai_config.get('prompt'))
+
+    # 3. Prepare LiteLLM Call
     messages = [
-        {"role": "system", "content": "You are an expert developer and debugging assistant. Provide clear, concise explanations and exact code fixes."},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
     ]
 
@@ -78,15 +260,49 @@ def analyze_error(log_entry, parsed_data, project_path, config):
     # logger.debug(f"Prompt:\n{prompt}...")
     
 
+    model = ai_config['model']
+    streaming_config = ai_config.get('streaming', {}) or {}
+    if streaming_config.get('enabled'):
+        return _analyze_streaming(model, messages, ai_config, streaming_config, response_cache, fingerprint)
+
     try:
-        # LiteLLM standardizes this call for OpenAI, Anthropic, Gemini, Ollama, etc.
-        response = completion(
-            model=ai_config['model'],
-            messages=messages,
-            api_base=ai_config.get('api_base'),
-            api_key=api_key
-        )
-        # logger.info(f"AI response received. {response.choices[0].message.content}")
-        return response.choices[0].message.content
+        content = complete(model, messages, ai_config)
+    except Exception as e:
+        return f"AI Analysis Failed: {str(e)}"
+
+    if response_cache and content:
+        response_cache.put(fingerprint, content)
+    return content
+
+def _analyze_streaming(model, messages, ai_config, streaming_config, response_cache, fingerprint):
+    """
+    Streaming variant of the completion call. If the answer isn't complete
+    within `deadline_seconds`, whatever arrived so far is returned (marked as
+    cut off) instead of nothing.
+    """
+    deadline = streaming_config.get('deadline_seconds', DEFAULT_STREAM_DEADLINE)
+    request = {
+        'model': model,
+        'messages': messages,
+        'api_base': ai_config.get('api_base'),
+        'api_key': ai_config.get('model_api_key'),
+    }
+    start = time.perf_counter()
+    try:
+        content, finished = _stream_completion(model, request, deadline)
     except Exception as e:
+        metrics.LLM_ERRORS.labels(model).inc()
         return f"AI Analysis Failed: {str(e)}"
+    finally:
+        metrics.LLM_SECONDS.labels(model).observe(time.perf_counter() - start)
+
+    if not finished:
+        metrics.LLM_TRUNCATED.labels(model).inc()
+        if not content:
+            return f"AI Analysis Failed: no response within {deadline}s"
+        logger.warning(f"AI analysis hit the {deadline}s deadline, using the partial answer.")
+        return f"{content}\n\n(Analysis cut off after {deadline}s.)"
+
+    if response_cache and content:
+        response_cache.put(fingerprint, content)
+    return content
@@ -0,0 +1,208 @@
+import os
+import gzip
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from core import cache, jsonl, triggers
+from core.segmenter import RecordSegmenter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKFILL_CHUNK = 64 * 1024 * 1024
+# Historical logs have no quiet periods to group on, so without configured start
+# patterns a record starts at a line with a timestamp or level prefix. Anything
+# else (e.g. "ValueError: bad" closing a traceback) stays with the record above.
+FALLBACK_START_PATTERNS = [
+    r'\[?\d{4}[-/]\d{2}[-/]\d{2}[T ]\d{2}:\d{2}',           # 2024-01-31 12:00:00, [2024-01-31T12:00
+    r'[A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2}',               # syslog: Jan 31 12:00:00
+    r'\[?(?:TRACE|DEBUG|INFO|NOTICE|WARN(?:ING)?|ERROR|CRITICAL|FATAL|SEVERE)\b',
+]
+
+def plan_tasks(paths, chunk_size=DEFAULT_BACKFILL_CHUNK):
+    """
+    Splits every file into byte ranges of about chunk_size. Compressed archives
+    can't be split and become a single streamed task each.
+    """
+    tasks = []
+    for path in paths:
+        if path.endswith('.gz'):
+            tasks.append((path, 0, None))
+            continue
+        size = os.path.getsize(path)
+        start = 0
+        while start < size:
+            end = min(size, start + chunk_size)
+            tasks.append((path, start, end))
+            start = end
+    return tasks
+
+def _segmenter(segmentation, matcher=None, on_drop=None):
+    segmentation = dict(segmentation or {})
+    if not segmentation.get('record_start_patterns'):
+        segmentation['record_start_patterns'] = FALLBACK_START_PATTERNS
+    return RecordSegmenter.from_config(segmentation, matcher=matcher, on_drop=on_drop)
+
+def _iter_owned_lines(task, segmenter):
+    """
+    Yields the raw lines a task is responsible for.
+
+    A range owns every record that *starts* inside it: reading begins at the
+    first record start at or after `start`, and continues past `end` until the
+    next record start so the last record is complete. Neighbouring ranges
+    therefore never split or duplicate a record.
+    """
+    path, start, end = task
+    if end is None:
+        with gzip.open(path, 'rb') as f:
+            yield from f
+        return
+
+    with open(path, 'rb') as f:
+        position = start
+        if start > 0:
+            f.seek(start - 1)
+            # If the byte before `start` isn't a newline, we're mid-line: skip to the next line
+            if f.read(1) != b"\n":
+                position += len(f.readline())
+
+        seeking_start = start > 0
+        for line in f:
+            line_start = position
+            position += len(line)
+            is_start = segmenter.is_record_start(line)
+            if seeking_start:
+                if not is_start:
+                    continue
+                seeking_start = False
+            if line_start >= end and is_start:
+                return
+            yield line
+
+def scan_task(task, config, detect):
+    """
+    Runs in a worker process: segments a byte range into entries, runs the
+    normal detection on each, and returns the distinct errors found.
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    monitoring_config = config.get('monitoring', {})
+    segmentation = monitoring_config.get('segmentation', {}) or {}
+    encoding = monitoring_config.get('encoding', 'utf-8')
+    result = {'bytes': 0, 'entries': 0, 'triggered': 0, 'errors': {}}
+
+    def count_dropped():
+        result['entries'] += 1
+
+    # Entries that can't trigger are skipped without being joined or decoded
+    matcher = triggers.from_config(monitoring_config)
+    segmenter = _segmenter(segmentation, matcher, on_drop=count_dropped)
+    # JSON-lines logs: one record per line, converted to text by the decoder
+    decoder = jsonl.from_config(monitoring_config, matcher=matcher)
+
+    def handle(record):
+        result['entries'] += 1
+        entry = record if isinstance(record, str) else record.decode(encoding, 'replace')
+        triggered, parsed = detect(entry, config)
+        if not triggered:
+            return
+        result['triggered'] += 1
+        fingerprint = cache.error_fingerprint(entry, parsed)
+        known = result['errors'].get(fingerprint)
+        if known:
+            known['count'] += 1
+        else:
+            result['errors'][fingerprint] = {'count': 1, 'entry': entry, 'parsed': parsed, 'source': task[0]}
+
+    for line in _iter_owned_lines(task, segmenter):
+        result['bytes'] += len(line)
+        if not line.strip():
+            continue
+        if decoder is not None:
+            entry = decoder.convert(line)
+            if entry is None:
+                count_dropped()
+            else:
+                handle(entry)
+            continue
+        for record in segmenter.feed(line):
+            handle(record)
+    record = segmenter.flush()
+    if record is not None:
+        handle(record)
+    return result
+
+def run_backfill(config, paths, detect, analyze, notify=None, workers=None,
+                 chunk_size=DEFAULT_BACKFILL_CHUNK, service_name="backfill", project_path="."):
+    """
+    Scans historical (and .gz rotated) logs across a process pool, deduplicates
+    the errors, and analyzes each distinct error once.
+
+    detect(entry, config) -> (triggered, parsed_data)
+    analyze(entry, parsed_data, project_path) -> analysis text
+    notify(entry, analysis, service_name), optional
+    """
+    started = time.monotonic()
+    tasks = plan_tasks(paths, chunk_size)
+    logger.info(f"Backfill: {len(paths)} files split into {len(tasks)} tasks")
+
+    totals = {'bytes': 0, 'entries': 0, 'triggered': 0}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_task, task, config, detect) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            for key in totals:
+                totals[key] += result[key]
+            for fingerprint, error in result['errors'].items():
+                known = errors.get(fingerprint)
+                if known:
+                    known['count'] += error['count']
+                else:
+                    errors[fingerprint] = error
+    scanned = time.monotonic()
+
+    analyze_workers = (config.get('pipeline', {}) or {}).get('analyze_workers', 2)
+    analyses = {}
+    with ThreadPoolExecutor(max_workers=analyze_workers) as pool:
+        futures = {
+            pool.submit(analyze, error['entry'], error['parsed'], project_path): fingerprint
+            for fingerprint, error in errors.items()
+        }
+        for future in as_completed(futures):
+            fingerprint = futures[future]
+            try:
+                analyses[fingerprint] = future.result()
+            except Exception as e:
+                analyses[fingerprint] = f"AI Analysis Failed: {e}"
+            if notify and analyses[fingerprint]:
+                error = errors[fingerprint]
+                notify(error['entry'], analyses[fingerprint], service_name)
+    finished = time.monotonic()
+
+    scan_seconds = max(scanned - started, 1e-9)
+    summary = {
+        **totals,
+        'distinct_errors': len(errors),
+        'scan_seconds': scan_seconds,
+        'analyze_seconds': finished - scanned,
+        'mb_per_second': totals['bytes'] / scan_seconds / (1024 * 1024),
+        'entries_per_second': totals['entries'] / scan_seconds,
+        'errors': [
+            {**errors[fingerprint], 'fingerprint': fingerprint, 'analysis': analyses.get(fingerprint)}
+            for fingerprint in sorted(errors, key=lambda fp: -errors[fp]['count'])
+        ],
+    }
+    return summary
+
+def print_summary(summary):
+    print(f"Scanned {summary['bytes'] / (1024 * 1024):.1f} MB, {summary['entries']} entries "
+          f"in {summary['scan_seconds']:.2f}s "
+          f"({summary['mb_per_second']:.1f} MB/s, {summary['entries_per_second']:.0f} entries/s)")
+    print(f"{summary['triggered']} error entries, {summary['distinct_errors']} distinct, "
+          f"analyzed in {summary['analyze_seconds']:.2f}s")
+    for error in summary['errors']:
+        first_line = error['entry'].strip().split('\n')[0][:120]
+        print(f"\n[{error['count']}x] {first_line}")
+        print(f"  from {error['source']}")
+        if error['analysis']:
+            print(error['analysis'])
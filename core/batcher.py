@@ -0,0 +1,172 @@
+import re
+import json
+import logging
+
+from core import analyzer, cache, metrics
+from core.prompt import count_tokens, fit_entry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 2.0
+DEFAULT_MAX_ERRORS = 8
+DEFAULT_MAX_TOKENS = 12000
+
+BATCH_INSTRUCTIONS = (
+    "I found several distinct errors in my logs. Each one is marked with an ID.\n"
+    "For every error, explain what might be causing it and suggest a code fix.\n"
+    "Reply with a single JSON object that maps each ID to its analysis as a markdown string, "
+    'for example {"E1": "...", "E2": "..."}, and nothing else.\n\n'
+)
+
+_THINK_BLOCK = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+def batch_settings(config):
+    """The ai_analysis.batching settings, or None when batching is disabled."""
+    batching = config.get('ai_analysis', {}).get('batching', {}) or {}
+    if not batching.get('enabled', False):
+        return None
+    return {
+        'window_seconds': batching.get('window_seconds', DEFAULT_WINDOW_SECONDS),
+        'max_errors': max(1, batching.get('max_errors', DEFAULT_MAX_ERRORS)),
+        'max_tokens': batching.get('max_tokens', DEFAULT_MAX_TOKENS),
+    }
+
+# ==========================================
+#  PROMPT / RESPONSE
+# ==========================================
+def error_section(error_id, entry, code_context):
+    section = f"### {error_id}\nLog entry:\n`{entry}`\n\n"
+    if code_context:
+        section += code_context
+    return section
+
+def build_batch_prompt(sections):
+    return BATCH_INSTRUCTIONS + "".join(sections)
+
+def parse_batch_response(text, error_ids):
+    """
+    Extracts {error_id: analysis} from the model's answer. Reasoning blocks and
+    code fences around the JSON are ignored. IDs missing from the answer (or
+    with an empty analysis) are left out; an unparseable answer gives {}.
+    """
+    if not text:
+        return {}
+    text = _THINK_BLOCK.sub('', text)
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        answer = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+
+    analyses = {}
+    for error_id in error_ids:
+        analysis = answer.get(error_id)
+        if isinstance(analysis, (dict, list)):
+            analysis = json.dumps(analysis, indent=2)
+        if isinstance(analysis, str) and analysis.strip():
+            analyses[error_id] = analysis.strip()
+    return analyses
+
+# ==========================================
+#  BATCHED ANALYSIS
+# ==========================================
+def _chunks(errors, model, max_errors, max_tokens):
+    """Splits the errors into requests of at most `max_errors` errors and (roughly) `max_tokens` tokens."""
+    chunk, chunk_tokens = [], count_tokens(BATCH_INSTRUCTIONS, model)
+    for error in errors:
+        tokens = count_tokens(error['section'], model)
+        if chunk and (len(chunk) >= max_errors or chunk_tokens + tokens > max_tokens):
+            yield chunk
+            chunk, chunk_tokens = [], count_tokens(BATCH_INSTRUCTIONS, model)
+        chunk.append(error)
+        chunk_tokens += tokens
+    if chunk:
+        yield chunk
+
+def _analyze_chunk(chunk, ai_config, config, response_cache):
+    """Sends one batched request. Errors the answer doesn't cover are analyzed one by one."""
+    model = ai_config['model']
+    analyses = {}
+    if len(chunk) > 1:
+        messages = [
+            {"role": "system", "content": analyzer.SYSTEM_PROMPT},
+            {"role": "user", "content": build_batch_prompt(error['section'] for error in chunk)},
+        ]
+        logger.info(f"Sending {len(chunk)} errors to AI ({model}) in one request...")
+        metrics.LLM_BATCH_SIZE.labels(model).observe(len(chunk))
+        try:
+            analyses = parse_batch_response(analyzer.complete(model, messages, ai_config), [e['id'] for e in chunk])
+        except Exception as e:
+            logger.warning(f"Batched AI request failed: {e}")
+
+    for error in chunk:
+        analysis = analyses.get(error['id'])
+        if analysis is None:
+            if len(chunk) > 1:
+                metrics.LLM_BATCH_FALLBACKS.labels(model).inc()
+                logger.info(f"No usable batched analysis for {error['id']}, asking for it on its own.")
+            entry, parsed_data, project_path = error['item']
+            analysis = analyzer.analyze_error(entry, parsed_data, project_path, config)
+        elif response_cache:
+            response_cache.put(error['fingerprint'], analysis)
+        error['analysis'] = analysis
+
+def analyze_batch(items, config):
+    """
+    Analyzes several errors with as few LLM requests as possible.
+
+    `items` is a list of (entry, parsed_data, project_path). Cached errors are
+    answered from the cache, and entries with the same fingerprint are analyzed
+    once. The remaining distinct errors go out in requests of up to
+    `max_errors` errors / `max_tokens` tokens, asking for a JSON object of
+    analyses keyed by error ID. Any error the answer doesn't cover (or all of
+    them, if the answer can't be parsed) falls back to analyze_error.
+
+    Returns the analyses in the order of `items`.
+    """
+    ai_config = config.get('ai_analysis', {})
+    if not ai_config.get('enabled', False):
+        return ["AI Analysis is disabled in config."] * len(items)
+    settings = batch_settings(config) or {'max_errors': DEFAULT_MAX_ERRORS, 'max_tokens': DEFAULT_MAX_TOKENS}
+    model = ai_config['model']
+    response_cache = cache.get_cache(config)
+
+    results = [None] * len(items)
+    distinct = {}
+    for index, (entry, parsed_data, project_path) in enumerate(items):
+        fingerprint = cache.error_fingerprint(entry, parsed_data)
+        if fingerprint in distinct:
+            distinct[fingerprint]['indexes'].append(index)
+            continue
+        if response_cache:
+            cached = response_cache.get(fingerprint)
+            if cached is not None:
+                metrics.LLM_CACHE_HITS.inc()
+                results[index] = cached
+                continue
+        distinct[fingerprint] = {
+            'item': (entry, parsed_data, project_path),
+            'fingerprint': fingerprint,
+            'indexes': [index],
+        }
+
+    errors = list(distinct.values())
+    prompt_config = ai_config.get('prompt')
+    for number, error in enumerate(errors, 1):
+        entry, parsed_data, project_path = error['item']
+        error['id'] = f"E{number}"
+        code_context = analyzer.build_code_context(parsed_data, project_path, ai_config)
+        overhead = error_section(error['id'], '', code_context)
+        error['section'] = error_section(error['id'], fit_entry(entry, overhead, model, prompt_config), code_context)
+
+    for chunk in _chunks(errors, model, settings['max_errors'], settings['max_tokens']):
+        _analyze_chunk(chunk, ai_config, config, response_cache)
+
+    for error in errors:
+        for index in error['indexes']:
+            results[index] = error['analysis']
+    return results
@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+#  FINGERPRINT NORMALIZATION
+# ==========================================
+# Order matters: timestamps and ids are replaced before the generic number rule
+# would chew them into pieces.
+NORMALIZERS = [
+    # 2024-01-31 12:00:01,123 / 2024-01-31T12:00:01.123Z / 2024/01/31 12:00:01
+    (re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<TS>'),
+    # Jan 31 12:00:01 (syslog style)
+    (re.compile(r'\b[A-Z][a-z]{2}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2}\b'), '<TS>'),
+    # 550e8400-e29b-41d4-a716-446655440000
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<UUID>'),
+    # 0x7f3a2c1b4e10
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<ADDR>'),
+    # Long hex ids such as request ids or commit hashes
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<HEX>'),
+    (re.compile(r'\d+'), '<N>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def normalize_entry(log_entry):
+    """
+    Strips the volatile parts of a log entry (timestamps, ids, addresses, numbers)
+    so repeated occurrences of the same error normalize to the same text.
+    """
+    text = log_entry.strip()
+    for regex, replacement in NORMALIZERS:
+        text = regex.sub(replacement, text)
+    return text
+
+def error_fingerprint(log_entry, parsed_data=None):
+    """
+    Returns a stable hash for an error, keyed on the normalized entry and the
+    parsed file/line location when the parser found one.
+    """
+    location = ""
+    if parsed_data:
+        location = f"{parsed_data.get('filepath')}:{parsed_data.get('lineno')}"
+    raw = f"{location}\n{normalize_entry(log_entry)}"
+    return hashlib.sha1(raw.encode('utf-8', errors='replace')).hexdigest()
+
+# ==========================================
+#  RESPONSE CACHE
+# ==========================================
+class AnalysisCache:
+    """
+    TTL + LRU cache for AI responses.
+
+    Lookups are served from an in-memory OrderedDict; every write goes through
+    to SQLite so the cache survives restarts.
+    """
+
+    def __init__(self, path, ttl_seconds=86400, max_entries=1000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        """Warms the in-memory index from disk, dropping expired rows."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            self._db.execute("DELETE FROM analysis_cache WHERE created < ?", (cutoff,))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, value, created FROM analysis_cache ORDER BY created DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            for key, value, created in reversed(rows):
+                self._entries[key] = (value, created)
+        logger.debug(f"Loaded {len(self._entries)} cached analyses from {self.path}")
+
+    def get(self, key):
+        """Returns the cached analysis for a fingerprint, or None on a miss."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, created = item
+            if time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def contains(self, key):
+        """True when a fresh analysis is cached for a fingerprint; counts neither a hit nor a miss."""
+        with self._lock:
+            item = self._entries.get(key)
+            return item is not None and time.time() - item[1] <= self.ttl_seconds
+
+    def put(self, key, value):
+        """Stores an analysis and evicts the least recently used entries past the limit."""
+        created = time.time()
+        with self._lock:
+            self._entries[key] = (value, created)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append((old_key,))
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created) VALUES (?, ?, ?)",
+                (key, value, created)
+            )
+            if evicted:
+                self._db.executemany("DELETE FROM analysis_cache WHERE key = ?", evicted)
+            self._db.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_ratio': (self.hits / total) if total else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(config):
+    """
+    Returns the shared AnalysisCache for the configured path,
+    or None if caching is disabled.
+    """
+    cache_config = config.get('ai_analysis', {}).get('cache', {}) or {}
+    if not cache_config.get('enabled', False):
+        return None
+
+    path = cache_config.get('path', '.cache/analysis_cache.sqlite3')
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            try:
+                cache = AnalysisCache(
+                    path,
+                    ttl_seconds=cache_config.get('ttl_seconds', 86400),
+                    max_entries=cache_config.get('max_entries', 1000),
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Could not open analysis cache at {path}: {e}")
+                return None
+            _caches[path] = cache
+        return cache
@@ -0,0 +1,105 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore:
+    """
+    Remembers how far each log file has been processed.
+
+    A checkpoint records the inode, device, byte offset and a hash of the
+    file's first bytes, keyed by log path. Updates only touch memory; the file
+    is rewritten (atomically, via rename) by flush(), which the shared scheduler
+    calls every `flush_interval` seconds and which is a no-op when nothing changed.
+    """
+
+    def __init__(self, path, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._checkpoints = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._checkpoints = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring unreadable checkpoint file {self.path}: {e}")
+            self._checkpoints = {}
+
+    def get(self, key):
+        with self._lock:
+            checkpoint = self._checkpoints.get(key)
+            return dict(checkpoint) if checkpoint else None
+
+    def update(self, key, inode, device, offset, head_hash, head_length):
+        checkpoint = {
+            'inode': inode,
+            'device': device,
+            'offset': offset,
+            'head_hash': head_hash,
+            'head_length': head_length,
+        }
+        with self._lock:
+            if self._checkpoints.get(key) != checkpoint:
+                self._checkpoints[key] = checkpoint
+                self._dirty = True
+
+    def flush(self):
+        """Writes the checkpoints to disk if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            snapshot = json.dumps(self._checkpoints)
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write checkpoints to {self.path}: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+        return True
+
+    def start(self, scheduler):
+        """Flushes periodically on the given DeadlineScheduler."""
+        self._scheduler = scheduler
+        self._schedule_next()
+        return self
+
+    def _schedule_next(self):
+        self._scheduler.schedule(self, self.flush_interval, self._periodic_flush)
+
+    def _periodic_flush(self):
+        self.flush()
+        if self._scheduler is not None:
+            self._schedule_next()
+
+    def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel(self)
+            self._scheduler = None
+        self.flush()
+
+def from_config(config):
+    """Returns a CheckpointStore for monitoring.checkpoints, or None when disabled."""
+    checkpoint_config = config.get('monitoring', {}).get('checkpoints', {}) or {}
+    if not checkpoint_config.get('enabled', False):
+        return None
+    return CheckpointStore(
+        checkpoint_config.get('path', '.cache/checkpoints.json'),
+        flush_interval=checkpoint_config.get('flush_interval', 5.0)
+    )
@@ -0,0 +1,658 @@
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import queue
+import socket
+import asyncio
+import fnmatch
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from core import jsonl, metrics, triggers
+from core.scheduler import get_scheduler
+from core.segmenter import RecordSegmenter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_MAX_STREAMS = 10000
+DEFAULT_MAX_MESSAGE_BYTES = 64 * 1024
+DEFAULT_MAX_BODY_BYTES = 10 * 1024 * 1024
+DEFAULT_UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+# Entries waiting between the event loop and the pipeline callback
+DEFAULT_HANDOFF_QUEUE_SIZE = 10000
+# Datagrams handled per wakeup of the event loop
+UDP_BATCH = 512
+# Tags a network service can `match` on (fnmatch patterns)
+MATCH_TAGS = ('transport', 'hostname', 'app_name')
+
+def is_network_service(service):
+    return service.get('source', 'file') == 'network'
+
+# ==========================================
+#  SYSLOG
+# ==========================================
+SyslogMessage = namedtuple('SyslogMessage', 'priority hostname app_name procid message')
+
+_RFC5424 = re.compile(rb'<(\d{1,3})>\d{1,2} \S+ (\S+) (\S+) (\S+) \S+ ')
+_RFC3164 = re.compile(rb'<(\d{1,3})>(?:[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d )?(\S+) ([^\s:\[]+)(?:\[([^\]]*)\])?: ?')
+_BOM = b'\xef\xbb\xbf'
+
+def _nil(value):
+    return b'' if value == b'-' else value
+
+def _skip_structured_data(data):
+    """The part of `data` after RFC 5424 STRUCTURED-DATA ('-' or one or more [id k="v"] elements)."""
+    if data[:1] == b'-':
+        return data[2:]
+    position, in_quotes, escaped = 0, False, False
+    while position < len(data):
+        char = data[position]
+        if escaped:
+            escaped = False
+        elif char == 0x5c:  # backslash
+            escaped = True
+        elif char == 0x22:  # quote
+            in_quotes = not in_quotes
+        elif char == 0x5d and not in_quotes and data[position + 1:position + 2] != b'[':  # last ]
+            return data[position + 2:]
+        position += 1
+    return b''
+
+def parse_syslog(frame):
+    """
+    Splits an RFC 5424 (or BSD / RFC 3164) syslog message into a
+    SyslogMessage of bytes fields. Returns None when `frame` has no syslog
+    header, e.g. the next line of a multi-line message.
+    """
+    match = _RFC5424.match(frame)
+    if match is not None:
+        message = _skip_structured_data(frame[match.end():])
+        if message.startswith(_BOM):
+            message = message[3:]
+        return SyslogMessage(int(match.group(1)), _nil(match.group(2)), _nil(match.group(3)),
+                             _nil(match.group(4)), message)
+    match = _RFC3164.match(frame)
+    if match is not None:
+        return SyslogMessage(int(match.group(1)), match.group(2), match.group(3),
+                             match.group(4) or b'', frame[match.end():])
+    return None
+
+# ==========================================
+#  SERVICES AND STREAMS
+# ==========================================
+class NetworkService:
+    """A `source: network` service: how its messages are matched, segmented and labelled."""
+
+    def __init__(self, service, monitoring_config):
+        self.name = service.get('name', 'unknown_service')
+        self.project_path = os.path.abspath(service.get('project_path', '.'))
+        self.match = {tag: [patterns] if isinstance(patterns, str) else list(patterns)
+                      for tag, patterns in (service.get('match') or {}).items()}
+        unknown = set(self.match) - set(MATCH_TAGS)
+        if unknown:
+            logger.warning(f"Service '{self.name}' matches on unknown tags {sorted(unknown)}, expected {MATCH_TAGS}")
+        self.matcher = triggers.from_config(monitoring_config, service)
+        self.decoder = jsonl.from_config(monitoring_config, service, self.matcher)
+        self.segmentation = {**(monitoring_config.get('segmentation') or {}), **(service.get('segmentation') or {})}
+        self.encoding = service.get('encoding', monitoring_config.get('encoding', 'utf-8'))
+        self.encoding_errors = service.get('encoding_errors', monitoring_config.get('encoding_errors', 'replace'))
+
+    def matches(self, tags):
+        return all(any(fnmatch.fnmatchcase(tags.get(tag, ''), pattern) for pattern in patterns)
+                   for tag, patterns in self.match.items())
+
+class NetworkStream:
+    """
+    The lines of one sender (host, app and process) of a network service,
+    grouped into entries by a RecordSegmenter exactly like a tailed file. A
+    pending entry is flushed after `buffer_delay` seconds of quiet, or
+    `max_flush_latency` at the latest, on the shared scheduler.
+    """
+
+    def __init__(self, service, callback, buffer_delay=0.5, scheduler=None):
+        self.service = service
+        self.callback = callback
+        self.buffer_delay = buffer_delay
+        self.scheduler = scheduler or get_scheduler()
+        self._lines_read = metrics.LINES_READ.labels(service.name)
+        self._bytes_read = metrics.BYTES_READ.labels(service.name)
+        self._entries_flushed = metrics.ENTRIES_FLUSHED.labels(service.name)
+        self._entry_size = metrics.ENTRY_SIZE.labels(service.name)
+        self._entries_dropped = metrics.ENTRIES_DROPPED.labels(service.name)
+        self.segmenter = RecordSegmenter.from_config(service.segmentation, matcher=service.matcher,
+                                                     on_drop=self._entries_dropped.inc)
+        self.max_flush_latency = service.segmentation.get('max_flush_latency', 5.0)
+        self._latency_key = (self, 'max_latency')
+        self._lock = threading.Lock()
+
+    def feed(self, lines):
+        """Feeds raw lines (bytes ending in a newline) and emits the entries they complete."""
+        completed = []
+        size = 0
+        with self._lock:
+            for line in lines:
+                size += len(line)
+                if not line.strip():
+                    continue
+                if self.service.decoder is not None:
+                    entry = self.service.decoder.convert(line)
+                    if entry is None:
+                        self._entries_dropped.inc()
+                    else:
+                        completed.append(entry)
+                    continue
+                completed.extend(self.segmenter.feed(line))
+            pending = self.segmenter.has_pending()
+        self._lines_read.inc(len(lines))
+        self._bytes_read.inc(size)
+
+        if completed:
+            self.scheduler.cancel(self._latency_key)
+        for entry in completed:
+            self._emit(entry)
+        if pending:
+            self.scheduler.schedule(self, self.buffer_delay, self.flush)
+            if self.max_flush_latency:
+                self.scheduler.schedule_once(self._latency_key, self.max_flush_latency, self.flush)
+
+    def flush(self):
+        """Completes the pending entry and sends it to the callback."""
+        with self._lock:
+            entry = self.segmenter.flush()
+            self.scheduler.cancel(self)
+            self.scheduler.cancel(self._latency_key)
+        if entry is not None:
+            self._emit(entry)
+
+    def _emit(self, entry):
+        self._entries_flushed.inc()
+        self._entry_size.observe(len(entry))
+        if isinstance(entry, bytes):
+            entry = entry.decode(self.service.encoding, self.service.encoding_errors).replace('\r\n', '\n')
+        self.callback(entry, self.service.name, self.service.project_path)
+
+def _lines(message):
+    """A message split into newline-terminated lines, as the segmenter expects from a file."""
+    lines = message.split(b'\n')
+    if not lines[-1]:
+        lines.pop()
+    return [line + b'\n' for line in lines]
+
+# ==========================================
+#  PROTOCOLS
+# ==========================================
+class _SyslogDatagramReader:
+    """
+    Syslog over UDP. asyncio's datagram transport reads one datagram per loop
+    iteration. Here the socket is drained on every wakeup instead, and the
+    datagrams are handled as one batch, which makes a burst several times
+    cheaper and keeps the kernel buffer from overflowing.
+    """
+
+    def __init__(self, server, sock, max_batch=UDP_BATCH):
+        self.server = server
+        self.sock = sock
+        self.max_batch = max_batch
+
+    def read_ready(self):
+        frames = []
+        try:
+            while len(frames) < self.max_batch:
+                frames.append(self.sock.recv(self.server.max_message_bytes))
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            logger.warning(f"Error receiving syslog datagram: {e}")
+        if frames:
+            self.server.receive_syslog(frames, 'udp')
+
+class _SyslogStreamProtocol(asyncio.Protocol):
+    """
+    Syslog over TCP. The framing is detected per connection (RFC 6587): a
+    leading digit means octet counting ("<length> <message>"), anything else
+    newline-delimited messages. In newline framing, a line without a syslog
+    header continues the previous message (e.g. a stack trace).
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.octet_counting = None
+        self.previous = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if self.octet_counting is None:
+            self.octet_counting = self.buffer[:1].isdigit()
+        try:
+            frames = self._octet_frames() if self.octet_counting else self._line_frames()
+        except ValueError as e:
+            logger.warning(f"Closing syslog connection from {self.transport.get_extra_info('peername')}: {e}")
+            self.transport.close()
+            return
+        if frames:
+            self.previous = self.server.receive_syslog(frames, 'tcp', self.previous)
+
+    def _octet_frames(self):
+        frames, position, buffer = [], 0, self.buffer
+        while True:
+            space = buffer.find(b' ', position, position + 11)
+            if space == -1:
+                if len(buffer) - position > 10:
+                    raise ValueError("invalid octet-counting frame")
+                break
+            length = int(buffer[position:space])
+            if length > self.server.max_message_bytes:
+                raise ValueError(f"{length}-byte message is over max_message_bytes")
+            end = space + 1 + length
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[space + 1:end]))
+            position = end
+        del buffer[:position]
+        return frames
+
+    def _line_frames(self):
+        end = self.buffer.rfind(b'\n')
+        if end == -1:
+            if len(self.buffer) <= self.server.max_message_bytes:
+                return []
+            # One runaway line: pass it on in pieces
+            end = len(self.buffer) - 1
+        frames = bytes(self.buffer[:end + 1]).split(b'\n')
+        del self.buffer[:end + 1]
+        return [frame for frame in frames if frame]
+
+    def connection_lost(self, exc):
+        if self.buffer and not self.octet_counting:
+            self.server.receive_syslog([bytes(self.buffer)], 'tcp', self.previous)
+        self.buffer.clear()
+
+class _HttpProtocol(asyncio.Protocol):
+    """
+    A minimal HTTP/1.1 endpoint: POST /ingest/<service> (or /ingest?service=...,
+    or /ingest?hostname=...&app_name=... to route by tags) with newline-delimited
+    log lines as the body. Content-Length is required; gzip bodies are accepted.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.request = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        while self.transport is not None and not self.transport.is_closing():
+            if self.request is None and not self._read_headers():
+                return
+            method, target, headers, length = self.request
+            if len(self.buffer) < length:
+                return
+            body = bytes(self.buffer[:length])
+            del self.buffer[:length]
+            self.request = None
+            status, payload = self.server.handle_http(method, target, headers, body)
+            self._respond(status, payload, keep_alive=headers.get('connection', '').lower() != 'close')
+
+    def _read_headers(self):
+        end = self.buffer.find(b'\r\n\r\n')
+        if end == -1:
+            if len(self.buffer) > 16384:
+                self._respond(431, {'error': 'headers too large'}, keep_alive=False)
+            return False
+        head = bytes(self.buffer[:end]).decode('latin-1')
+        del self.buffer[:end + 4]
+        request_line, *header_lines = head.split('\r\n')
+        try:
+            method, target, version = request_line.split(' ')
+        except ValueError:
+            self._respond(400, {'error': 'bad request line'}, keep_alive=False)
+            return False
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            self._respond(411, {'error': 'Content-Length required'}, keep_alive=False)
+            return False
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            self._respond(400, {'error': 'bad Content-Length'}, keep_alive=False)
+            return False
+        if length > self.server.max_body_bytes:
+            self._respond(413, {'error': f'body over {self.server.max_body_bytes} bytes'}, keep_alive=False)
+            return False
+        if headers.get('expect', '').lower() == '100-continue':
+            self.transport.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        self.request = (method, target, headers, length)
+        return True
+
+    def _respond(self, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode('utf-8')
+        reason = {202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+                  405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+                  431: 'Request Header Fields Too Large'}.get(status, '')
+        head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        self.transport.write(head.encode('latin-1') + body)
+        if not keep_alive:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+# ==========================================
+#  SERVER
+# ==========================================
+class IngestServer:
+    """
+    Receives logs over the network, for services that can't share a volume
+    with the analyzer:
+      - syslog (RFC 5424, or BSD style) over UDP and TCP,
+      - newline-delimited batches POSTed over HTTP.
+
+    Messages are routed to the first `source: network` service whose `match`
+    tags (transport, hostname, app_name; fnmatch patterns) all match. A
+    service without `match` takes everything. Each sender (service, host, app,
+    process id) gets its own NetworkStream, so interleaved multi-line messages
+    from different processes are never merged. An HTTP request is one stream,
+    flushed when the body is done. Entries go to `callback(entry,
+    service_name, project_path)`, like the file monitors.
+
+    Everything runs in one asyncio event loop on a background thread. The
+    callback is called from another thread, through a bounded queue, so a
+    slow pipeline never stalls the listeners: past `handoff_queue_size`
+    entries are dropped (and counted) and HTTP batches are refused with 503.
+    """
+
+    def __init__(self, services, callback, host=DEFAULT_HOST, udp_port=None, tcp_port=None, http_port=None,
+                 token=None, buffer_delay=0.5, max_streams=DEFAULT_MAX_STREAMS,
+                 max_message_bytes=DEFAULT_MAX_MESSAGE_BYTES, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                 udp_receive_buffer=DEFAULT_UDP_RECEIVE_BUFFER, handoff_queue_size=DEFAULT_HANDOFF_QUEUE_SIZE):
+        self.services = services
+        self.callback = callback
+        self.host = host
+        self.ports = {'udp': udp_port, 'tcp': tcp_port, 'http': http_port}
+        self.token = token
+        self.buffer_delay = buffer_delay
+        self.max_streams = max_streams
+        self.max_message_bytes = max_message_bytes
+        self.max_body_bytes = max_body_bytes
+        self.udp_receive_buffer = udp_receive_buffer
+        self.addresses = {}
+        self._by_name = {service.name: service for service in services}
+        self._routes = {}
+        self._streams = OrderedDict()
+        self._received = {transport: metrics.INGEST_MESSAGES.labels(transport) for transport in ('udp', 'tcp', 'http')}
+        self._loop = None
+        self._thread = None
+        self._closers = []
+        self._handoff = queue.Queue(maxsize=handoff_queue_size)
+        self._handoff_thread = None
+        self._stopping = False
+
+    # ------------------------------------------
+    #  routing
+    # ------------------------------------------
+    def route(self, transport, hostname=b'', app_name=b''):
+        """The NetworkService for a message, or None when no service matches."""
+        key = (transport, hostname, app_name)
+        try:
+            return self._routes[key]
+        except KeyError:
+            pass
+        tags = {
+            'transport': transport,
+            'hostname': hostname.decode('utf-8', 'replace'),
+            'app_name': app_name.decode('utf-8', 'replace'),
+        }
+        service = next((service for service in self.services if service.matches(tags)), None)
+        if len(self._routes) >= self.max_streams:
+            self._routes.clear()
+        self._routes[key] = service
+        return service
+
+    def _stream(self, service, key):
+        stream = self._streams.get(key)
+        if stream is not None:
+            self._streams.move_to_end(key)
+            return stream
+        if len(self._streams) >= self.max_streams:
+            _, evicted = self._streams.popitem(last=False)
+            evicted.flush()
+        stream = self._streams[key] = NetworkStream(service, self._hand_off, self.buffer_delay)
+        return stream
+
+    def receive_syslog(self, frames, transport, previous=None):
+        """
+        Routes and segments syslog frames. A frame without a header belongs to
+        `previous` (the last SyslogMessage of the connection), if any. Returns
+        the last message's header, for the next call.
+        """
+        batches = {}
+        unrouted = 0
+        for frame in frames:
+            message = parse_syslog(frame)
+            if message is None:
+                message = (previous or SyslogMessage(0, b'', b'', b'', b''))._replace(message=frame)
+            else:
+                previous = message
+            service = self.route(transport, message.hostname, message.app_name)
+            if service is None:
+                unrouted += 1
+                continue
+            key = (service.name, message.hostname, message.app_name, message.procid)
+            lines = batches.get(key)
+            if lines is None:
+                lines = batches[key] = (service, [])
+            lines[1].extend(_lines(message.message))
+
+        self._received[transport].inc(len(frames))
+        if unrouted:
+            metrics.INGEST_UNROUTED.labels(transport).inc(unrouted)
+        for key, (service, lines) in batches.items():
+            self._stream(service, key).feed(lines)
+        return previous
+
+    def handle_http(self, method, target, headers, body):
+        """Handles one HTTP request. Returns (status, JSON payload)."""
+        url = urlsplit(target)
+        if url.path.rstrip('/') != '/ingest' and not url.path.startswith('/ingest/'):
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        if self.token and not hmac.compare_digest(headers.get('authorization', ''), f"Bearer {self.token}"):
+            return 401, {'error': 'unauthorized'}
+
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        name = unquote(url.path[len('/ingest/'):]) if url.path.startswith('/ingest/') else query.get('service')
+        if name:
+            service = self._by_name.get(name)
+        else:
+            service = self.route('http', query.get('hostname', '').encode('utf-8'),
+                                 query.get('app_name', '').encode('utf-8'))
+        if service is None:
+            metrics.INGEST_UNROUTED.labels('http').inc()
+            return 404, {'error': 'no service matches'}
+
+        if headers.get('content-encoding', '').lower() == 'gzip':
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError) as e:
+                return 400, {'error': f'bad gzip body: {e}'}
+        if self._handoff.full():
+            metrics.INGEST_DROPPED.labels(service.name).inc()
+            return 503, {'error': 'busy, retry later'}
+        lines = _lines(body) if body else []
+        self._received['http'].inc()
+        # The batch is a stream of its own and complete once received
+        stream = NetworkStream(service, self._hand_off, self.buffer_delay)
+        stream.feed(lines)
+        stream.flush()
+        return 202, {'service': service.name, 'lines': len(lines)}
+
+    def flush(self):
+        """Emits every pending entry."""
+        for stream in list(self._streams.values()):
+            stream.flush()
+
+    # ------------------------------------------
+    #  handoff
+    # ------------------------------------------
+    def _hand_off(self, entry, service_name, project_path):
+        """NetworkStream callback: queues the entry for the handoff thread, never blocking the event loop."""
+        if self._handoff_thread is None:
+            self.callback(entry, service_name, project_path)
+            return
+        if self._stopping:
+            # Listeners are closed by now, waiting only delays shutdown
+            self._handoff.put((entry, service_name, project_path))
+            return
+        try:
+            self._handoff.put_nowait((entry, service_name, project_path))
+        except queue.Full:
+            metrics.INGEST_DROPPED.labels(service_name).inc()
+            logger.warning(f"Dropped an entry from '{service_name}': the pipeline is not keeping up with the network sources.")
+
+    def _run_handoff(self):
+        while True:
+            item = self._handoff.get()
+            if item is None:
+                return
+            try:
+                self.callback(*item)
+            except Exception as e:
+                logger.error(f"Error handling a received entry from '{item[1]}': {e}")
+
+    # ------------------------------------------
+    #  event loop
+    # ------------------------------------------
+    async def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self.ports['udp'] is not None:
+            sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.udp_receive_buffer)
+            except OSError as e:
+                logger.debug(f"Could not enlarge the UDP receive buffer: {e}")
+            sock.bind((self.host, self.ports['udp']))
+            sock.setblocking(False)
+            loop.add_reader(sock, _SyslogDatagramReader(self, sock).read_ready)
+            self.addresses['udp'] = sock.getsockname()[:2]
+            self._closers.append(lambda: (loop.remove_reader(sock), sock.close()))
+        for name, protocol in (('tcp', _SyslogStreamProtocol), ('http', _HttpProtocol)):
+            if self.ports[name] is None:
+                continue
+            server = await loop.create_server(lambda protocol=protocol: protocol(self), self.host, self.ports[name])
+            self.addresses[name] = server.sockets[0].getsockname()[:2]
+            self._closers.append(server.close)
+
+    def _run(self, ready, errors):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._bind())
+        except OSError as e:
+            errors.append(e)
+            ready.set()
+            return
+        ready.set()
+        self._loop.run_forever()
+        for close in self._closers:
+            close()
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+
+    def start(self):
+        """Binds the listeners and serves them from a background thread. Raises OSError if a port is taken."""
+        self._loop = asyncio.new_event_loop()
+        self._stopping = False
+        self._handoff_thread = threading.Thread(target=self._run_handoff, name="ingest-handoff", daemon=True)
+        self._handoff_thread.start()
+        ready, errors = threading.Event(), []
+        self._thread = threading.Thread(target=self._run, args=(ready, errors), name="ingest-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread.join()
+            self._thread = None
+            self._stop_handoff()
+            raise errors[0]
+        listening = ", ".join(f"{name} {host}:{port}" for name, (host, port) in self.addresses.items())
+        logger.info(f"Ingesting logs for {len(self.services)} network services on {listening}")
+        return self
+
+    def run_until_interrupted(self):
+        """Blocks until Ctrl+C, for when there are no files to monitor."""
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Stopping ingestion server...")
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+        self._stopping = True
+        self.flush()
+        self._stop_handoff()
+
+    def _stop_handoff(self):
+        """Lets the handoff thread deliver what is queued, then ends it."""
+        if self._handoff_thread is not None:
+            self._handoff.put(None)
+            self._handoff_thread.join()
+            self._handoff_thread = None
+
+def from_config(config, callback):
+    """
+    Starts an IngestServer for the `source: network` services, configured
+    under `ingest`. Returns None when it is disabled or no service uses it.
+    """
+    ingest_config = config.get('ingest', {}) or {}
+    monitoring_config = config.get('monitoring', {})
+    services = [NetworkService(service, monitoring_config)
+                for service in monitoring_config.get('services', []) or [] if is_network_service(service)]
+    if not services:
+        return None
+    if not ingest_config.get('enabled', False):
+        logger.warning(f"{len(services)} network services are configured but ingest is disabled.")
+        return None
+    server = IngestServer(
+        services, callback,
+        host=ingest_config.get('host', DEFAULT_HOST),
+        udp_port=ingest_config.get('syslog_udp_port'),
+        tcp_port=ingest_config.get('syslog_tcp_port'),
+        http_port=ingest_config.get('http_port'),
+        token=ingest_config.get('token') or None,
+        buffer_delay=monitoring_config.get('poll_interval', 0.5),
+        max_streams=ingest_config.get('max_streams', DEFAULT_MAX_STREAMS),
+        max_message_bytes=ingest_config.get('max_message_bytes', DEFAULT_MAX_MESSAGE_BYTES),
+        max_body_bytes=ingest_config.get('max_body_bytes', DEFAULT_MAX_BODY_BYTES),
+        udp_receive_buffer=ingest_config.get('udp_receive_buffer', DEFAULT_UDP_RECEIVE_BUFFER),
+        handoff_queue_size=ingest_config.get('handoff_queue_size', DEFAULT_HANDOFF_QUEUE_SIZE),
+    )
+    try:
+        return server.start()
+    except OSError as e:
+        logger.error(f"Could not start the ingestion server: {e}")
+        return None
@@ -0,0 +1,166 @@
+import re
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # optional, 2-5x faster decoding
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+DEFAULT_LEVEL_FIELDS = ['level', 'levelname', 'severity', 'log.level', 'lvl']
+DEFAULT_MESSAGE_FIELDS = ['message', 'msg', 'event']
+DEFAULT_STACK_FIELDS = ['exc_info', 'stack', 'stack_trace', 'exception', 'traceback', 'error.stack_trace', 'err.stack']
+DEFAULT_TIMESTAMP_FIELDS = ['timestamp', '@timestamp', 'time', 'ts', 'asctime']
+# pino / bunyan numeric levels
+DEFAULT_NUMERIC_LEVELS = {10: 'TRACE', 20: 'DEBUG', 30: 'INFO', 40: 'WARN', 50: 'ERROR', 60: 'FATAL'}
+
+def _as_list(value, default):
+    if value is None:
+        return list(default)
+    return [value] if isinstance(value, str) else list(value)
+
+def _lookup(record, field):
+    """`field` as a literal key, else as a dotted path into nested objects."""
+    if field in record:
+        return record[field]
+    value = record
+    for part in field.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _first(record, fields):
+    for field in fields:
+        value = _lookup(record, field)
+        if value not in (None, ''):
+            return value
+    return None
+
+def _stack_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(str(line).rstrip("\n") for line in value)
+    if isinstance(value, dict):
+        return _stack_text(value.get('stack') or value.get('stack_trace')) or json.dumps(value)
+    return str(value)
+
+class JsonLineDecoder:
+    """
+    Turns JSON log lines into plain-text entries the rest of the analyzer understands:
+
+        <timestamp> <LEVEL> <message>
+        <stack trace, with real newlines>
+
+    so the parser sees the actual frames instead of an escaped "\\n"-joined
+    string. Levels are read from the level field, not by substring matching.
+
+    A record is kept when its level is one of `levels` (all records when
+    `levels` is None) or when it carries a stack trace, like the text-mode
+    trigger filter. A line whose level field clearly isn't a trigger, and that has
+    no stack field, is dropped with one bytes regex and is never decoded. The
+    `matcher` (triggers.TriggerMatcher), if given, then applies its
+    allow/deny patterns to the rendered entry. Lines that aren't JSON are
+    passed through as text.
+    """
+
+    def __init__(self, levels=None, level_fields=None, message_fields=None, stack_fields=None,
+                 timestamp_fields=None, numeric_levels=None, matcher=None):
+        self.levels = {level.upper() for level in levels} if levels else None
+        self.level_fields = _as_list(level_fields, DEFAULT_LEVEL_FIELDS)
+        self.message_fields = _as_list(message_fields, DEFAULT_MESSAGE_FIELDS)
+        self.stack_fields = _as_list(stack_fields, DEFAULT_STACK_FIELDS)
+        self.timestamp_fields = _as_list(timestamp_fields, DEFAULT_TIMESTAMP_FIELDS)
+        self.numeric_levels = {int(k): str(v).upper() for k, v in (numeric_levels or DEFAULT_NUMERIC_LEVELS).items()}
+        self.matcher = matcher
+
+        # Matches level keys at any depth; nested ones can't be told apart without decoding
+        level_keys = '|'.join(re.escape(field) for field in self.level_fields)
+        self._level_regex = re.compile(rf'"(?:{level_keys})"\s*:\s*(?:"([^"]*)"|(\d+))'.encode('utf-8'))
+        stack_keys = '|'.join(re.escape(field.rsplit('.', 1)[-1]) for field in self.stack_fields)
+        self._stack_regex = re.compile(rf'"(?:{stack_keys})"\s*:\s*[^\sn]'.encode('utf-8'))
+        self._trigger_bytes = {level.encode('utf-8') for level in self.levels} if self.levels else None
+
+    def _level_name(self, value):
+        if isinstance(value, bool):
+            return str(value).upper()
+        if isinstance(value, (int, float)):
+            return self.numeric_levels.get(int(value), str(value))
+        return str(value).upper()
+
+    def prefilter(self, line):
+        """
+        False when the raw line certainly can't trigger: every level-like field
+        holds a non-trigger level (a nested one may hide the real level) and
+        there is no stack field.
+        """
+        if self._trigger_bytes is None:
+            return True
+        found = False
+        for match in self._level_regex.finditer(line):
+            found = True
+            if match.group(1) is not None:
+                if match.group(1).upper() in self._trigger_bytes:
+                    return True
+            elif self.numeric_levels.get(int(match.group(2)), '') in self.levels:
+                return True
+        return not found or self._stack_regex.search(line) is not None
+
+    def render(self, record):
+        """The plain-text entry for a decoded record."""
+        level = self._level_name(_first(record, self.level_fields) or '')
+        message = _first(record, self.message_fields)
+        header = " ".join(str(part) for part in (_first(record, self.timestamp_fields), level, message) if part)
+        stack = _first(record, self.stack_fields)
+        if stack:
+            return f"{header}\n{_stack_text(stack).rstrip()}\n"
+        return f"{header}\n"
+
+    def convert(self, line):
+        """
+        Converts one raw line (bytes or str) into an entry, or None when it
+        can't trigger an analysis.
+        """
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        if not self.prefilter(line):
+            return None
+        try:
+            record = _loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            entry = line.decode('utf-8', 'replace')
+        else:
+            level = self._level_name(_first(record, self.level_fields) or '')
+            has_stack = bool(_first(record, self.stack_fields))
+            if self.levels is not None and level not in self.levels and not has_stack:
+                return None
+            entry = self.render(record)
+        if self.matcher is not None and not self.matcher.matches(entry):
+            return None
+        return entry
+
+def from_config(monitoring_config, service=None, matcher=None):
+    """
+    The decoder for a service with `format: jsonl` (set per service or under
+    monitoring), or None for plain-text logs. Field names come from `json`.
+    """
+    service = service or {}
+    if service.get('format', monitoring_config.get('format', 'text')) != 'jsonl':
+        return None
+    json_config = {**(monitoring_config.get('json') or {}), **(service.get('json') or {})}
+    return JsonLineDecoder(
+        levels=matcher.levels if matcher is not None else None,
+        level_fields=json_config.get('level_fields'),
+        message_fields=json_config.get('message_fields'),
+        stack_fields=json_config.get('stack_fields'),
+        timestamp_fields=json_config.get('timestamp_fields'),
+        numeric_levels=json_config.get('numeric_levels'),
+        matcher=matcher,
+    )
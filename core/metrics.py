@@ -0,0 +1,267 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144)
+
+class _Child:
+    """One labelled time series. Hot-path code keeps a reference to it (see Metric.labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+class _CounterChild(_Child):
+    def __init__(self):
+        super().__init__()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild(_Child):
+    def __init__(self):
+        super().__init__()
+        self.value = 0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Reads the value from `function()` at scrape time, so the hot path pays nothing."""
+        self._function = function
+
+    def get(self):
+        if self._function is None:
+            return self.value
+        try:
+            return self._function()
+        except Exception:
+            return float('nan')
+
+class _HistogramChild(_Child):
+    def __init__(self, buckets):
+        super().__init__()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Returns the series for these label values, creating it on first use."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {child.value}"]
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {child.get()}"]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {total}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ==========================================
+#  METRICS
+# ==========================================
+# monitor
+BYTES_READ = Counter('log_analyzer_bytes_read_total', 'Bytes read from log files.', ['service'])
+LINES_READ = Counter('log_analyzer_lines_read_total', 'Lines read from log files.', ['service'])
+ENTRIES_FLUSHED = Counter('log_analyzer_entries_flushed_total', 'Log entries emitted by the monitors.', ['service'])
+ENTRIES_DROPPED = Counter('log_analyzer_entries_dropped_total', 'Log entries dropped by the ingest-time trigger filter.', ['service'])
+MONITORED_FILES = Gauge('log_analyzer_monitored_files', 'Log files being monitored.')
+OPEN_FILES = Gauge('log_analyzer_open_log_files', 'Monitored log files with an open handle.')
+POLL_STAT_CALLS = Counter('log_analyzer_poll_stat_calls_total', 'stat() calls made by the polling watch backend.')
+SHARD_FORWARDED = Counter('log_analyzer_shard_forwarded_total', 'Triggered entries received from shard worker processes.', ['shard'])
+SHARD_RESTARTS = Counter('log_analyzer_shard_restarts_total', 'Shard worker processes restarted after dying.', ['shard'])
+INGEST_MESSAGES = Counter('log_analyzer_ingest_messages_total', 'Syslog messages and HTTP batches received.', ['transport'])
+INGEST_UNROUTED = Counter('log_analyzer_ingest_unrouted_total', 'Received messages that matched no network service.', ['transport'])
+INGEST_DROPPED = Counter('log_analyzer_ingest_dropped_total', 'Received entries dropped because the pipeline was not keeping up.', ['service'])
+ENTRY_SIZE = Histogram('log_analyzer_entry_size_bytes', 'Size of emitted log entries.', ['service'], buckets=SIZE_BUCKETS)
+
+# pipeline
+PARSE_SECONDS = Histogram('log_analyzer_parse_seconds', 'Time to parse and filter one entry.', ['service'])
+TRIGGERS = Counter('log_analyzer_triggers_total', 'Entries selected for analysis.', ['service'])
+QUEUE_DEPTH = Gauge('log_analyzer_queue_depth', 'Items waiting in an internal queue.', ['queue'])
+SHED = Counter('log_analyzer_shed_total', 'Entries dropped because the analyze queue was full.', ['service'])
+SPOOL_PENDING = Gauge('log_analyzer_spool_pending', 'Unacknowledged entries in the on-disk spool.')
+SPOOL_SPILLED = Gauge('log_analyzer_spool_spilled', 'Spooled entries held on disk only, over the memory high-water mark.')
+SPOOL_FSYNCS = Counter('log_analyzer_spool_fsyncs_total', 'fsync() calls made by the spool.')
+
+# template mining
+TEMPLATE_MATCHES = Counter('log_analyzer_template_matches_total', 'Triggering entries by template outcome (new, spike, known).', ['result'])
+TEMPLATE_COUNT = Gauge('log_analyzer_templates', 'Log templates currently tracked.')
+
+# analyzer
+LLM_SECONDS = Histogram('log_analyzer_llm_request_seconds', 'LLM completion latency.', ['model'])
+LLM_TTFT = Histogram('log_analyzer_llm_time_to_first_token_seconds', 'Time until the first streamed token.', ['model'])
+LLM_TRUNCATED = Counter('log_analyzer_llm_truncated_total', 'Streamed analyses cut off at the deadline.', ['model'])
+LLM_ERRORS = Counter('log_analyzer_llm_errors_total', 'Failed LLM completions.', ['model'])
+LLM_TOKENS = Counter('log_analyzer_llm_tokens_total', 'Tokens reported by the LLM provider.', ['model', 'kind'])
+LLM_CACHE_HITS = Counter('log_analyzer_llm_cache_hits_total', 'Analyses served from the response cache.')
+LLM_BATCH_SIZE = Histogram('log_analyzer_llm_batch_size', 'Distinct errors sent in one batched request.', ['model'], buckets=(2, 4, 8, 16, 32))
+LLM_BATCH_FALLBACKS = Counter('log_analyzer_llm_batch_fallbacks_total', 'Batched errors re-sent on their own because the answer did not cover them.', ['model'])
+
+# notifier
+NOTIFY_SECONDS = Histogram('log_analyzer_notification_seconds', 'Alert delivery latency.', ['channel'])
+NOTIFICATIONS = Counter('log_analyzer_notifications_total', 'Alert deliveries by outcome.', ['channel', 'result'])
+
+# process
+THREADS = Gauge('log_analyzer_threads', 'Live threads in the process.')
+THREADS.set_function(threading.active_count)
+
+# ==========================================
+#  HTTP ENDPOINT
+# ==========================================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        data = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_server(host='127.0.0.1', port=9464, registry=REGISTRY):
+    """Serves /metrics from a background thread. Returns the server (call shutdown() to stop)."""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def from_config(config):
+    """Starts the endpoint configured under `metrics`, or returns None when disabled."""
+    metrics_config = config.get('metrics', {}) or {}
+    if not metrics_config.get('enabled', False):
+        return None
+    try:
+        return start_server(metrics_config.get('host', '127.0.0.1'), metrics_config.get('port', 9464))
+    except OSError as e:
+        logger.error(f"Could not start the metrics endpoint: {e}")
+        return None
@@ -1,117 +1,500 @@
 import os
+import glob
 import time
+import fnmatch
+import hashlib
 import threading
 import logging
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from core.scheduler import get_scheduler
+from core.segmenter import RecordSegmenter
+from core.tailer import FileTailer, HandlePool, DEFAULT_CHUNK_SIZE, HEAD_BYTES
+from core import checkpoint, ingest, jsonl, metrics, poller, triggers
 
 logger = logging.getLogger(__name__)
 
+# Seconds between identity checks on a busy file (rotation, truncation)
+ROTATION_CHECK_INTERVAL = 1.0
+
 class LogMonitor(FileSystemEventHandler):
-    def __init__(self, log_path, callback_func, buffer_delay=0.5):
+    def __init__(self, log_path, callback_func, buffer_delay=0.5, scheduler=None, segmentation=None,
+                 encoding='utf-8', encoding_errors='replace', chunk_size=DEFAULT_CHUNK_SIZE,
+                 checkpoints=None, service_name=None, matcher=None, handle_pool=None, from_start=False,
+                 decoder=None):
         self.log_path = os.path.abspath(log_path)
+        self.service_name = service_name
         self.callback = callback_func
         self.buffer_delay = buffer_delay
-        self.file_handle = None
-        self.buffer = []
-        self.timer = None
+        self.scheduler = scheduler or get_scheduler()
+
+        service_label = service_name or os.path.basename(self.log_path)
+        self._bytes_read = metrics.BYTES_READ.labels(service_label)
+        self._lines_read = metrics.LINES_READ.labels(service_label)
+        self._entries_flushed = metrics.ENTRIES_FLUSHED.labels(service_label)
+        self._entry_size = metrics.ENTRY_SIZE.labels(service_label)
+        self._entries_dropped = metrics.ENTRIES_DROPPED.labels(service_label)
+
+        self.tailer = FileTailer(self.log_path, encoding=encoding, errors=encoding_errors, chunk_size=chunk_size)
+        # With a matcher, entries that can't trigger an analysis are dropped right here
+        self.segmenter = RecordSegmenter.from_config(segmentation, matcher=matcher, on_drop=self._entries_dropped.inc)
+        # JSON-lines logs (see jsonl.JsonLineDecoder): every line is a record of its own
+        self.decoder = decoder
+        # Upper bound on how long a record may sit in the buffer while the file keeps being written
+        self.max_flush_latency = (segmentation or {}).get('max_flush_latency', 5.0)
+        self._latency_key = (self, 'max_latency')
         self._lock = threading.Lock()
+        self.checkpoints = checkpoints
+        # Shared limit on open files; the handle is closed when idle and reopened on demand
+        self.handle_pool = handle_pool
+        # Byte offset of the first line of the record still held by the segmenter
+        self._pending_start = None
+        self._head = (None, 0)
+        self._last_rotation_check = time.monotonic()
 
         try:
-            self.file_handle = open(self.log_path, 'r')
-            self.file_handle.seek(0, 2)  # Move to the end of the file
+            self.tailer.open(offset=self._resume_offset(0 if from_start else None))
+            self._head = self.tailer.head_hash()
+            self._save_checkpoint()
+            if self.handle_pool is not None:
+                self.handle_pool.touch(self)
         except Exception as e:
             logger.error(f"Error opening log file: {e}")
-            self.file_handle = None
+            self.tailer.close()
+
+    def _resume_offset(self, default=None):
+        """
+        Returns where to start reading: the checkpointed offset if the file is
+        still the one we were reading, 0 if it was replaced while we were down,
+        or `default` (None = end of file) when there is no checkpoint.
+        """
+        if not self.checkpoints:
+            return default
+        checkpoint = self.checkpoints.get(self.log_path)
+        if not checkpoint:
+            return default
+
+        with open(self.log_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            head = f.read(checkpoint['head_length'])
+        # An empty head hash matches any file, so it can't vouch for a non-zero offset
+        same_file = (
+            (stat.st_ino, stat.st_dev) == (checkpoint.get('inode'), checkpoint.get('device'))
+            and (checkpoint['head_length'] > 0 or checkpoint['offset'] == 0)
+            and hashlib.sha1(head).hexdigest() == checkpoint['head_hash']
+            and stat.st_size >= checkpoint['offset']
+        )
+        if same_file:
+            logger.info(f"Resuming {self.log_path} at byte {checkpoint['offset']}")
+            return checkpoint['offset']
+
+        logger.info(f"{self.log_path} was rotated or truncated while stopped, reading it from the start")
+        return 0
+
+    @property
+    def file_handle(self):
+        return self.tailer.file_handle
 
     def on_modified(self, event):
         """Called when the log file is modified."""
-        if event.src_path == self.log_path and self.file_handle:
+        if event.src_path == self.log_path:
             self.process_new_lines()
 
+    def suspend(self):
+        """Closes the file handle (see HandlePool); the next read reopens it at the same offset."""
+        with self._lock:
+            self.tailer.suspend()
+
+    def _acquire(self):
+        """Reopens the file if the handle pool closed it. Returns whether it is open."""
+        if self.tailer.is_suspended:
+            with self._lock:
+                try:
+                    same_file = self.tailer.resume()
+                except OSError as e:
+                    logger.debug(f"Could not reopen {self.log_path}: {e}")
+                    return False
+            if not same_file:
+                self._handle_rotation('replaced')
+        if self.file_handle is None:
+            return False
+        if self.handle_pool is not None:
+            self.handle_pool.touch(self)
+        return True
+
+    def close(self):
+        """Emits the pending record and releases the file (the file is gone or no longer matched)."""
+        self._flush_buffer()
+        with self._lock:
+            self.tailer.close()
+        if self.handle_pool is not None:
+            self.handle_pool.discard(self)
+
     def on_created(self, event):
         """Triggered when log file is deleted and recreated."""
         if event.src_path == self.log_path:
-            if self.file_handle:
-                self.file_handle.close()
             try:
-                self.file_handle = open(self.log_path, 'r')
+                if self.file_handle:
+                    self._handle_rotation('rotated')
+                else:
+                    with self._lock:
+                        self.tailer.open(offset=0)
+                        self._head = self.tailer.head_hash()
                 self.process_new_lines()
             except Exception as e:
                 logger.error(f"Error reopening log file: {e}")
-                self.file_handle = None
+                self.tailer.close()
+
+    def _handle_rotation(self, change):
+        """
+        Switches to the new file after a rotation. A rotated-away file is drained
+        first, so lines written just before the move are not lost.
+        """
+        completed = []
+        with self._lock:
+            if change == 'rotated':
+                logger.info(f"{self.log_path} was rotated, draining the old file")
+                self._line_offset = self.tailer.offset
+                drained = self.tailer.drain()
+                self._bytes_read.inc(self.tailer.offset - self._line_offset)
+                self._lines_read.inc(len(drained))
+                for line in drained:
+                    completed.extend(self._feed(line))
+                self.tailer.open(offset=0)
+            elif change == 'truncated':
+                logger.info(f"{self.log_path} was truncated, reading from the start")
+                self.tailer.open(offset=0)
+            elif change == 'replaced':
+                # Already reopened at the start by FileTailer.resume()
+                logger.info(f"{self.log_path} was replaced while its handle was closed, reading from the start")
+            self._head = self.tailer.head_hash()
+
+            pending = self.segmenter.flush()
+            if pending is not None:
+                completed.append(pending)
+            self._pending_start = None
+            self.scheduler.cancel(self)
+            self.scheduler.cancel(self._latency_key)
+            self._save_checkpoint()
+
+        for entry in completed:
+            self._emit(entry)
+
+    def _emit(self, entry):
+        self._entries_flushed.inc()
+        self._entry_size.observe(len(entry))
+        self.callback(entry if isinstance(entry, str) else self.tailer.decode(entry))
+
+    def _feed(self, line):
+        """Feeds one raw line to the segmenter, tracking where the pending record starts."""
+        line_start = self._line_offset
+        self._line_offset += len(line)
+        if not line.strip():
+            return []
+        if self.decoder is not None:
+            entry = self.decoder.convert(line)
+            if entry is None:
+                self._entries_dropped.inc()
+                return []
+            return [entry]
+        completed = self.segmenter.feed(line)
+        pending_lines = self.segmenter.pending_lines
+        if pending_lines == 1:
+            self._pending_start = line_start
+        elif pending_lines == 0:
+            # The open record is being dropped, nothing needs to be replayed
+            self._pending_start = None
+        return completed
 
     def process_new_lines(self):
-        """Reads new lines and adds them to a buffer."""
-        if not self.file_handle:
+        """Reads new lines, segments them into records and emits the completed ones."""
+        if not self._acquire():
             return
+
+        now = time.monotonic()
+        if now - self._last_rotation_check >= ROTATION_CHECK_INTERVAL:
+            self._last_rotation_check = now
+            change = self.tailer.path_changed()
+            if change in ('rotated', 'truncated'):
+                self._handle_rotation(change)
         
+        completed = []
         new_data = False
-        for line in self.file_handle:
-            if line.strip():
-                with self._lock:
-                    self.buffer.append(line)
-                    new_data = True
-        
+        read_bytes = read_lines = 0
+        with self._lock:
+            while True:
+                self._line_offset = self.tailer.offset
+                lines = self.tailer.read_lines()
+                read_bytes += self.tailer.offset - self._line_offset
+                read_lines += len(lines)
+                for line in lines:
+                    completed.extend(self._feed(line))
+                new_data = new_data or bool(lines)
+                if not self.tailer.has_more:
+                    break
+            pending = self.segmenter.has_pending()
+            if new_data:
+                self._save_checkpoint()
         if new_data:
+            self._bytes_read.inc(read_bytes)
+            self._lines_read.inc(read_lines)
+
+        if not new_data:
+            # Nothing to read can mean the file was truncated under us
+            change = self.tailer.path_changed()
+            if change == 'truncated':
+                self._handle_rotation(change)
+                self.process_new_lines()
+                return
+
+        if completed:
+            # The next record gets its own max-latency window
+            self.scheduler.cancel(self._latency_key)
+        for entry in completed:
+            self._emit(entry)
+
+        if new_data and pending:
             self._reset_timer()
 
+    def _save_checkpoint(self):
+        """Records the offset up to which every line has been emitted. Caller holds the lock."""
+        if not self.checkpoints or not self.tailer.identity:
+            return
+        if self.segmenter.has_pending() and self._pending_start is not None:
+            offset = self._pending_start
+        else:
+            offset = self.tailer.offset
+        # A file opened empty (or nearly) gets its head hashed again as it grows
+        if self._head[1] < HEAD_BYTES:
+            self._head = self.tailer.head_hash()
+        inode, device = self.tailer.identity
+        self.checkpoints.update(self.log_path, inode, device, offset, *self._head)
+
     def _reset_timer(self):
-        """Resets the timer that flushes the buffer."""
-        with self._lock:
-            if self.timer:
-                self.timer.cancel()
-            self.timer = threading.Timer(self.buffer_delay, self._flush_buffer)
-            self.timer.start()
+        """
+        Pushes the quiet-period flush back by buffer_delay on the shared scheduler,
+        and arms the max-latency flush for the record if it isn't armed yet.
+        """
+        self.scheduler.schedule(self, self.buffer_delay, self._flush_buffer)
+        if self.max_flush_latency:
+            self.scheduler.schedule_once(self._latency_key, self.max_flush_latency, self._flush_buffer)
 
     def _flush_buffer(self):
-        """Joins buffered lines and sends them to the callback."""
+        """Completes the pending record and sends it to the callback."""
         with self._lock:
-            if not self.buffer:
-                return
-            full_entry = "".join(self.buffer)
-            self.buffer = []
-            self.timer = None
+            was_pending = self.segmenter.has_pending()
+            full_entry = self.segmenter.flush()
+            self._pending_start = None
+            self.scheduler.cancel(self)
+            self.scheduler.cancel(self._latency_key)
+            if was_pending:
+                self._save_checkpoint()
+        if full_entry is None:
+            return
         
-        self.callback(full_entry)
+        self._emit(full_entry)
 
-def start_monitoring(config, new_line_callback):
-    """Starts the watchdog observer to monitor the log file."""
+# ==========================================
+#  EVENT DISPATCH
+# ==========================================
+class MonitorDispatcher(FileSystemEventHandler):
+    """
+    The single watchdog handler for every monitored file. Each directory is
+    watched once, and events are routed to their LogMonitor with one dict
+    lookup on the event path.
+
+    Glob services (e.g. /var/log/app/*.log) are matched against files created
+    in their directory. New files are picked up as they appear and read from
+    the start. A deleted glob file is flushed and forgotten.
+
+    Files of services with `watch: poll` are left out of directories(); a
+    StatPoller (core.poller) feeds their events into the same handler methods.
+    """
+
+    def __init__(self, create_monitor):
+        # create_monitor(log_path, service, from_start) -> LogMonitor
+        self.create_monitor = create_monitor
+        self._monitors = {}
+        self._globs = {}
+        self._glob_paths = set()
+        self._polled = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._monitors)
+
+    def get(self, path):
+        return self._monitors.get(path)
+
+    def directories(self):
+        """The directories to watch with watchdog (polled files excluded)."""
+        with self._lock:
+            directories = {os.path.dirname(path) for path in self._monitors if path not in self._polled}
+            for directory, patterns in self._globs.items():
+                if any(not polled for _, _, polled in patterns):
+                    directories.add(directory)
+        return sorted(directories)
+
+    def polled_paths(self):
+        with self._lock:
+            return sorted(self._polled)
+
+    def polled_globs(self):
+        """Full patterns of the polled glob services."""
+        with self._lock:
+            return sorted({os.path.join(directory, name_pattern)
+                           for directory, patterns in self._globs.items()
+                           for name_pattern, _, polled in patterns if polled})
+
+    def is_glob_path(self, path):
+        return path in self._glob_paths
+
+    def add(self, monitor, from_glob=False, polled=False):
+        with self._lock:
+            self._monitors[monitor.log_path] = monitor
+            if from_glob:
+                self._glob_paths.add(monitor.log_path)
+            if polled:
+                self._polled.add(monitor.log_path)
+
+    def add_glob(self, pattern, service, polled=False):
+        """Monitors the files matching `pattern` now, and the ones created later."""
+        pattern = os.path.abspath(pattern)
+        directory_pattern, name_pattern = os.path.split(pattern)
+        directories = glob.glob(directory_pattern) if glob.has_magic(directory_pattern) else [directory_pattern]
+        directories = [d for d in directories if os.path.isdir(d)]
+        with self._lock:
+            for directory in directories:
+                self._globs.setdefault(directory, []).append((name_pattern, service, polled))
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isfile(path) and self.get(path) is None:
+                self.add(self.create_monitor(path, service, False), from_glob=True, polled=polled)
+        return directories
+
+    def _match_glob(self, path):
+        """Returns (service, polled) of the glob matching `path`, or (None, False)."""
+        directory, name = os.path.split(path)
+        for name_pattern, service, polled in self._globs.get(directory, ()):
+            if fnmatch.fnmatch(name, name_pattern):
+                return service, polled
+        return None, False
+
+    def on_modified(self, event):
+        if event.is_directory:
+            return
+        monitor = self._monitors.get(event.src_path)
+        if monitor is not None:
+            monitor.process_new_lines()
+
+    def on_created(self, event):
+        if event.is_directory:
+            return
+        monitor = self._monitors.get(event.src_path)
+        if monitor is not None:
+            monitor.on_created(event)
+            return
+        service, polled = self._match_glob(event.src_path)
+        if service is None:
+            return
+        logger.info(f"Discovered new log file {event.src_path} for service '{service.get('name', 'unknown_service')}'")
+        monitor = self.create_monitor(event.src_path, service, True)
+        self.add(monitor, from_glob=True, polled=polled)
+        monitor.process_new_lines()
+
+    def on_deleted(self, event):
+        if event.is_directory or event.src_path not in self._glob_paths:
+            return
+        with self._lock:
+            monitor = self._monitors.pop(event.src_path, None)
+            self._glob_paths.discard(event.src_path)
+            self._polled.discard(event.src_path)
+        if monitor is not None:
+            logger.info(f"{event.src_path} was deleted, no longer monitoring it")
+            monitor.close()
+
+def create_dispatcher(config, new_line_callback, checkpoints=None):
+    """
+    Creates the LogMonitors for every configured service and the dispatcher
+    routing file events to them. Returns None if there is nothing to monitor.
+    """
     monitoring_config = config.get("monitoring", {})
     services = monitoring_config.get("services", [])
-    log_file = monitoring_config.get("log_file", "app.log")
     buffer_delay = monitoring_config.get("poll_interval", 0.5)
+    segmentation = monitoring_config.get("segmentation", {}) or {}
+    encoding = monitoring_config.get("encoding", "utf-8")
+    encoding_errors = monitoring_config.get("encoding_errors", "replace")
+    chunk_size = monitoring_config.get("read_chunk_size", DEFAULT_CHUNK_SIZE)
+    handle_pool = HandlePool(monitoring_config.get("max_open_files"))
 
-    if not services:
-        logger.error("No services defined in the configuration.")
-        return None
-    
-    observer = Observer()
-    active_monitors = 0
+    matchers = {}
+
+    def create_monitor(log_file, service, from_start):
+        service_name = service.get("name", "unknown_service")
+        project_path = os.path.abspath(service.get("project_path", "."))
+        if service_name not in matchers:
+            matchers[service_name] = triggers.from_config(monitoring_config, service)
+        return LogMonitor(log_file, lambda full_entry: new_line_callback(full_entry, service_name, project_path),
+                          buffer_delay=buffer_delay,
+                          segmentation={**segmentation, **(service.get("segmentation") or {})},
+                          encoding=service.get("encoding", encoding),
+                          encoding_errors=service.get("encoding_errors", encoding_errors),
+                          chunk_size=chunk_size, checkpoints=checkpoints,
+                          service_name=service_name,
+                          matcher=matchers[service_name],
+                          handle_pool=handle_pool, from_start=from_start,
+                          decoder=jsonl.from_config(monitoring_config, service, matchers[service_name]))
 
+    dispatcher = MonitorDispatcher(create_monitor)
     for service in services:
+        if ingest.is_network_service(service):
+            continue
         service_name = service.get("name", "unknown_service")
         log_file = os.path.abspath(service.get("log_file"))
+        polled = poller.service_backend(monitoring_config, service) == 'poll'
+        if glob.has_magic(log_file):
+            if not dispatcher.add_glob(log_file, service, polled=polled):
+                logger.error(f"No log directory matches {log_file} for service '{service_name}'")
+            continue
+
         log_dir = os.path.dirname(log_file)
-        project_path = os.path.abspath(service.get("project_path", "."))
         if not os.path.exists(log_dir):
             logger.error(f"Error log directory does not exist for service '{service_name}': {log_dir}")
             continue
+        dispatcher.add(create_monitor(log_file, service, False), polled=polled)
 
-        def create_callback(svc_name, proj_path):
-            return lambda full_entry: new_line_callback(full_entry, svc_name, proj_path)
-    
-        event_handler = LogMonitor(log_file, create_callback(service_name, project_path), buffer_delay=buffer_delay)
+    if not (dispatcher.directories() or dispatcher.polled_paths() or dispatcher.polled_globs()):
+        return None
+    metrics.MONITORED_FILES.set_function(dispatcher.__len__)
+    metrics.OPEN_FILES.set_function(handle_pool.__len__)
+    logger.info(f"Monitoring {len(dispatcher)} log files, watching {len(dispatcher.directories())} directories "
+                f"(at most {handle_pool.max_open} open at once).")
+    return dispatcher
+
+def start_monitoring(config, new_line_callback):
+    """Starts the watchdog observer to monitor the log files."""
+    services = config.get("monitoring", {}).get("services", [])
+    if not services:
+        logger.error("No services defined in the configuration.")
+        return None
     
-        observer.schedule(event_handler, log_dir, recursive=False)
-        active_monitors += 1
+    checkpoints = checkpoint.from_config(config)
+    if checkpoints:
+        checkpoints.start(get_scheduler())
 
-    if active_monitors == 0:
+    dispatcher = create_dispatcher(config, new_line_callback, checkpoints)
+    if dispatcher is None:
         logger.error("No valid log files to monitor. Exiting.")
         return None
-    
+
+    # One watch per directory, however many files are monitored in it
+    observer = Observer()
+    for directory in dispatcher.directories():
+        observer.schedule(dispatcher, directory, recursive=False)
     observer.start()
-    logger.info(f"Started monitoring log file: {log_file}")
+    # Services with `watch: poll` are stat()ed instead
+    stat_poller = poller.from_config(config.get("monitoring", {}), dispatcher)
+    if stat_poller is not None:
+        stat_poller.start()
 
     try:
         while True:
@@ -120,8 +503,7 @@ def start_monitoring(config, new_line_callback):
         observer.stop()
         logger.info("Stopping log monitor...")
     observer.join()
-
-
-
-
-        
\ No newline at end of file
+    if stat_poller is not None:
+        stat_poller.stop()
+    if checkpoints:
+        checkpoints.stop()
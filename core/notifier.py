@@ -1,13 +1,76 @@
 import os
+import time
+import heapq
+import queue
+import itertools
 import smtplib
 import requests
 import json
 import logging
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+from core.scheduler import get_scheduler
+from core import metrics, ratelimit
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TIMEOUT = 10
+
+# ==========================================
+#  HTTP SESSION POOL
+# ==========================================
+# One keep-alive Session per webhook host, so repeated alerts reuse the
+# TCP/TLS connection instead of handshaking on every post.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _get_session(url):
+    parts = urlsplit(url)
+    host_key = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(host_key)
+        if session is None:
+            session = requests.Session()
+            session.mount(host_key, HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            _sessions[host_key] = session
+        return session
+
+def _channel_timeout(channel_config):
+    return channel_config.get('timeout', DEFAULT_TIMEOUT)
+
+def _send_webhook(channel, channel_config, method, url, **kwargs):
+    """
+    Sends one webhook request within the webhook's rate limit (see
+    ratelimit.for_webhook) and returns the response. A 429 pauses the
+    limiter for as long as the server asks. 429s, 5xx answers and network
+    errors raise RetryableDelivery, so the dispatcher can retry them.
+    """
+    limiter = ratelimit.for_webhook(channel, channel_config)
+    # The dispatcher waits for the limiter itself; this only covers a token taken by another sender
+    if limiter is not None and not limiter.acquire(timeout=_channel_timeout(channel_config)):
+        raise ratelimit.RetryableDelivery(f"{channel} webhook is rate limited", retry_after=limiter.delay())
+    try:
+        response = getattr(_get_session(url), method)(url, timeout=_channel_timeout(channel_config), **kwargs)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        raise ratelimit.RetryableDelivery(f"{channel} webhook unreachable: {e}") from e
+
+    if response.status_code == 429:
+        wait = ratelimit.retry_after(response)
+        if limiter is not None and wait:
+            limiter.pause(wait)
+        metrics.NOTIFICATIONS.labels(channel, 'rate_limited').inc()
+        raise ratelimit.RetryableDelivery(f"{channel} webhook rate limited (retry after {wait}s)", retry_after=wait)
+    if response.status_code >= 500:
+        raise ratelimit.RetryableDelivery(f"{channel} webhook answered {response.status_code}",
+                                          retry_after=ratelimit.retry_after(response))
+    if limiter is not None:
+        ratelimit.observe(limiter, response)
+    return response
+
 def send_slack_alert(log_entry, ai_analysis, service_name, config):
     """
     Sends a formatted message to a Slack channel using a Webhook URL.
@@ -55,106 +118,327 @@ def send_slack_alert(log_entry, ai_analysis, service_name, config):
     }
 
     try:
-        response = requests.post(
+        response = _send_webhook(
+            'slack', slack_config, 'post',
             webhook_url, 
             data=json.dumps(payload),
             headers={'Content-Type': 'application/json'}
         )
         if response.status_code == 200:
             logger.info("Slack alert sent successfully.")
-        else:
-            logger.error(f"Failed to send Slack alert: {response.text}")
+            return True
+        logger.error(f"Failed to send Slack alert: {response.text}")
+    except ratelimit.RetryableDelivery:
+        raise
     except Exception as e:
         logger.error(f"Error sending Slack request: {e}")
+    return False
+
+def _location_text(parsed_data):
+    if not parsed_data:
+        return "unknown"
+    return f"{parsed_data.get('filepath')}:{parsed_data.get('lineno')}"
 
-def send_email_alert(log_entry, ai_analysis, service_name, config):
+def send_slack_provisional(log_entry, parsed_data, service_name, config):
     """
-    Sends an email using standard SMTP.
+    Posts the error and its location as soon as analysis starts. Incoming
+    webhooks can't edit messages, so the analysis follows as a second message.
     """
-    # 1. Check if Email is enabled
-    logger.debug("Checking email notification settings...")
-    email_config = config.get('notifications', {}).get('email', {})
-    if not email_config.get('enabled'):
-        logger.debug("Email notifications are disabled in config.")
-        return
+    slack_config = config.get('notifications', {}).get('slack', {})
+    webhook_url = slack_config.get('webhook_url')
+    if not (slack_config.get('enabled') and webhook_url):
+        return None
 
-    # 2. Get Credentials
-    smtp_server = email_config.get('smtp_server')
-    smtp_port = email_config.get('smtp_port')
+    payload = {
+        "text": f"🚨 *Crash Detected in {service_name}* 🚨 (analysis in progress)",
+        "blocks": [
+            {"type": "header", "text": {"type": "plain_text", "text": f"Error in {service_name}"}},
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Error Detected:*\n`{log_entry.strip()}`"}},
+            {"type": "section", "text": {"type": "mrkdwn",
+                                         "text": f"*Location:* `{_location_text(parsed_data)}`\n_🤖 AI analysis in progress..._"}},
+        ]
+    }
+    try:
+        response = _send_webhook(
+            'slack', slack_config, 'post',
+            webhook_url,
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'}
+        )
+        if response.status_code == 200:
+            return True
+        logger.error(f"Failed to send provisional Slack alert: {response.text}")
+    except Exception as e:
+        logger.error(f"Error sending provisional Slack request: {e}")
+    return None
+
+def should_notify(channel_config, log_entry):
+    """
+    Honors the per-channel `notify_on` list: the entry must contain one of the
+    listed levels. Channels without `notify_on` receive every alert.
+    """
+    notify_on = channel_config.get('notify_on')
+    if not notify_on:
+        return True
+    upper_entry = log_entry.upper()
+    return any(level.upper() in upper_entry for level in notify_on)
+
+# ==========================================
+#  SMTP CONNECTION REUSE
+# ==========================================
+def _session_lost(error):
+    """True for errors meaning the SMTP session is gone: a disconnect, a network error or 421."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    # SMTPException is an OSError too
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+class SMTPConnection:
+    """
+    A long-lived SMTP session that is reused across alerts.
+
+    The TLS handshake and login happen once. If the server has dropped the
+    connection (idle timeout, 421, ...) it is re-established and the message
+    is retried once.
+    """
+
+    def __init__(self, smtp_server, smtp_port, sender_email, password, timeout=DEFAULT_TIMEOUT, starttls=True):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.password = password
+        self.timeout = timeout
+        self.starttls = starttls
+        self.server = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        logger.info(f"Connecting to {self.smtp_server}:{self.smtp_port}...")
+
+        # IF PORT IS 465 -> Use SMTP_SSL (Implicit SSL)
+        if self.smtp_port == 465:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+
+        # IF PORT IS 587 -> Use SMTP + starttls (Explicit TLS)
+        # (starttls: false is only for plaintext local relays)
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+
+        server.login(self.sender_email, self.password)
+        self.server = server
+
+    def _drop(self):
+        if self.server is not None:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+        self.server = None
+
+    def sendmail(self, recipients, message):
+        with self._lock:
+            for attempt in range(2):
+                if self.server is None:
+                    self._connect()
+                try:
+                    self.server.sendmail(self.sender_email, recipients, message)
+                    return
+                except Exception as e:
+                    # Only a dropped/expired session is worth a reconnect; a rejected
+                    # message (552, 554, refused sender, ...) would just be refused again
+                    if not _session_lost(e):
+                        raise
+                    self._drop()
+                    if attempt == 1:
+                        raise
+                    logger.info(f"SMTP connection to {self.smtp_server} was lost ({e}), reconnecting...")
+
+    def close(self):
+        with self._lock:
+            if self.server is not None:
+                try:
+                    self.server.quit()
+                except Exception:
+                    pass
+            self.server = None
+
+_smtp_connections = {}
+_smtp_lock = threading.Lock()
+
+def _get_smtp_connection(email_config):
+    key = (email_config.get('smtp_server'), email_config.get('smtp_port'), email_config.get('sender_email'))
+    with _smtp_lock:
+        connection = _smtp_connections.get(key)
+        if connection is None or connection.password != email_config.get('password'):
+            connection = SMTPConnection(
+                email_config.get('smtp_server'),
+                email_config.get('smtp_port'),
+                email_config.get('sender_email'),
+                email_config.get('password'),
+                timeout=_channel_timeout(email_config),
+                starttls=email_config.get('starttls', True)
+            )
+            _smtp_connections[key] = connection
+        return connection
+
+def close_smtp_connections():
+    """Closes every pooled SMTP session (used on shutdown and in tests)."""
+    with _smtp_lock:
+        connections = list(_smtp_connections.values())
+        _smtp_connections.clear()
+    for connection in connections:
+        connection.close()
+
+def _deliver_email(email_config, subject, body):
+    """Sends one HTML email over the pooled connection. Returns True on success."""
     sender_email = email_config.get('sender_email')
     recipients = email_config.get('recipients', [])
-    
-    
-    password = email_config.get('password') 
-
-    if not (smtp_server and password):
-        logger.warning("Email enabled but missing configuration or password.")
-        return
 
-    # 3. Construct Email
     msg = MIMEMultipart()
     msg['From'] = sender_email
     msg['To'] = ", ".join(recipients)
-    msg['Subject'] = f"🚨 Log Error Detected: {log_entry[:50]}..."
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'html'))
+
+    try:
+        _get_smtp_connection(email_config).sendmail(recipients, msg.as_string())
+        logger.info(f"Email sent to {len(recipients)} recipients.")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to send email: {e}")
+        return False
 
-    body = f"""
+def _email_section(log_entry, ai_analysis, service_name):
+    return f"""
     <h2>Error Detected in Service: {service_name}</h2>
     <pre style="background-color: #f4f4f4; padding: 10px;">{log_entry}</pre>
     
     <h3>🤖 AI Analysis & Fix</h3>
     <div style="white-space: pre-wrap;">{ai_analysis}</div>
     """
-    msg.attach(MIMEText(body, 'html'))
 
-    # 4. Send
-    try:
-        logger.info(f"Connecting to {smtp_server}:{smtp_port}...")
-        
-        # IF PORT IS 465 -> Use SMTP_SSL (Implicit SSL)
-        if smtp_port == 465:
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        
-        # IF PORT IS 587 -> Use SMTP + starttls (Explicit TLS)
+# ==========================================
+#  EMAIL DIGEST
+# ==========================================
+class EmailDigest:
+    """
+    Collects email alerts per service and sends them as one message once the
+    digest window closes. The window opens with the first alert for a service.
+    Each alert may carry an on_sent(ok) callback, called once its digest was
+    actually sent (or failed to be).
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, log_entry, ai_analysis, service_name, email_config, on_sent=None):
+        window = email_config.get('digest', {}).get('window_seconds', 300)
+        with self._lock:
+            batch = self._pending.get(service_name)
+            if batch is None:
+                batch = {'alerts': [], 'email_config': email_config, 'callbacks': []}
+                self._pending[service_name] = batch
+                get_scheduler().schedule((self, service_name), window, lambda: self._flush_async(service_name))
+            batch['alerts'].append((log_entry, ai_analysis))
+            if on_sent is not None:
+                batch['callbacks'].append(on_sent)
+
+    def _flush_async(self, service_name):
+        # SMTP is slow; keep it off the shared scheduler thread
+        threading.Thread(target=self.flush, args=(service_name,), name="email-digest", daemon=True).start()
+
+    def flush(self, service_name):
+        """Sends the digest for a service immediately."""
+        with self._lock:
+            batch = self._pending.pop(service_name, None)
+            # Under the same lock, so a batch opened by a concurrent add() keeps its deadline
+            if batch:
+                get_scheduler().cancel((self, service_name))
+        if not batch:
+            return None
+
+        alerts = batch['alerts']
+        if len(alerts) == 1:
+            log_entry, ai_analysis = alerts[0]
+            subject = f"🚨 Log Error Detected: {log_entry[:50]}..."
         else:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls() 
+            subject = f"🚨 {len(alerts)} Log Errors Detected in {service_name}"
+        body = "<hr>".join(_email_section(log_entry, ai_analysis, service_name) for log_entry, ai_analysis in alerts)
+        result = _deliver_email(batch['email_config'], subject, body)
+        for on_sent in batch['callbacks']:
+            try:
+                on_sent(bool(result))
+            except Exception as e:
+                logger.error(f"Email digest callback failed: {e}")
+        return result
 
-        server.login(sender_email, password)
-        server.sendmail(sender_email, recipients, msg.as_string())
-        server.quit()
-        logger.info(f"Email sent to {len(recipients)} recipients.")
-    except Exception as e:
-        logger.error(f"Failed to send email: {e}")
+    def flush_all(self):
+        with self._lock:
+            services = list(self._pending)
+        for service_name in services:
+            self.flush(service_name)
 
+email_digest = EmailDigest()
 
+def digest_enabled(email_config):
+    return bool(email_config.get('digest', {}).get('enabled'))
 
-def send_discord_alert(log_entry, ai_analysis, service_name, config):
-    """Sends a formatted alert to a Discord channel."""
-    
-    discord_config = config.get('notifications', {}).get('discord', {})
-    if not discord_config.get('enabled'):
+def send_email_alert(log_entry, ai_analysis, service_name, config, on_sent=None):
+    """
+    Sends an email using standard SMTP, or adds it to the service's digest
+    when digest mode is enabled; on_sent(ok) is then called when the digest
+    goes out.
+    """
+    # 1. Check if Email is enabled
+    logger.debug("Checking email notification settings...")
+    email_config = config.get('notifications', {}).get('email', {})
+    if not email_config.get('enabled'):
+        logger.debug("Email notifications are disabled in config.")
         return
 
-    
-    webhook_url = discord_config.get('webhook_url')
+    # 2. Get Credentials
+    smtp_server = email_config.get('smtp_server')
+    password = email_config.get('password') 
+
+    if not (smtp_server and password):
+        logger.warning("Email enabled but missing configuration or password.")
+        return
+
+    # 3. Batch into the digest, or send right away
+    if digest_enabled(email_config):
+        email_digest.add(log_entry, ai_analysis, service_name, email_config, on_sent)
+        return True
+
+    subject = f"🚨 Log Error Detected: {log_entry[:50]}..."
+    return _deliver_email(email_config, subject, _email_section(log_entry, ai_analysis, service_name))
+
+
 
+def _discord_payload(log_entry, ai_analysis, service_name, location=None):
     # Truncated strings as  discord limits embed descriptions to 4096 characters and field values to 1024
     safe_error = log_entry[:1000]
     safe_fix = ai_analysis[:1000]
 
-    payload = {
+    fields = []
+    if location:
+        fields.append({"name": "📍 Location", "value": f"`{location}`"})
+    fields.append({
+        "name": "🧠 AI Suggested Fix",
+        "value": f"{safe_fix}"
+    })
+    return {
         "username": "AI Log Analyzer",
         "embeds": [
             {
                 "title": f"🚨 Crash Detected in {service_name}",
                 "description": f"**Raw Error Trace:**\n```python\n{safe_error}\n```",
                 "color": 15158332, 
-                "fields": [
-                    {
-                        "name": "🧠 AI Suggested Fix",
-                        "value": f"{safe_fix}"
-                    }
-                ],
+                "fields": fields,
                 "footer": {
                     "text": "Powered by RAG Middleware"
                 }
@@ -162,9 +446,486 @@ def send_discord_alert(log_entry, ai_analysis, service_name, config):
         ]
     }
 
+def _discord_message_url(webhook_url, message_id=None, wait=False):
+    """The webhook URL, or the URL of one of its messages, keeping any query (e.g. thread_id)."""
+    parts = urlsplit(webhook_url)
+    path = parts.path.rstrip('/')
+    if message_id is not None:
+        path += f"/messages/{message_id}"
+    query = parts.query
+    if wait:
+        query = f"{query}&wait=true" if query else "wait=true"
+    return urlunsplit((parts.scheme, parts.netloc, path, query, parts.fragment))
+
+def send_discord_provisional(log_entry, parsed_data, service_name, config):
+    """
+    Posts the error and its location right away. Returns the message id, so
+    update_discord_alert can fill in the analysis later.
+    """
+    discord_config = config.get('notifications', {}).get('discord', {})
+    webhook_url = discord_config.get('webhook_url')
+    if not (discord_config.get('enabled') and webhook_url):
+        return None
+
+    payload = _discord_payload(log_entry, "_Analysis in progress..._", service_name, _location_text(parsed_data))
+    try:
+        response = _send_webhook('discord', discord_config, 'post',
+                                 _discord_message_url(webhook_url, wait=True), json=payload)
+        response.raise_for_status()
+        return response.json().get('id')
+    except (requests.exceptions.RequestException, ratelimit.RetryableDelivery, ValueError) as e:
+        logger.error(f"Failed to send provisional Discord alert: {e}")
+        return None
+
+def update_discord_alert(message_id, log_entry, ai_analysis, service_name, config, parsed_data=None):
+    """Edits a provisional Discord alert in place with the finished analysis."""
+    discord_config = config.get('notifications', {}).get('discord', {})
+    webhook_url = discord_config.get('webhook_url')
+    payload = _discord_payload(log_entry, ai_analysis, service_name, _location_text(parsed_data) if parsed_data else None)
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = _send_webhook('discord', discord_config, 'patch',
+                                 _discord_message_url(webhook_url, message_id), json=payload)
         response.raise_for_status()
-        print(f"✅ Discord alert sent for {service_name}")
+        logger.info(f"Discord alert updated for {service_name}.")
+        return True
     except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to send Discord alert: {e}")
+        logger.error(f"Failed to update Discord alert: {e}")
+        return False
+
+def send_discord_alert(log_entry, ai_analysis, service_name, config):
+    """Sends a formatted alert to a Discord channel."""
+    
+    discord_config = config.get('notifications', {}).get('discord', {})
+    if not discord_config.get('enabled'):
+        return
+
+    
+    webhook_url = discord_config.get('webhook_url')
+    if not webhook_url:
+        logger.warning("Discord enabled but Webhook URL not found in environment.")
+        return
+
+    payload = _discord_payload(log_entry, ai_analysis, service_name)
+
+    try:
+        response = _send_webhook('discord', discord_config, 'post', webhook_url, json=payload)
+        response.raise_for_status()
+        logger.info(f"Discord alert sent for {service_name}.")
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to send Discord alert: {e}")
+        return False
+
+
+# ==========================================
+#  PARALLEL DISPATCH
+# ==========================================
+CHANNELS = {
+    'slack': send_slack_alert,
+    'email': send_email_alert,
+    'discord': send_discord_alert,
+}
+
+# Channels that can post an alert before the analysis is done: provisional
+# sender, and optionally an updater that edits that alert once the analysis
+# arrives. Without an updater the analysis is sent as a normal follow-up alert.
+PROVISIONAL_CHANNELS = {
+    'slack': send_slack_provisional,
+    'discord': send_discord_provisional,
+}
+UPDATE_CHANNELS = {
+    'discord': update_discord_alert,
+}
+# Provisional alerts still waiting for their analysis
+MAX_PENDING_PROVISIONAL = 1000
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 60.0
+# On close, retries due later than this are given up
+CLOSE_RETRY_WINDOW = 10.0
+# Characters of each merged alert's analysis kept in a summary
+SUMMARY_BUDGET = 2800
+
+def summarize_alerts(alerts, service_name):
+    """
+    One (log_entry, ai_analysis) standing in for several alerts of a service,
+    sent instead of them while the channel is rate limited. Identical errors
+    are listed once with a count.
+    """
+    grouped = OrderedDict()
+    for log_entry, ai_analysis in alerts:
+        first_line = log_entry.strip().split('\n', 1)[0][:200]
+        if first_line in grouped:
+            grouped[first_line][1] += 1
+        else:
+            grouped[first_line] = [ai_analysis, 1]
+
+    budget = max(100, SUMMARY_BUDGET // len(grouped))
+    lines, analyses = [], []
+    for number, (first_line, (ai_analysis, count)) in enumerate(grouped.items(), 1):
+        repeated = f" (x{count})" if count > 1 else ""
+        lines.append(f"{number}. {first_line}{repeated}")
+        analysis = ai_analysis.strip()
+        if len(analysis) > budget:
+            analysis = analysis[:budget] + "..."
+        analyses.append(f"*{number}.* {analysis}")
+    log_entry = f"{len(alerts)} alerts for {service_name}, merged while rate limited:\n" + "\n".join(lines)
+    return log_entry, "\n\n".join(analyses)
+
+class _Delivery:
+    """
+    Calls on_done(ok) once every channel an alert was queued for is done with
+    it; ok is False when any of them failed, gave up or dropped the alert.
+    """
+
+    def __init__(self, on_done):
+        self.on_done = on_done
+        # The extra one is released by dispatch() after queueing, so on_done can't fire early
+        self._pending = 1
+        self._ok = True
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self._pending += 1
+
+    def finish(self, ok):
+        with self._lock:
+            self._ok = self._ok and ok
+            self._pending -= 1
+            if self._pending:
+                return
+        try:
+            self.on_done(self._ok)
+        except Exception as e:
+            logger.error(f"Delivery callback failed: {e}")
+
+class NotificationDispatcher:
+    """
+    Fans alerts out to every enabled channel in parallel.
+
+    Each channel has its own bounded queue and worker thread, so a slow SMTP
+    server or webhook only delays its own channel and never the analysis thread.
+    When a channel queue is full the alert is dropped for that channel.
+
+    dispatch_provisional() announces an error before its analysis is ready. The
+    matching dispatch() then edits that alert where the channel supports it,
+    or follows up with the full alert. Both go through the same per-channel
+    queue, so the provisional alert is always handled first.
+
+    Webhook channels are rate limited per webhook (see core.ratelimit). A
+    delivery that fails with a 429, a 5xx or a network error is retried up to
+    `retry.max_attempts` times, after the server's Retry-After or a jittered
+    exponential backoff. When a channel's bucket is empty, its queued alerts
+    for the same service are merged into one summary message (`coalesce`,
+    on by default) instead of waiting in line or being dropped.
+
+    dispatch() takes an optional on_done(ok) callback, called once every
+    channel has finished with the alert (see core.spool).
+    """
+
+    def __init__(self, config, channels=None, queue_size=100, provisional=None, updaters=None):
+        self.config = config
+        self.channels = channels or CHANNELS
+        self.provisional = PROVISIONAL_CHANNELS if provisional is None else provisional
+        self.updaters = UPDATE_CHANNELS if updaters is None else updaters
+        self._pending = OrderedDict()
+        self._queues = {}
+        self._workers = {}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+        self._channel_configs = {}
+        self._limiters = {}
+        notifications = config.get('notifications', {})
+        for name in self.channels:
+            if not notifications.get(name, {}).get('enabled'):
+                continue
+            self._channel_configs[name] = notifications[name]
+            self._limiters[name] = ratelimit.for_webhook(name, notifications[name])
+            self._queues[name] = queue.Queue(maxsize=queue_size)
+            self._stats[name] = {'sent': 0, 'failed': 0, 'dropped': 0, 'retried': 0, 'coalesced': 0,
+                                 'last_latency': None, 'total_latency': 0.0}
+            worker = threading.Thread(target=self._run, args=(name,), name=f"notify-{name}", daemon=True)
+            worker.start()
+            self._workers[name] = worker
+            metrics.QUEUE_DEPTH.labels(f'notify_{name}').set_function(self._queues[name].qsize)
+
+    def dispatch_provisional(self, log_entry, parsed_data, service_name):
+        """Queues an early alert (error and location, no analysis) on the channels that support it."""
+        # announced: channels whose provisional alert has been handled (sent or not)
+        alert = {'parsed': parsed_data, 'handles': {}, 'announced': set()}
+        with self._stats_lock:
+            self._pending[(service_name, log_entry)] = alert
+            while len(self._pending) > MAX_PENDING_PROVISIONAL:
+                self._pending.popitem(last=False)
+        self._enqueue(('provisional', log_entry, parsed_data, service_name, alert, ()),
+                      [name for name in self._queues if name in self.provisional])
+
+    def dispatch(self, log_entry, ai_analysis, service_name, on_done=None):
+        """
+        Queues an alert for every enabled channel (subject to notify_on) without
+        blocking. on_done(ok), if given, is called once all of them are done.
+        """
+        with self._stats_lock:
+            alert = self._pending.pop((service_name, log_entry), None)
+        deliveries = (_Delivery(on_done),) if on_done is not None else ()
+        self._enqueue(('final', log_entry, ai_analysis, service_name, alert, deliveries), list(self._queues))
+        for delivery in deliveries:
+            delivery.finish(True)
+
+    def _enqueue(self, item, names):
+        log_entry, service_name, deliveries = item[1], item[3], item[5]
+        for name in names:
+            channel_queue = self._queues[name]
+            if not should_notify(self._channel_configs[name], log_entry):
+                continue
+            for delivery in deliveries:
+                delivery.add()
+            try:
+                channel_queue.put_nowait(item)
+            except queue.Full:
+                self._finish(item, False)
+                if item[0] == 'provisional':
+                    item[4]['announced'].add(name)
+                with self._stats_lock:
+                    self._stats[name]['dropped'] += 1
+                metrics.NOTIFICATIONS.labels(name, 'dropped').inc()
+                logger.warning(f"Notification queue for {name} is full, dropping alert for {service_name}.")
+
+    def _run(self, name):
+        channel_queue = self._queues[name]
+        channel_config = self._channel_configs[name]
+        retry_config = channel_config.get('retry', {}) or {}
+        max_attempts = retry_config.get('max_attempts', DEFAULT_MAX_ATTEMPTS)
+        base_delay = retry_config.get('base_delay', DEFAULT_RETRY_BASE_DELAY)
+        max_delay = retry_config.get('max_delay', DEFAULT_RETRY_MAX_DELAY)
+        limiter = self._limiters[name]
+        coalesce = limiter is not None and channel_config.get('coalesce', True)
+
+        # (item, attempt, taken from the queue) not delivered yet, and a heap of (due, seq, item, attempt)
+        # holding retries and alerts waiting for the rate limiter
+        backlog = deque()
+        retries = []
+        sequence = itertools.count()
+        closing = False
+        close_deadline = None
+        # Alerts deferred by the limiter keep their order: each is due no earlier than the previous one
+        deferred_until = 0.0
+
+        def schedule(due, item, attempt):
+            if closing and due > close_deadline:
+                self._record(name, 'failed')
+                self._finish(item, False)
+                logger.warning(f"Giving up a {name} alert for {item[3]}, it can't be sent before shutdown.")
+                return
+            heapq.heappush(retries, (due, next(sequence), item, attempt))
+
+        while True:
+            now = time.monotonic()
+            while retries and retries[0][0] <= now:
+                _, _, item, attempt = heapq.heappop(retries)
+                backlog.append((item, attempt, False))
+            if not backlog:
+                if closing and not retries:
+                    return
+                try:
+                    item = channel_queue.get(timeout=max(0.0, retries[0][0] - now) if retries else None)
+                except queue.Empty:
+                    continue
+                backlog.append((item, 1, True))
+
+            item, attempt, queued = backlog.popleft()
+            if item is None:
+                channel_queue.task_done()
+                closing = True
+                close_deadline = now + CLOSE_RETRY_WINDOW
+                given_up = [retry for retry in retries if retry[0] > close_deadline]
+                if given_up:
+                    retries = [retry for retry in retries if retry[0] <= close_deadline]
+                    heapq.heapify(retries)
+                    self._record(name, 'failed', count=len(given_up))
+                    for _, _, retry_item, _ in given_up:
+                        self._finish(retry_item, False)
+                    logger.warning(f"Giving up {len(given_up)} {name} alerts still waiting for a retry.")
+                continue
+
+            kind, log_entry, payload, service_name, alert, _ = item
+            taken = int(queued)
+            if kind == 'final' and coalesce and limiter.delay() > 0 and self._mergeable(name, alert):
+                item, merged = self._coalesce(name, item, backlog, channel_queue, retries)
+                taken += merged
+
+            # Wait for the limiter here rather than blocking in the sender, so retries and close() are still served
+            wait = limiter.delay() if limiter is not None else 0.0
+            if wait > 0:
+                deferred_until = max(deferred_until, time.monotonic() + wait)
+                schedule(deferred_until, item, attempt)
+                for _ in range(taken):
+                    channel_queue.task_done()
+                continue
+
+            if kind == 'provisional':
+                self._send_provisional(name, log_entry, payload, service_name, alert)
+                for _ in range(taken):
+                    channel_queue.task_done()
+                continue
+
+            start = time.monotonic()
+            retry_after = None
+            # A digested email is only delivered once the digest is sent, which finishes the item then
+            digested = self._digested(name, item)
+            try:
+                ok = self._deliver(name, item)
+            except ratelimit.RetryableDelivery as e:
+                ok, retry_after = None, e.retry_after
+                logger.warning(f"{name} delivery for {service_name} failed (attempt {attempt}): {e}")
+            except Exception as e:
+                logger.error(f"Unexpected error in {name} notifier: {e}")
+                ok = False
+            latency = time.monotonic() - start
+
+            if ok is None and attempt < max_attempts:
+                delay = ratelimit.backoff_delay(attempt, base_delay, max_delay, retry_after)
+                schedule(time.monotonic() + delay, item, attempt + 1)
+                self._record(name, 'retried')
+                logger.info(f"Retrying {name} delivery for {service_name} in {delay:.1f}s")
+            else:
+                self._record(name, 'sent' if ok else 'failed', latency)
+                logger.info(f"{name} delivery for {service_name} {'succeeded' if ok else 'failed'} in {latency * 1000:.0f} ms")
+                if not (ok and digested):
+                    self._finish(item, bool(ok))
+            for _ in range(taken):
+                channel_queue.task_done()
+
+    def _handle(self, name, alert):
+        """The provisional message this alert should edit on channel `name`, if any."""
+        return alert['handles'].get(name) if alert else None
+
+    def _mergeable(self, name, alert):
+        """
+        Whether a final alert can go into a summary on channel `name`: it has no
+        provisional message to edit there, and none still queued that would be
+        left unanswered.
+        """
+        if alert is None:
+            return True
+        if name in self.provisional and name not in alert['announced']:
+            return False
+        return self._handle(name, alert) is None
+
+    def _finish(self, item, ok):
+        for delivery in item[5]:
+            delivery.finish(ok)
+
+    def _digested(self, name, item):
+        return bool(item[5]) and self.channels[name] is send_email_alert and digest_enabled(self._channel_configs[name])
+
+    def _deliver(self, name, item):
+        _, log_entry, ai_analysis, service_name, alert, _ = item
+        handle = self._handle(name, alert)
+        update = self.updaters.get(name)
+        if handle is not None and update is not None:
+            return update(handle, log_entry, ai_analysis, service_name, self.config, alert['parsed'])
+        if self._digested(name, item):
+            return send_email_alert(log_entry, ai_analysis, service_name, self.config,
+                                    on_sent=lambda ok: self._finish(item, ok))
+        return self.channels[name](log_entry, ai_analysis, service_name, self.config)
+
+    def _coalesce(self, name, item, backlog, channel_queue, retries):
+        """
+        Merges `item` with every other waiting alert for the same service
+        (queued, or deferred on the `retries` heap) into one summary alert.
+        Returns it and how many of the merged alerts were taken from the queue.
+        """
+        while True:
+            try:
+                backlog.append((channel_queue.get_nowait(), 1, True))
+            except queue.Empty:
+                break
+        service_name = item[3]
+
+        def mergeable(other):
+            return (other is not None and other[0] == 'final' and other[3] == service_name
+                    and self._mergeable(name, other[4]))
+
+        same = [entry for entry in backlog if mergeable(entry[0])]
+        for entry in same:
+            backlog.remove(entry)
+        waiting = [retry for retry in retries if mergeable(retry[2])]
+        if waiting:
+            retries[:] = [retry for retry in retries if not mergeable(retry[2])]
+            heapq.heapify(retries)
+            same += [(retry[2], retry[3], False) for retry in waiting]
+        if not same:
+            return item, 0
+        alerts = [(item[1], item[2])] + [(entry[0][1], entry[0][2]) for entry in same]
+        log_entry, ai_analysis = summarize_alerts(alerts, service_name)
+        self._record(name, 'coalesced', count=len(same))
+        logger.info(f"{name} is rate limited, merged {len(alerts)} alerts for {service_name} into one.")
+        deliveries = item[5] + tuple(delivery for entry in same for delivery in entry[0][5])
+        return ('final', log_entry, ai_analysis, service_name, None, deliveries), sum(1 for entry in same if entry[2])
+
+    def _record(self, name, result, latency=None, count=1):
+        metrics.NOTIFICATIONS.labels(name, result).inc(count)
+        if latency is not None:
+            metrics.NOTIFY_SECONDS.labels(name).observe(latency)
+        with self._stats_lock:
+            stats = self._stats[name]
+            stats[result] += count
+            if latency is not None:
+                stats['last_latency'] = latency
+                stats['total_latency'] += latency
+
+    def _send_provisional(self, name, log_entry, parsed_data, service_name, alert):
+        try:
+            handle = self.provisional[name](log_entry, parsed_data, service_name, self.config)
+        except Exception as e:
+            logger.error(f"Unexpected error in {name} provisional notifier: {e}")
+            handle = None
+        if handle is not None:
+            alert['handles'][name] = handle
+        alert['announced'].add(name)
+        metrics.NOTIFICATIONS.labels(name, 'provisional' if handle is not None else 'provisional_failed').inc()
+
+    def stats(self):
+        """Returns per-channel delivery counters and latencies (seconds)."""
+        with self._stats_lock:
+            report = {}
+            for name, stats in self._stats.items():
+                attempts = stats['sent'] + stats['failed']
+                report[name] = {
+                    'sent': stats['sent'],
+                    'failed': stats['failed'],
+                    'dropped': stats['dropped'],
+                    'retried': stats['retried'],
+                    'coalesced': stats['coalesced'],
+                    'queued': self._queues[name].qsize(),
+                    'last_latency': stats['last_latency'],
+                    'avg_latency': (stats['total_latency'] / attempts) if attempts else None,
+                }
+            return report
+
+    def join(self):
+        """Blocks until every queued alert has been attempted."""
+        for channel_queue in self._queues.values():
+            channel_queue.join()
+
+    def close(self):
+        """Lets the workers finish what is queued, then stops them."""
+        for channel_queue in self._queues.values():
+            channel_queue.put(None)
+        for worker in self._workers.values():
+            worker.join()
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher(config):
+    """Returns the process-wide NotificationDispatcher, creating it on first use."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            dispatcher_config = config.get('notifications', {}).get('dispatcher', {}) or {}
+            _dispatcher = NotificationDispatcher(config, queue_size=dispatcher_config.get('queue_size', 100))
+        return _dispatcher
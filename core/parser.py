@@ -3,45 +3,55 @@ import re
 # ==========================================
 #  REGEX PATTERNS
 # ==========================================
+# 'hints' are literals that must appear somewhere in an entry for the regex to
+# have a chance of matching; parse_entry skips patterns whose hints are absent.
 PATTERNS = [
     {
         'lang': 'python',
+        'hints': ('File "',),
         # Example: File "src/main.py", line 42, in <module>
         'regex': re.compile(r'File "(?P<path>.*?)", line (?P<line>\d+)')
     },
     {
         'lang': 'node',
+        'hints': ('(/',),
         # Example: at Object.<anonymous> (/app/server.js:10:5)
         'regex': re.compile(r'\((?P<path>/.*?):(?P<line>\d+):\d+\)')
     },
     {
         'lang': 'php',
+        'hints': ('.php',),
         # Example 1: PHP Fatal error: ... in /var/www/html/index.php on line 14
         # Example 2: ... in /app/config.php:52
         'regex': re.compile(r'in\s+(?P<path>.*\.php)(?:\s+on\s+line\s+|:)(?P<line>\d+)')
     },
     {
         'lang': 'ruby',
+        'hints': ('.rb:',),
         # Example: app/models/user.rb:45:in `save'
         'regex': re.compile(r'(?P<path>.*\.rb):(?P<line>\d+):in')
     },
     {
         'lang': 'java',
+        'hints': ('.java:',),
         # Example: at com.example.Main.main(Main.java:14)
         'regex': re.compile(r'\((?P<path>.*?\.java):(?P<line>\d+)\)')
     },
     {
         'lang': 'rust',
+        'hints': ('at', '-->'),
         # Example: thread 'main' panicked at 'index out of bounds', src/main.rs:4:5
         'regex': re.compile(r'(?:at|-->)\s+(?P<path>.*?):(?P<line>\d+)(?::\d+)?')
     },
     {
         'lang': 'go',
+        'hints': ('.go:',),
         # Example: /usr/local/go/src/runtime/panic.go:884 +0x212
         'regex': re.compile(r'\s+(?P<path>.*?\.go):(?P<line>\d+)')
     },
     {
         'lang': 'cpp',
+        'hints': ('.c:', '.cpp:', '.h:', '.hpp:'),
         # Example: main.cpp:15:10: error: expected ';'
         'regex': re.compile(r'(?P<path>.*?\.(?:c|cpp|h|hpp)):(?P<line>\d+):')
     }
@@ -61,3 +71,76 @@ def parse_log_line(log_line):
             }
     
     return None
+
+# Paths containing any of these are treated as third-party frames
+LIBRARY_KEYWORDS = ['site-packages', 'dist-packages', 'node_modules', '/usr/lib', 'lib/python']
+
+def is_library_path(filepath):
+    return any(kw in filepath for kw in LIBRARY_KEYWORDS)
+
+def _compile_hint_finders():
+    """Builds one literal alternation per pattern to locate lines worth searching."""
+    finders = []
+    for pattern in PATTERNS:
+        hints = pattern.get('hints')
+        finders.append(re.compile('|'.join(re.escape(hint) for hint in hints)) if hints else None)
+    return finders
+
+HINT_FINDERS = _compile_hint_finders()
+
+def _candidate_lines(text, finder):
+    """Yields the (start, end) span of every line containing a hint, or of every line."""
+    length = len(text)
+    pos = 0
+    while pos <= length:
+        if finder is None:
+            line_start = pos
+        else:
+            hit = finder.search(text, pos)
+            if hit is None:
+                return
+            line_start = text.rfind('\n', 0, hit.start()) + 1
+        line_end = text.find('\n', line_start)
+        if line_end == -1:
+            line_end = length
+        yield line_start, line_end
+        pos = line_end + 1
+
+def parse_entry(log_entry):
+    """
+    Parses a whole (possibly multi-line) log entry.
+
+    Instead of running every regex on every line, each pattern only searches the
+    lines that contain one of its literal hints and that no higher-priority
+    pattern has already claimed. The result per line is identical to
+    parse_log_line.
+
+    Returns all detected frames in the order they appear, plus the best frame:
+    the bottom-most non-library frame, falling back to the bottom-most library frame.
+    """
+    text = log_entry.strip()
+    per_line = {}
+    for pattern, finder in zip(PATTERNS, HINT_FINDERS):
+        regex = pattern['regex']
+        for line_start, line_end in _candidate_lines(text, finder):
+            if line_start in per_line:
+                continue
+            match = regex.search(text, line_start, line_end)
+            if match:
+                per_line[line_start] = {
+                    'filepath': match.group('path').strip(),
+                    'lineno': int(match.group('line')),
+                    'type': pattern['lang']
+                }
+
+    frames = [per_line[line_start] for line_start in sorted(per_line)]
+
+    best_match = None
+    for frame in reversed(frames):
+        if not is_library_path(frame['filepath']):
+            best_match = frame
+            break
+        if not best_match:
+            best_match = frame
+
+    return {'frames': frames, 'best_match': best_match}
@@ -0,0 +1,458 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque, OrderedDict
+
+from core import batcher, metrics
+
+logger = logging.getLogger(__name__)
+
+SHED_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+# Marks an ingested entry that still has to go through detect
+_UNDETECTED = object()
+# Bytes of entries held in the analyze queue before new ones stay on disk only (with a spool)
+DEFAULT_MEMORY_HIGH_WATER = 16 * 1024 * 1024
+
+class FairQueue:
+    """
+    A bounded queue that keeps one FIFO per service and hands items out
+    round-robin across services, so one noisy service cannot starve the rest.
+
+    When full, `shed_policy` decides what happens to a new item:
+      - drop_oldest: evict the oldest item of the service with the most pending items
+      - drop_newest: reject the new item
+      - block: wait until a consumer frees a slot
+    """
+
+    def __init__(self, maxsize=100, shed_policy='drop_oldest'):
+        if shed_policy not in SHED_POLICIES:
+            raise ValueError(f"Unknown shed policy '{shed_policy}', expected one of {SHED_POLICIES}")
+        self.maxsize = max(1, maxsize)
+        self.shed_policy = shed_policy
+        self.dropped = 0
+        self._queues = OrderedDict()
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def put(self, service_name, item):
+        """Adds an item. Returns the item that was shed, if any."""
+        with self._lock:
+            shed = None
+            if self._size >= self.maxsize:
+                if self.shed_policy == 'block':
+                    while self._size >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                elif self.shed_policy == 'drop_newest':
+                    self.dropped += 1
+                    return item
+                else:
+                    largest = max(self._queues, key=lambda name: len(self._queues[name]))
+                    shed = self._queues[largest].popleft()
+                    self._size -= 1
+                    self.dropped += 1
+
+            self._queues.setdefault(service_name, deque()).append(item)
+            self._size += 1
+            self._not_empty.notify()
+            return shed
+
+    def put_nowait(self, service_name, item):
+        """Adds an item if there is room, whatever the shed policy. Returns whether it did."""
+        with self._lock:
+            if self._size >= self.maxsize:
+                return False
+            self._queues.setdefault(service_name, deque()).append(item)
+            self._size += 1
+            self._not_empty.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Takes the next item, rotating across services. Returns None once closed and drained."""
+        with self._lock:
+            while self._size == 0:
+                if self._closed:
+                    return None
+                if not self._not_empty.wait(timeout):
+                    raise queue.Empty
+
+            # The service at the front gets served, then moves to the back of the rotation
+            service_name = next(iter(self._queues))
+            pending = self._queues[service_name]
+            item = pending.popleft()
+            if pending:
+                self._queues.move_to_end(service_name)
+            else:
+                del self._queues[service_name]
+            self._size -= 1
+            self._not_full.notify()
+            return item
+
+    def get_batch(self, max_items, window):
+        """
+        Takes up to `max_items` items: blocks for the first one, then waits at
+        most `window` seconds for more. Returns [] once closed and drained.
+        """
+        first = self.get()
+        if first is None:
+            return []
+        batch = [first]
+        ends_at = time.monotonic() + window
+        while len(batch) < max_items:
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def qsize(self):
+        with self._lock:
+            return self._size
+
+    def depths(self):
+        """Pending items per service."""
+        with self._lock:
+            return {service_name: len(pending) for service_name, pending in self._queues.items()}
+
+class AnalysisPipeline:
+    """
+    ingest -> parse/filter -> analyze -> notify
+
+    Monitors submit flushed entries to a bounded ingest queue (submit blocks when
+    it is full, pushing back on the readers). Parse workers decide whether an
+    entry is worth analyzing and feed a FairQueue in front of a fixed pool of
+    analyze workers, which bounds the number of concurrent LLM calls. Results are
+    handed to `notify`, which is expected not to block (see NotificationDispatcher).
+
+    Stage functions:
+      detect(entry, service_name) -> (triggered, parsed_data)
+      analyze(entry, parsed_data, project_path) -> analysis text
+      notify(entry, analysis, service_name)
+      announce(entry, parsed_data, service_name), optional: called when analysis
+        starts, e.g. to send a provisional alert
+      analyze_batch([(entry, parsed_data, project_path), ...]) -> analyses, optional:
+        used instead of analyze when batching is enabled (ai_analysis.batching).
+        Each worker then takes up to `max_errors` queued entries, waiting at
+        most `window_seconds` for the batch to fill.
+      select(entry, parsed_data) -> bool, optional: for entries submitted with
+        submit_detected, which were already detected elsewhere (a shard
+        worker). Without it every such entry is analyzed.
+
+    With a `spool` (core.spool.Spool), every triggered entry is written to disk
+    before it is queued and acknowledged once its alert was delivered, so
+    notify must then accept on_done(ok) (NotificationDispatcher.dispatch
+    does). Unacknowledged entries from a previous run are queued again by
+    start(). Past `memory_high_water` bytes of queued entries, or a full
+    analyze queue, new entries stay on disk only and are read back as the
+    analyze workers catch up, instead of growing the heap or being shed.
+    """
+
+    def __init__(self, config, detect, analyze, notify, announce=None, analyze_batch=None, select=None, spool=None):
+        pipeline_config = config.get('pipeline', {}) or {}
+        spool_config = pipeline_config.get('spool', {}) or {}
+        self.detect = detect
+        self.select = select
+        self.analyze = analyze
+        self.notify = notify
+        self.announce = announce
+        self.analyze_batch = analyze_batch
+        self.batching = batcher.batch_settings(config) if analyze_batch else None
+        self.parse_workers = pipeline_config.get('parse_workers', 1)
+        self.analyze_workers = pipeline_config.get('analyze_workers', 2)
+        self.ingest_queue = queue.Queue(maxsize=pipeline_config.get('ingest_queue_size', 1000))
+        self.analyze_queue = FairQueue(
+            maxsize=pipeline_config.get('analyze_queue_size', 100),
+            shed_policy=pipeline_config.get('shed_policy', 'drop_oldest')
+        )
+        self.spool = spool
+        self.memory_high_water = spool_config.get('memory_high_water', DEFAULT_MEMORY_HIGH_WATER)
+        self._memory_bytes = 0
+        # service name -> record ids of spooled entries not held in memory
+        self._spilled = OrderedDict()
+        self._spilled_count = 0
+        self._spill_lock = threading.Lock()
+        self._stopping = False
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._stats = {'ingested': 0, 'filtered': 0, 'analyzed': 0, 'failed': 0}
+
+    def start(self):
+        if self.spool is not None:
+            self._replay()
+        for i in range(self.parse_workers):
+            self._spawn(self._parse_loop, f"pipeline-parse-{i}")
+        analyze_loop = self._analyze_batch_loop if self.batching else self._analyze_loop
+        for i in range(self.analyze_workers):
+            self._spawn(analyze_loop, f"pipeline-analyze-{i}")
+        metrics.QUEUE_DEPTH.labels('ingest').set_function(self.ingest_queue.qsize)
+        metrics.QUEUE_DEPTH.labels('analyze').set_function(self.analyze_queue.qsize)
+        metrics.SPOOL_SPILLED.set_function(lambda: self._spilled_count)
+        logger.info(f"Pipeline started with {self.parse_workers} parse and {self.analyze_workers} analyze workers.")
+        return self
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def submit(self, entry, service_name, project_path):
+        """Called by the monitors for every flushed entry."""
+        self.ingest_queue.put((entry, service_name, project_path, _UNDETECTED))
+        self._count('ingested')
+
+    def submit_detected(self, entry, parsed_data, service_name, project_path):
+        """For an entry that already triggered in detect_error; only `select` runs on it."""
+        self.ingest_queue.put((entry, service_name, project_path, parsed_data))
+        self._count('ingested')
+
+    def _parse_loop(self):
+        while True:
+            item = self.ingest_queue.get()
+            if item is None:
+                self.ingest_queue.task_done()
+                return
+
+            entry, service_name, project_path, parsed_data = item
+            start = time.perf_counter()
+            try:
+                if parsed_data is _UNDETECTED:
+                    triggered, parsed_data = self.detect(entry, service_name)
+                else:
+                    triggered = self.select is None or self.select(entry, parsed_data)
+            except Exception as e:
+                logger.error(f"Failed to parse entry from {service_name}: {e}")
+                triggered = False
+            metrics.PARSE_SECONDS.labels(service_name).observe(time.perf_counter() - start)
+
+            if triggered:
+                metrics.TRIGGERS.labels(service_name).inc()
+                self._queue_for_analysis(entry, parsed_data, service_name, project_path)
+            else:
+                self._count('filtered')
+            self.ingest_queue.task_done()
+
+    # ------------------------------------------
+    #  analyze queue and spool
+    # ------------------------------------------
+    def _queue_for_analysis(self, entry, parsed_data, service_name, project_path):
+        if self.spool is None:
+            self._put((entry, parsed_data, service_name, project_path, None))
+            return
+        try:
+            record_id = self.spool.append({'entry': entry, 'parsed': parsed_data, 'service': service_name,
+                                           'project_path': project_path})
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Could not spool an entry from {service_name}, queueing it in memory only: {e}")
+            self._put((entry, parsed_data, service_name, project_path, None))
+            return
+        with self._spill_lock:
+            # Once entries are spilled, new ones queue up behind them on disk
+            in_memory = not self._spilled and self._has_room()
+            if in_memory:
+                self._memory_bytes += len(entry)
+            else:
+                self._spill(service_name, record_id)
+        if in_memory:
+            self._offer((entry, parsed_data, service_name, project_path, record_id))
+        else:
+            self._refill()
+
+    def _has_room(self):
+        return (self._memory_bytes < self.memory_high_water
+                and self.analyze_queue.qsize() < self.analyze_queue.maxsize)
+
+    def _spill(self, service_name, record_id):
+        """Leaves a spooled entry on disk only. Caller holds the spill lock."""
+        self._spilled.setdefault(service_name, deque()).append(record_id)
+        self._spilled_count += 1
+
+    def _offer(self, item):
+        """
+        Queues a spooled item without blocking or shedding: when another thread
+        took the last slot, it goes back to disk. Returns whether it was queued.
+        """
+        if self.analyze_queue.put_nowait(item[2], item):
+            return True
+        with self._spill_lock:
+            self._memory_bytes -= len(item[0])
+            self._spilled.setdefault(item[2], deque()).appendleft(item[4])
+            self._spilled_count += 1
+            self._spilled.move_to_end(item[2], last=False)
+        return False
+
+    def _put(self, item):
+        """Queues an item that isn't spooled, applying the shed policy. A shed spooled item goes back to disk."""
+        shed = self.analyze_queue.put(item[2], item)
+        if shed is None:
+            return
+        if shed[4] is not None:
+            with self._spill_lock:
+                self._memory_bytes -= len(shed[0])
+                self._spilled.setdefault(shed[2], deque()).appendleft(shed[4])
+                self._spilled_count += 1
+            return
+        metrics.SHED.labels(shed[2]).inc()
+        logger.warning(f"Analyze queue full, shed an entry from {shed[2]}.")
+
+    def _taken(self, item):
+        """Called for every item an analyze worker takes off the queue."""
+        if item[4] is None:
+            return
+        with self._spill_lock:
+            self._memory_bytes -= len(item[0])
+        self._refill()
+
+    def _refill(self):
+        """Reads spilled entries back into the analyze queue, round-robin across services, while there is room."""
+        while not self._stopping:
+            with self._spill_lock:
+                if not self._spilled or not self._has_room():
+                    return
+                service_name = next(iter(self._spilled))
+                record_ids = self._spilled[service_name]
+                record_id = record_ids.popleft()
+                if record_ids:
+                    self._spilled.move_to_end(service_name)
+                else:
+                    del self._spilled[service_name]
+                self._spilled_count -= 1
+            try:
+                data = self.spool.read(record_id)
+            except (KeyError, OSError, ValueError) as e:
+                logger.error(f"Could not read spooled entry #{record_id}: {e}")
+                continue
+            with self._spill_lock:
+                self._memory_bytes += len(data['entry'])
+            if not self._offer((data['entry'], data['parsed'], data['service'], data['project_path'], record_id)):
+                return
+
+    def _replay(self):
+        """Queues the entries a previous run spooled but never delivered."""
+        record_ids = self.spool.pending()
+        for record_id in record_ids:
+            try:
+                service_name = self.spool.read(record_id)['service']
+            except (KeyError, OSError, ValueError) as e:
+                logger.error(f"Could not read spooled entry #{record_id}: {e}")
+                continue
+            with self._spill_lock:
+                self._spill(service_name, record_id)
+        if record_ids:
+            logger.info(f"Replaying {len(record_ids)} spooled entries from the previous run.")
+        self._refill()
+
+    def _deliver(self, entry, analysis, service_name, record_id):
+        if record_id is None:
+            if analysis:
+                self.notify(entry, analysis, service_name)
+            return
+        if not analysis:
+            self.spool.ack(record_id)
+            return
+        self.notify(entry, analysis, service_name, on_done=lambda ok: self._delivered(record_id, ok))
+
+    def _delivered(self, record_id, ok):
+        if ok:
+            self.spool.ack(record_id)
+        else:
+            logger.warning(f"Alert for spooled entry #{record_id} was not delivered everywhere, it will be replayed on the next start.")
+
+    def _acknowledge(self, record_id):
+        if record_id is not None:
+            self.spool.ack(record_id)
+
+    def _analyze_loop(self):
+        while True:
+            item = self.analyze_queue.get()
+            if item is None:
+                return
+
+            self._taken(item)
+            entry, parsed_data, service_name, project_path, record_id = item
+            self._announce(entry, parsed_data, service_name)
+            try:
+                analysis = self.analyze(entry, parsed_data, project_path)
+            except Exception as e:
+                logger.error(f"Analysis failed for {service_name}: {e}")
+                self._count('failed')
+                # Replaying an entry that breaks the analyzer would only fail again
+                self._acknowledge(record_id)
+                continue
+
+            self._count('analyzed')
+            self._deliver(entry, analysis, service_name, record_id)
+
+    def _announce(self, entry, parsed_data, service_name):
+        if self.announce:
+            try:
+                self.announce(entry, parsed_data, service_name)
+            except Exception as e:
+                logger.error(f"Provisional alert failed for {service_name}: {e}")
+
+    def _analyze_batch_loop(self):
+        while True:
+            batch = self.analyze_queue.get_batch(self.batching['max_errors'], self.batching['window_seconds'])
+            if not batch:
+                return
+
+            for item in batch:
+                self._taken(item)
+                self._announce(item[0], item[1], item[2])
+            try:
+                analyses = self.analyze_batch([(entry, parsed_data, project_path)
+                                               for entry, parsed_data, _, project_path, _ in batch])
+            except Exception as e:
+                logger.error(f"Batched analysis of {len(batch)} entries failed: {e}")
+                for item in batch:
+                    self._count('failed')
+                    self._acknowledge(item[4])
+                continue
+
+            for (entry, _, service_name, _, record_id), analysis in zip(batch, analyses):
+                self._count('analyzed')
+                self._deliver(entry, analysis, service_name, record_id)
+
+    def stats(self):
+        with self._stats_lock:
+            report = dict(self._stats)
+        report['ingest_queue'] = self.ingest_queue.qsize()
+        report['analyze_queue'] = self.analyze_queue.qsize()
+        report['analyze_queue_by_service'] = self.analyze_queue.depths()
+        report['shed'] = self.analyze_queue.dropped
+        if self.spool is not None:
+            report['spooled'] = len(self.spool)
+            report['spilled'] = self._spilled_count
+        return report
+
+    def stop(self):
+        """
+        Drains the ingest queue, lets in-flight analyses finish and stops the
+        workers. Spilled entries stay in the spool for the next start.
+        """
+        for _ in range(self.parse_workers):
+            self.ingest_queue.put(None)
+        self.ingest_queue.join()
+        self._stopping = True
+        self.analyze_queue.close()
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,189 @@
+import os
+import glob
+import time
+import heapq
+import logging
+import threading
+import itertools
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('inotify', 'poll')
+DEFAULT_MIN_INTERVAL = 0.25
+DEFAULT_MAX_INTERVAL = 5.0
+DEFAULT_BACKOFF = 2.0
+DEFAULT_DISCOVERY_INTERVAL = 10.0
+
+class _PolledFile:
+    __slots__ = ('path', 'signature', 'interval', 'due')
+
+    def __init__(self, path, signature, interval, due):
+        self.path = path
+        # (inode, device, size, mtime_ns), or None while the file doesn't exist
+        self.signature = signature
+        self.interval = interval
+        self.due = due
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return stat.st_ino, stat.st_dev, stat.st_size, stat.st_mtime_ns
+
+class StatPoller:
+    """
+    Detects changes to a known set of files with os.stat, for filesystems
+    where inotify events never arrive (NFS, some overlay mounts).
+
+    Unlike watchdog's PollingObserver, directories are never rescanned on
+    every poll. Each file is stat()ed on its own schedule. A file that
+    changed is checked again after `min_interval`, and every unchanged check
+    multiplies its interval by `backoff`, up to `max_interval`. A change is
+    therefore noticed within `max_interval` seconds at worst, and much sooner
+    on a busy file, while thousands of idle files cost a few stat calls per
+    second. Glob patterns are re-listed every `discovery_interval` seconds to
+    find new files.
+
+    Changes are reported to `handler` (a MonitorDispatcher) as watchdog
+    events (created, modified, deleted), from the poller's own thread.
+    """
+
+    def __init__(self, handler, paths=(), globs=(), min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF,
+                 discovery_interval=DEFAULT_DISCOVERY_INTERVAL):
+        self.handler = handler
+        self.globs = list(globs)
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = max(backoff, 1.0)
+        self.discovery_interval = discovery_interval
+        self.stat_calls = 0
+        self._files = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._next_discovery = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        now = time.monotonic()
+        for path in paths:
+            self.add(path, now)
+        self._discover(now)
+
+    def __len__(self):
+        return len(self._files)
+
+    def add(self, path, now=None):
+        """Starts polling `path`. Its current state is the baseline, so existing content is not reported."""
+        if path in self._files:
+            return
+        now = time.monotonic() if now is None else now
+        polled = _PolledFile(path, _signature(path), self.min_interval, now + self.min_interval)
+        self._files[path] = polled
+        heapq.heappush(self._heap, (polled.due, next(self._sequence), path))
+
+    def _discover(self, now):
+        self._next_discovery = now + self.discovery_interval
+        for pattern in self.globs:
+            for path in glob.glob(pattern):
+                if path not in self._files and os.path.isfile(path):
+                    logger.debug(f"Polling newly found {path}")
+                    self.add(path, now)
+                    if self.handler.get(path) is None:
+                        self.handler.on_created(FileCreatedEvent(path))
+
+    def _check(self, polled):
+        signature = _signature(polled.path)
+        self.stat_calls += 1
+        metrics.POLL_STAT_CALLS.inc()
+        previous, polled.signature = polled.signature, signature
+        if signature == previous:
+            polled.interval = min(polled.interval * self.backoff, self.max_interval)
+            return True
+        polled.interval = self.min_interval
+
+        if signature is None:
+            if self.handler.is_glob_path(polled.path):
+                self.handler.on_deleted(FileDeletedEvent(polled.path))
+                return False
+        elif previous is None or signature[:2] != previous[:2]:
+            # Appeared, or a new file took the path (rotation)
+            self.handler.on_created(FileCreatedEvent(polled.path))
+        else:
+            self.handler.on_modified(FileModifiedEvent(polled.path))
+        return True
+
+    def poll_once(self, now=None):
+        """Checks every file that is due. Returns the number of files checked."""
+        now = time.monotonic() if now is None else now
+        if self.globs and now >= self._next_discovery:
+            self._discover(now)
+
+        checked = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, _, path = heapq.heappop(self._heap)
+            polled = self._files.get(path)
+            if polled is None:
+                continue
+            checked += 1
+            try:
+                keep = self._check(polled)
+            except Exception as e:
+                logger.error(f"Error polling {path}: {e}")
+                keep = True
+            if not keep:
+                del self._files[path]
+                continue
+            polled.due = now + polled.interval
+            heapq.heappush(self._heap, (polled.due, next(self._sequence), path))
+        return checked
+
+    def _next_wakeup(self):
+        wakeup = time.monotonic() + self.max_interval
+        if self._heap:
+            wakeup = min(wakeup, self._heap[0][0])
+        if self.globs:
+            wakeup = min(wakeup, self._next_discovery)
+        return wakeup
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(max(0.0, self._next_wakeup() - time.monotonic()))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stat-poller", daemon=True)
+        self._thread.start()
+        logger.info(f"Polling {len(self._files)} log files every {self.min_interval}-{self.max_interval}s.")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def service_backend(monitoring_config, service):
+    """The watch backend of a service: its own `watch`, else monitoring.watch_backend."""
+    backend = service.get('watch', monitoring_config.get('watch_backend', 'inotify'))
+    if backend not in BACKENDS:
+        logger.error(f"Unknown watch backend '{backend}' for service '{service.get('name')}', using inotify")
+        return 'inotify'
+    return backend
+
+def from_config(monitoring_config, dispatcher):
+    """A StatPoller for the dispatcher's polled files, or None when no service is polled."""
+    paths, globs = dispatcher.polled_paths(), dispatcher.polled_globs()
+    if not paths and not globs:
+        return None
+    polling_config = monitoring_config.get('polling', {}) or {}
+    return StatPoller(
+        dispatcher, paths, globs,
+        min_interval=polling_config.get('min_interval', DEFAULT_MIN_INTERVAL),
+        max_interval=polling_config.get('max_interval', DEFAULT_MAX_INTERVAL),
+        backoff=polling_config.get('backoff', DEFAULT_BACKOFF),
+        discovery_interval=polling_config.get('discovery_interval', DEFAULT_DISCOVERY_INTERVAL),
+    )
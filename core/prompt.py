@@ -0,0 +1,249 @@
+import logging
+from litellm import token_counter
+from core import parser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TOKENS = 4000
+DEFAULT_MIN_REPEATS = 3
+# Longest block of lines (e.g. mutual recursion) that is checked for repeats
+MAX_REPEAT_PERIOD = 4
+# Rough size of a token when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+PROMPT_TEMPLATE = "I found an error in my logs:\n`{entry}`\n\n{rest}"
+
+# Frames containing any of these are third-party, on top of parser.LIBRARY_KEYWORDS
+EXTRA_LIBRARY_KEYWORDS = [
+    'node:internal', 'at java.', 'at javax.', 'at jdk.', 'at sun.', 'java.base/',
+    '/usr/local/go/src/', '/rustc/', '.cargo/registry', '/gems/', 'vendor/',
+]
+
+def count_tokens(text, model=None):
+    """Tokens in `text` according to litellm's tokenizer for `model`, or an estimate."""
+    try:
+        return token_counter(model=model or '', text=text)
+    except Exception:
+        return len(text) // CHARS_PER_TOKEN + 1
+
+def _indent(line):
+    return line[:len(line) - len(line.lstrip())]
+
+# ==========================================
+#  COMPACTION STEPS
+# ==========================================
+def collapse_repeats(lines, min_repeats=DEFAULT_MIN_REPEATS):
+    """
+    Replaces a block of up to MAX_REPEAT_PERIOD lines that repeats at least
+    `min_repeats` times in a row (deep recursion) with one copy and a count.
+    """
+    collapsed = []
+    i, total = 0, len(lines)
+    while i < total:
+        best_period, best_count = 1, 1
+        for period in range(1, MAX_REPEAT_PERIOD + 1):
+            if i + period > total:
+                break
+            block = lines[i:i + period]
+            count, j = 1, i + period
+            while lines[j:j + period] == block:
+                count += 1
+                j += period
+            if count >= min_repeats and count * period > best_count * best_period:
+                best_period, best_count = period, count
+
+        if best_count < min_repeats:
+            collapsed.append(lines[i])
+            i += 1
+            continue
+        collapsed.extend(lines[i:i + best_period])
+        what = "line" if best_period == 1 else f"{best_period} lines"
+        collapsed.append(f"{_indent(lines[i])}[Previous {what} repeated {best_count - 1} more times]")
+        i += best_period * best_count
+    return collapsed
+
+def fold_library_frames(lines, library_keywords):
+    """
+    Replaces runs of two or more third-party frames with a single marker line.
+    A frame is an indented line containing one of `library_keywords`; a deeper
+    indented line right after it (Python's source line) belongs to the frame.
+    The first line (the exception header) is always kept.
+    """
+    folded = lines[:1]
+    run, frames, frame_indent = [], 0, None
+
+    def end_run():
+        if frames >= 2:
+            folded.append(f"{_indent(run[0])}... {frames} library frames omitted ...")
+        else:
+            folded.extend(run)
+
+    for line in lines[1:]:
+        indent = len(_indent(line))
+        if indent and any(kw in line for kw in library_keywords):
+            run.append(line)
+            frames += 1
+            frame_indent = indent
+            continue
+        if run and frame_indent is not None and indent > frame_indent:
+            run.append(line)
+            frame_indent = None
+            continue
+        if run:
+            end_run()
+            run, frames = [], 0
+        frame_indent = None
+        folded.append(line)
+    if run:
+        end_run()
+    return folded
+
+def _project_lines(lines, library_keywords):
+    """
+    Indexes of the lines worth keeping the longest: the header and the
+    project (non-library) frames, with the deeper indented source line after
+    a frame.
+    """
+    keep = {0}
+    frame_indent = None
+    for i, line in enumerate(lines[1:], 1):
+        indent = len(_indent(line))
+        if frame_indent is not None and indent > frame_indent:
+            keep.add(i)
+        elif parser.parse_log_line(line) and not any(kw in line for kw in library_keywords):
+            keep.add(i)
+            frame_indent = indent
+            continue
+        frame_indent = None
+    return keep
+
+def _with_markers(lines, kept):
+    """The lines at the `kept` indexes, each gap replaced by a marker."""
+    joined, last = [], -1
+    for i in sorted(kept):
+        if i > last + 1:
+            joined.append(f"... {i - last - 1} lines omitted ...")
+        joined.append(lines[i])
+        last = i
+    if last < len(lines) - 1:
+        joined.append(f"... {len(lines) - 1 - last} lines omitted ...")
+    return joined
+
+def _fit_ends(lines, budget, model, always=frozenset()):
+    """
+    Keeps the `always` lines plus as many of the other lines from both ends
+    as fit in `budget` tokens. Returns None when `always` alone is too big.
+    """
+    others = [i for i in range(len(lines)) if i not in always]
+
+    def join(count):
+        head = (count + 1) // 2
+        tail = count - head
+        return _with_markers(lines, set(always) | set(others[:head]) | set(others[len(others) - tail:]))
+
+    # Binary search for the most lines that fit
+    low, high = 0, len(others)
+    if count_tokens("\n".join(join(low)), model) > budget:
+        return None
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens("\n".join(join(mid)), model) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return join(low)
+
+def _shorten(text, budget, model, suffix=""):
+    """Cuts `text` (plus `suffix`) until it fits in `budget` tokens; it gets shorter on every try."""
+    length = len(text)
+    candidate = text
+    tokens = count_tokens(candidate, model)
+    while tokens > budget and length > 0:
+        length = min(length - 1, int(length * max(budget, 0) / tokens * 0.9))
+        candidate = text[:length] + suffix
+        tokens = count_tokens(candidate, model)
+    return candidate if tokens <= budget else ""
+
+def truncate_middle(lines, budget, model=None, library_keywords=None):
+    """
+    Cuts lines until the rest fits in `budget` tokens, replacing each gap with
+    a marker. Other lines go first, from the middle out, so that the header
+    (first line) and project frames survive; if those alone are over budget,
+    the middle of everything is cut. The header is always kept, cut short if
+    it alone is over budget.
+    """
+    keywords = library_keywords if library_keywords is not None else parser.LIBRARY_KEYWORDS + EXTRA_LIBRARY_KEYWORDS
+    kept = _fit_ends(lines, budget, model, _project_lines(lines, keywords)) or _fit_ends(lines, budget, model, {0})
+    if kept is not None:
+        return kept
+
+    # The header alone is too big: shorten it, then drop the marker too if needed
+    omitted = [f"... {len(lines) - 1} lines omitted ..."] if len(lines) > 1 else []
+    suffix = " ...[truncated]\n" + "\n".join(omitted) if omitted else " ...[truncated]"
+    header = _shorten(lines[0], budget, model, suffix)
+    if header:
+        return header.split("\n")
+    return [_shorten(lines[0], budget, model)]
+
+def compact_entry(log_entry, budget, model=None, min_repeats=DEFAULT_MIN_REPEATS, library_keywords=None):
+    """
+    Shrinks a log entry to at most `budget` tokens, losing as little as possible:
+    1. repeated frames are collapsed,
+    2. if still too big, runs of library frames are folded,
+    3. if still too big, the middle is cut, keeping the header and the ends.
+    Returns (text, tokens_before, tokens_after).
+    """
+    text = log_entry.strip()
+    before = count_tokens(text, model)
+    if before <= budget:
+        return text, before, before
+
+    keywords = library_keywords if library_keywords is not None else parser.LIBRARY_KEYWORDS + EXTRA_LIBRARY_KEYWORDS
+    lines = collapse_repeats(text.split('\n'), min_repeats)
+    tokens = count_tokens("\n".join(lines), model)
+    if tokens > budget:
+        lines = fold_library_frames(lines, keywords)
+        tokens = count_tokens("\n".join(lines), model)
+    if tokens > budget:
+        lines = truncate_middle(lines, budget, model, keywords)
+        tokens = count_tokens("\n".join(lines), model)
+    return "\n".join(lines), before, tokens
+
+# ==========================================
+#  PROMPT
+# ==========================================
+def fit_entry(log_entry, overhead_text, model, prompt_config=None):
+    """
+    Compacts a log entry so that it plus `overhead_text` (the rest of the
+    prompt) stays within `max_tokens`; the entry always gets at least a quarter
+    of the budget. `max_tokens: 0` returns the entry as is.
+    """
+    prompt_config = prompt_config or {}
+    max_tokens = prompt_config.get('max_tokens', DEFAULT_MAX_TOKENS)
+    if not max_tokens:
+        return log_entry.strip()
+
+    budget = max(max_tokens - count_tokens(overhead_text, model), max_tokens // 4)
+    entry, before, after = compact_entry(
+        log_entry, budget, model,
+        min_repeats=prompt_config.get('min_repeats', DEFAULT_MIN_REPEATS),
+        library_keywords=parser.LIBRARY_KEYWORDS + EXTRA_LIBRARY_KEYWORDS + (prompt_config.get('library_keywords') or []),
+    )
+    if after != before:
+        logger.info(f"Compacted log entry for the prompt: {before} -> {after} tokens (budget {budget}).")
+    return entry
+
+def build_prompt(log_entry, code_context, model, prompt_config=None):
+    """
+    Builds the user prompt for an error. `code_context` is the formatted
+    snippet section (or None). The log entry is compacted to fit the
+    `max_tokens` budget (see fit_entry).
+    """
+    if code_context:
+        rest = code_context
+    else:
+        rest = "(No local code context was provided. Please give a general fix based on the log message.)\n\n"
+    rest += "Please explain what might be causing this error and suggest a code fix."
+
+    entry = fit_entry(log_entry, PROMPT_TEMPLATE.format(entry='', rest=rest), model, prompt_config)
+    return PROMPT_TEMPLATE.format(entry=entry, rest=rest)
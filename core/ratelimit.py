@@ -0,0 +1,171 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Documented webhook limits:
+#   Slack incoming webhooks: 1 message per second, short bursts tolerated
+#   Discord webhooks: 5 requests per 2 seconds, and 30 messages per minute per channel
+PROVIDER_LIMITS = {
+    'slack': {'rate': 1.0, 'burst': 2},
+    'discord': {'rate': 0.5, 'burst': 5},
+}
+# Server-requested waits longer than this are treated as this
+MAX_RETRY_AFTER = 3600.0
+
+class RetryableDelivery(Exception):
+    """A delivery that may succeed later: rate limited (429), server error or network failure."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average and bursts of up to `burst`.
+    pause() empties the bucket until a server-imposed deadline (Retry-After).
+    Thread-safe.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay_locked(self, now):
+        self._refill(now)
+        wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+        return max(wait, self._paused_until - now)
+
+    def delay(self, now=None):
+        """Seconds until a request may be sent (0 when a token is available)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._delay_locked(now)
+
+    def try_acquire(self, now=None):
+        """Takes a token if one is available. Returns whether it did."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._delay_locked(now) > 0:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self, timeout=None):
+        """
+        Blocks until a token is available and takes it. Returns False, without
+        waiting, when that would take longer than `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._delay_locked(now)
+                if wait <= 0:
+                    self._tokens -= 1
+                    return True
+                if deadline is not None and now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def pause(self, seconds, now=None):
+        """Nothing may be sent for `seconds`, and the bucket starts empty afterwards."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + seconds)
+
+# ==========================================
+#  PER-WEBHOOK LIMITERS
+# ==========================================
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def for_webhook(channel, channel_config):
+    """
+    The shared TokenBucket of a channel's webhook URL, or None when it isn't
+    limited. Limits default to the provider's documented ones and can be set
+    with `rate_limit: {rate, burst}`; `rate_limit: false` turns limiting off.
+    """
+    url = channel_config.get('webhook_url')
+    rate_limit = channel_config.get('rate_limit', {})
+    if not url or rate_limit is False:
+        return None
+    limits = {**PROVIDER_LIMITS.get(channel, {}), **(rate_limit or {})}
+    if not limits.get('rate'):
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(url)
+        if limiter is None:
+            limiter = _limiters[url] = TokenBucket(limits['rate'], limits.get('burst', 1))
+        return limiter
+
+# ==========================================
+#  RESPONSES AND BACKOFF
+# ==========================================
+def _seconds(value, now):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - now
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def retry_after(response, now=None):
+    """
+    How long the server asked us to wait, in seconds, from Retry-After
+    (seconds or an HTTP date), X-RateLimit-Reset-After (Discord),
+    X-RateLimit-Reset (epoch seconds) or a JSON `retry_after` (Discord).
+    None when the response doesn't say.
+    """
+    now = time.time() if now is None else now
+    headers = response.headers or {}
+    seconds = None
+    for name in ('Retry-After', 'X-RateLimit-Reset-After'):
+        if headers.get(name):
+            seconds = _seconds(headers[name], now)
+            break
+    else:
+        if headers.get('X-RateLimit-Reset'):
+            reset = _seconds(headers['X-RateLimit-Reset'], now)
+            seconds = reset - now if reset is not None else None
+        else:
+            try:
+                seconds = float(response.json().get('retry_after'))
+            except (ValueError, TypeError, AttributeError):
+                seconds = None
+    if seconds is None:
+        return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+def observe(limiter, response):
+    """Pauses the limiter when a successful response says the window is used up (Discord's X-RateLimit-Remaining)."""
+    headers = response.headers or {}
+    if str(headers.get('X-RateLimit-Remaining')) == '0':
+        wait = _seconds(headers.get('X-RateLimit-Reset-After'), time.time())
+        if wait:
+            limiter.pause(min(wait, MAX_RETRY_AFTER))
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0, retry_after=None):
+    """
+    Delay before retry number `attempt` (1-based): full jitter over an
+    exponential window, or the server's Retry-After plus up to `base_delay`
+    of jitter, so queued alerts don't all fire at the same instant.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
@@ -0,0 +1,120 @@
+import time
+import heapq
+import logging
+import threading
+import itertools
+
+logger = logging.getLogger(__name__)
+
+class DeadlineScheduler:
+    """
+    Runs callbacks at per-key deadlines on a single background thread.
+
+    Scheduling a key that already has a deadline replaces it, which is what a
+    debounce needs. Pushing a later deadline doesn't touch the heap: the stale
+    heap entry is re-pushed with the real deadline when it comes due, so the heap
+    stays about as large as the number of keys no matter how often they are
+    rescheduled.
+
+    Callbacks run on the scheduler thread and must return quickly.
+    """
+
+    def __init__(self, name="deadline-scheduler"):
+        self.name = name
+        self._heap = []
+        self._deadlines = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._stopped = False
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def schedule(self, key, delay, callback):
+        """Runs `callback` after `delay` seconds unless `key` is rescheduled or cancelled first."""
+        with self._lock:
+            self._schedule_locked(key, time.monotonic() + delay, callback)
+
+    def schedule_once(self, key, delay, callback):
+        """Like schedule(), but keeps an existing deadline for `key` instead of pushing it back."""
+        with self._lock:
+            if key in self._deadlines:
+                return False
+            self._schedule_locked(key, time.monotonic() + delay, callback)
+            return True
+
+    def _schedule_locked(self, key, deadline, callback):
+        self._ensure_started()
+        current = self._deadlines.get(key)
+        self._deadlines[key] = (deadline, callback)
+        # A later deadline can reuse the heap entry that is already queued
+        if current is not None and current[0] <= deadline:
+            return
+        sequence = next(self._sequence)
+        heapq.heappush(self._heap, (deadline, sequence, key))
+        if self._heap[0][1] == sequence:
+            self._wakeup.notify()
+
+    def cancel(self, key):
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._deadlines)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while True:
+                    if self._stopped:
+                        return
+                    if not self._heap:
+                        self._wakeup.wait()
+                        continue
+
+                    deadline, _, key = self._heap[0]
+                    now = time.monotonic()
+                    if deadline > now:
+                        self._wakeup.wait(deadline - now)
+                        continue
+
+                    heapq.heappop(self._heap)
+                    current = self._deadlines.get(key)
+                    if current is None:
+                        continue  # cancelled
+                    if current[0] > now:
+                        # Rescheduled to a later deadline since this entry was pushed
+                        heapq.heappush(self._heap, (current[0], next(self._sequence), key))
+                        continue
+
+                    del self._deadlines[key]
+                    callback = current[1]
+                    break
+
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Scheduled callback failed: {e}")
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Returns the process-wide scheduler shared by every LogMonitor."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DeadlineScheduler()
+        return _scheduler
@@ -0,0 +1,123 @@
+import re
+
+# Lines that always belong to the record before them (stack frames, chained exceptions)
+DEFAULT_CONTINUATION_PATTERNS = [
+    r'^\s',                                   # indented frames: "  File ...", "\tat ...", "    at ..."
+    r'^Traceback \(most recent call last\)',
+    r'^(?:Caused by|Suppressed): ',
+    r'^\.\.\. \d+ more',
+    r'^During handling of the above exception',
+    r'^The above exception was the direct cause',
+    r'^goroutine \d+ \[',
+]
+
+DEFAULT_MAX_ENTRY_BYTES = 64 * 1024
+
+class RecordSegmenter:
+    """
+    Splits a stream of log lines into records.
+
+    A line matching one of `start_patterns` (e.g. a timestamp or level prefix)
+    opens a new record and completes the previous one, unless it also matches
+    a continuation pattern. Any other line is appended to the current record.
+    Without start patterns every line is appended and records only end on
+    flush() - the legacy "quiet period" grouping.
+
+    A record is also completed as soon as it would grow past `max_entry_bytes`.
+
+    Lines may be str or raw bytes (as read by FileTailer); patterns are compiled
+    for both and records are joined in the type they were fed.
+
+    With a `matcher` (see triggers.TriggerMatcher), records that cannot trigger
+    an analysis are discarded instead of joined, and `on_drop` is called for
+    each. A record denied by its first line is not buffered at all.
+    """
+
+    def __init__(self, start_patterns=None, continuation_patterns=None, max_entry_bytes=DEFAULT_MAX_ENTRY_BYTES,
+                 matcher=None, on_drop=None):
+        if continuation_patterns is None:
+            continuation_patterns = DEFAULT_CONTINUATION_PATTERNS
+        self._regexes = {
+            str: (self._compile(start_patterns), self._compile(continuation_patterns)),
+            bytes: (self._compile(start_patterns, binary=True), self._compile(continuation_patterns, binary=True)),
+        }
+        self.max_entry_bytes = max_entry_bytes
+        self.matcher = matcher
+        self.on_drop = on_drop
+        self._lines = []
+        self._size = 0
+        # Whether a record is open, and whether it is kept (True), dropped (False) or undecided (None)
+        self._in_record = False
+        self._keep = None
+
+    @staticmethod
+    def _compile(patterns, binary=False):
+        if not patterns:
+            return None
+        source = '|'.join(f'(?:{pattern})' for pattern in patterns)
+        return re.compile(source.encode('utf-8') if binary else source)
+
+    def is_record_start(self, line):
+        start_regex, continuation_regex = self._regexes[type(line)]
+        if start_regex is None or not start_regex.match(line):
+            return False
+        return not (continuation_regex and continuation_regex.match(line))
+
+    def feed(self, line):
+        """Adds a line. Returns the list of records it completed (usually empty)."""
+        completed = []
+        if self._in_record and self.is_record_start(line):
+            self._complete(completed)
+
+        line_size = len(line)
+        if self._lines and self._size + line_size > self.max_entry_bytes:
+            # The record goes on in a new piece, which inherits its keep/drop decision
+            self._complete(completed, continued=True)
+
+        if not self._in_record:
+            self._in_record = True
+            self._keep = self.matcher.check_header(line) if self.matcher else True
+        elif self._keep is None and self.matcher.check_line(line):
+            self._keep = True
+
+        if self._keep is not False:
+            self._lines.append(line)
+            self._size += line_size
+        return completed
+
+    def _complete(self, completed, continued=False):
+        if self._keep and self._lines:
+            completed.append(self._lines[0][:0].join(self._lines))
+        elif not continued and self.on_drop:
+            self.on_drop()
+        self._lines = []
+        self._size = 0
+        if not continued:
+            self._in_record = False
+            self._keep = None
+
+    def flush(self):
+        """Completes the current record. Returns None if nothing is pending or it was dropped."""
+        if not self._in_record:
+            return None
+        completed = []
+        self._complete(completed)
+        return completed[0] if completed else None
+
+    def has_pending(self):
+        return self._in_record
+
+    @property
+    def pending_lines(self):
+        return len(self._lines)
+
+    @classmethod
+    def from_config(cls, segmentation_config, matcher=None, on_drop=None):
+        segmentation_config = segmentation_config or {}
+        return cls(
+            start_patterns=segmentation_config.get('record_start_patterns'),
+            continuation_patterns=segmentation_config.get('continuation_patterns'),
+            max_entry_bytes=segmentation_config.get('max_entry_bytes', DEFAULT_MAX_ENTRY_BYTES),
+            matcher=matcher,
+            on_drop=on_drop,
+        )
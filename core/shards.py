@@ -0,0 +1,280 @@
+import os
+import copy
+import time
+import signal
+import _thread
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+
+from core import ingest, metrics, monitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESTART_BACKOFF = 1.0
+DEFAULT_MAX_RESTART_BACKOFF = 60.0
+# A worker that ran this long before dying starts its backoff over
+DEFAULT_STABLE_SECONDS = 60.0
+DEFAULT_CHECK_INTERVAL = 1.0
+# Messages read from one worker per wakeup, so a busy shard can't starve the others
+MAX_MESSAGES_PER_WAKEUP = 100
+
+# ==========================================
+#  PARTITIONING
+# ==========================================
+def partition_services(services, workers):
+    """
+    Splits the services into `workers` lists. A service with `shard: N` is
+    pinned to shard N (modulo `workers`); the others are spread by
+    `shard_weight` (default 1), heaviest first, each onto the least loaded
+    shard. The result only depends on the config, so a restarted worker gets
+    the same services.
+    """
+    partition = [[] for _ in range(workers)]
+    loads = [0.0] * workers
+    balanced = []
+    for service in services:
+        if service.get('shard') is None:
+            balanced.append(service)
+            continue
+        index = int(service['shard']) % workers
+        partition[index].append(service)
+        loads[index] += service.get('shard_weight', 1)
+
+    for service in sorted(balanced, key=lambda s: -s.get('shard_weight', 1)):
+        index = min(range(workers), key=lambda i: (loads[i], i))
+        partition[index].append(service)
+        loads[index] += service.get('shard_weight', 1)
+    return partition
+
+def shard_config(config, index, services):
+    """The config a worker runs with: only its services, and its own checkpoint file."""
+    worker_config = copy.deepcopy(config)
+    monitoring_config = worker_config.setdefault('monitoring', {})
+    monitoring_config['services'] = copy.deepcopy(services)
+    checkpoint_config = monitoring_config.get('checkpoints') or {}
+    if checkpoint_config.get('enabled', False):
+        root, ext = os.path.splitext(checkpoint_config.get('path', '.cache/checkpoints.json'))
+        checkpoint_config['path'] = f"{root}.shard{index}{ext}"
+    return worker_config
+
+# ==========================================
+#  WORKER PROCESS
+# ==========================================
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def _watch_parent(parent_pid):
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    logger.warning("Coordinator process is gone, stopping the shard worker.")
+    _thread.interrupt_main()
+
+def run_shard(index, config, detect, connection, parent_pid):
+    """
+    Entry point of a worker process: tails the shard's services with
+    monitor.start_monitoring and runs `detect(entry, config, service_name)` on every entry.
+    Only triggered entries are sent to the coordinator, as
+    (entry, parsed_data, service_name, project_path).
+    """
+    # Ctrl+C reaches the whole process group; the coordinator decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _interrupt)
+    threading.Thread(target=_watch_parent, args=(parent_pid,), name="shard-parent-watch", daemon=True).start()
+    send_lock = threading.Lock()
+
+    def forward(entry, service_name, project_path):
+        triggered, parsed_data = detect(entry, config, service_name)
+        if not triggered:
+            return
+        try:
+            with send_lock:
+                connection.send((entry, parsed_data, service_name, project_path))
+        except OSError as e:
+            logger.error(f"Shard {index} lost its coordinator: {e}")
+            _thread.interrupt_main()
+
+    services = config.get('monitoring', {}).get('services', [])
+    logger.info(f"Shard {index} (pid {os.getpid()}) monitoring {', '.join(s.get('name', 'unknown') for s in services)}")
+    monitor.start_monitoring(config, forward)
+    connection.close()
+
+# ==========================================
+#  COORDINATOR
+# ==========================================
+class _Shard:
+    __slots__ = ('index', 'services', 'process', 'connection', 'started', 'failures', 'restart_at')
+
+    def __init__(self, index, services):
+        self.index = index
+        self.services = services
+        self.process = None
+        self.connection = None
+        self.started = 0.0
+        self.failures = 0
+        self.restart_at = None
+
+class ShardCoordinator:
+    """
+    Runs the monitors in `workers` processes instead of this one, for services
+    whose reading, segmenting and parsing would saturate a single core.
+
+    Each worker tails its own share of monitoring.services (see
+    partition_services) and runs detect_error itself, so only triggered
+    entries cross the process boundary, one pickled tuple per entry over a
+    per-worker pipe. The coordinator hands them to `submit(entry, parsed_data,
+    service_name, project_path)` (AnalysisPipeline.submit_detected), where
+    template mining, caching, analysis and notification happen once for all
+    shards.
+
+    A worker that dies is restarted after `restart_backoff` seconds, doubling
+    on every crash in a row up to `max_restart_backoff`. It resumes from its
+    checkpoints, if enabled.
+    """
+
+    def __init__(self, config, detect, submit, workers, restart_backoff=DEFAULT_RESTART_BACKOFF,
+                 max_restart_backoff=DEFAULT_MAX_RESTART_BACKOFF, stable_seconds=DEFAULT_STABLE_SECONDS,
+                 check_interval=DEFAULT_CHECK_INTERVAL):
+        self.config = config
+        self.detect = detect
+        self.submit = submit
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max(max_restart_backoff, restart_backoff)
+        self.stable_seconds = stable_seconds
+        self.check_interval = check_interval
+        # Network services are received by the coordinator itself (core.ingest)
+        services = [service for service in config.get('monitoring', {}).get('services', []) or []
+                    if not ingest.is_network_service(service)]
+        self.shards = [_Shard(index, shard_services)
+                       for index, shard_services in enumerate(partition_services(services, max(1, workers)))
+                       if shard_services]
+        # Workers are started fresh rather than forked from a process that already runs threads
+        self._context = multiprocessing.get_context('spawn')
+
+    def start(self):
+        for shard in self.shards:
+            self._launch(shard)
+        logger.info(f"Monitoring in {len(self.shards)} shard processes.")
+        return self
+
+    def _launch(self, shard):
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=run_shard, name=f"log-shard-{shard.index}", daemon=True,
+            args=(shard.index, shard_config(self.config, shard.index, shard.services), self.detect, sender, os.getpid())
+        )
+        process.start()
+        # Only the worker holds the sending end, so its death shows up as EOF
+        sender.close()
+        shard.process, shard.connection = process, receiver
+        shard.started, shard.restart_at = time.monotonic(), None
+
+    def alive(self):
+        """Number of running workers."""
+        return sum(1 for shard in self.shards if shard.process is not None and shard.process.is_alive())
+
+    def _drain(self, shard, limit=None):
+        """Submits what the worker sent. Returns the number of entries."""
+        forwarded = 0
+        connection = shard.connection
+        try:
+            while connection is not None and (limit is None or forwarded < limit) and connection.poll():
+                entry, parsed_data, service_name, project_path = connection.recv()
+                self.submit(entry, parsed_data, service_name, project_path)
+                metrics.SHARD_FORWARDED.labels(shard.index).inc()
+                forwarded += 1
+        except (EOFError, OSError):
+            connection.close()
+            shard.connection = None
+        return forwarded
+
+    def poll(self, timeout=0.0):
+        """Forwards whatever the workers sent, waiting up to `timeout` seconds, then supervises them."""
+        connections = {shard.connection: shard for shard in self.shards if shard.connection is not None}
+        forwarded = 0
+        if connections:
+            for connection in wait(list(connections), timeout):
+                forwarded += self._drain(connections[connection], MAX_MESSAGES_PER_WAKEUP)
+        elif timeout:
+            time.sleep(timeout)
+        self._supervise(time.monotonic())
+        return forwarded
+
+    def _supervise(self, now):
+        for shard in self.shards:
+            if shard.restart_at is not None:
+                if now >= shard.restart_at:
+                    metrics.SHARD_RESTARTS.labels(shard.index).inc()
+                    logger.info(f"Restarting shard {shard.index} worker.")
+                    self._launch(shard)
+                continue
+            if shard.process is None or shard.process.is_alive():
+                continue
+
+            shard.process.join()
+            self._drain(shard)
+            if shard.connection is not None:
+                shard.connection.close()
+                shard.connection = None
+            uptime = now - shard.started
+            shard.failures = 1 if uptime >= self.stable_seconds else shard.failures + 1
+            delay = min(self.restart_backoff * 2 ** (shard.failures - 1), self.max_restart_backoff)
+            shard.restart_at = now + delay
+            logger.error(f"Shard {shard.index} worker exited with code {shard.process.exitcode} "
+                         f"after {uptime:.0f}s, restarting in {delay:.1f}s.")
+
+    def run(self):
+        """Forwards and supervises until interrupted (Ctrl+C), then stops the workers."""
+        try:
+            while True:
+                self.poll(self.check_interval)
+        except KeyboardInterrupt:
+            logger.info("Stopping shard workers...")
+        self.stop()
+
+    def stop(self, timeout=10.0):
+        """Asks every worker to stop (flushing its checkpoints), forwarding what they still send."""
+        running = [shard for shard in self.shards if shard.process is not None and shard.process.is_alive()]
+        for shard in running:
+            shard.process.terminate()
+        deadline = time.monotonic() + timeout
+        while running and time.monotonic() < deadline:
+            for shard in running:
+                self._drain(shard)
+                shard.process.join(0.05)
+            running = [shard for shard in running if shard.process.is_alive()]
+        for shard in running:
+            logger.warning(f"Shard {shard.index} worker did not stop in time, killing it.")
+            shard.process.kill()
+            shard.process.join()
+        for shard in self.shards:
+            self._drain(shard)
+            if shard.connection is not None:
+                shard.connection.close()
+                shard.connection = None
+            shard.restart_at = None
+
+def from_config(config, detect, submit):
+    """
+    A ShardCoordinator for monitoring.shards, or None when sharding is off
+    (`workers` 0 or unset). `workers: auto` uses one process per CPU.
+    """
+    monitoring_config = config.get('monitoring', {})
+    shards_config = monitoring_config.get('shards', {}) or {}
+    workers = shards_config.get('workers', 0)
+    if workers == 'auto':
+        workers = os.cpu_count() or 1
+    if not workers:
+        return None
+    services = [service for service in monitoring_config.get('services', []) or []
+                if not ingest.is_network_service(service)]
+    if not services:
+        return None
+    return ShardCoordinator(
+        config, detect, submit,
+        workers=min(int(workers), max(1, len(services))),
+        restart_backoff=shards_config.get('restart_backoff', DEFAULT_RESTART_BACKOFF),
+        max_restart_backoff=shards_config.get('max_restart_backoff', DEFAULT_MAX_RESTART_BACKOFF),
+        stable_seconds=shards_config.get('stable_seconds', DEFAULT_STABLE_SECONDS),
+    )
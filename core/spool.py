@@ -0,0 +1,284 @@
+import os
+import json
+import zlib
+import struct
+import logging
+import threading
+
+from core import metrics
+from core.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_FSYNC_INTERVAL = 0.2
+DEFAULT_FSYNC_BATCH = 256
+# The oldest segment is rewritten when less than this share of its records is still pending
+DEFAULT_COMPACT_RATIO = 0.5
+
+# length of the payload, crc32 of id + kind + payload, record id, kind
+_HEADER = struct.Struct('>IIQB')
+PUT, ACK = 0, 1
+
+def _segment_name(number):
+    return f"segment-{number:08d}.log"
+
+class Spool:
+    """
+    An append-only, on-disk log of the entries waiting for analysis and
+    notification, so a crash or restart doesn't lose them.
+
+    append() writes a record to the active segment file and returns its id;
+    ack() marks it done. Writes are buffered and fsync()ed at most every
+    `fsync_interval` seconds (or every `fsync_batch` records), so a crash
+    loses at most that window. Segments roll over at `segment_bytes`.
+
+    Compaction: a segment is deleted as soon as it is the oldest one and
+    every record in it has been acknowledged. When a new segment is started
+    and the oldest one is mostly acknowledged (less than `compact_ratio`
+    still pending), its pending records are copied forward and the segment
+    is deleted, so one stuck entry can't pin old segments forever.
+
+    On open, every segment is read back. The records that were never
+    acknowledged are pending() again; writing continues in a new segment.
+    """
+
+    def __init__(self, path, segment_bytes=DEFAULT_SEGMENT_BYTES, fsync_interval=DEFAULT_FSYNC_INTERVAL,
+                 fsync_batch=DEFAULT_FSYNC_BATCH, compact_ratio=DEFAULT_COMPACT_RATIO, scheduler=None):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_ratio = compact_ratio
+        self.scheduler = scheduler or get_scheduler()
+        self._lock = threading.RLock()
+        # record id -> (segment number, offset of the record)
+        self._positions = {}
+        # segment number -> [records written, records still pending]
+        self._segments = {}
+        self._next_id = 1
+        self._active = None
+        self._file = None
+        self._size = 0
+        self._unsynced = 0
+        self._closed = False
+        os.makedirs(path, exist_ok=True)
+        self._replay()
+        self._roll()
+        metrics.SPOOL_PENDING.set_function(self.__len__)
+
+    def __len__(self):
+        return len(self._positions)
+
+    # ------------------------------------------
+    #  reading
+    # ------------------------------------------
+    def _segment_path(self, number):
+        return os.path.join(self.path, _segment_name(number))
+
+    def _records(self, number):
+        """Yields (offset, record_id, kind, payload) up to the first torn or corrupt record."""
+        with open(self._segment_path(number), 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, crc, record_id, kind = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(header[8:] + payload) != crc:
+                    logger.warning(f"Spool segment {number} is truncated or corrupt at byte {offset}, ignoring the rest")
+                    return
+                yield offset, record_id, kind, payload
+                offset += _HEADER.size + length
+
+    def _replay(self):
+        numbers = sorted(int(name[8:16]) for name in os.listdir(self.path)
+                         if name.startswith('segment-') and name.endswith('.log'))
+        for number in numbers:
+            written = 0
+            for offset, record_id, kind, _ in self._records(number):
+                self._next_id = max(self._next_id, record_id + 1)
+                if kind == PUT:
+                    written += 1
+                    previous = self._positions.get(record_id)
+                    if previous is not None:
+                        # Copied forward by a compaction that didn't finish deleting the old segment
+                        self._segments[previous[0]][1] -= 1
+                    self._positions[record_id] = (number, offset)
+                    self._segments.setdefault(number, [0, 0])[1] += 1
+                else:
+                    position = self._positions.pop(record_id, None)
+                    if position is not None:
+                        self._segments[position[0]][1] -= 1
+            self._segments.setdefault(number, [0, 0])[0] = written
+            self._active = number
+        if self._positions:
+            logger.info(f"Spool has {len(self._positions)} unacknowledged entries to replay")
+        self._delete_done_segments()
+
+    def read(self, record_id):
+        """The data appended as `record_id`. Raises KeyError once it is acknowledged."""
+        with self._lock:
+            number, offset = self._positions[record_id]
+            if number == self._active and self._file is not None:
+                self._file.flush()
+            with open(self._segment_path(number), 'rb') as f:
+                f.seek(offset)
+                length, _, _, _ = _HEADER.unpack(f.read(_HEADER.size))
+                payload = f.read(length)
+        return json.loads(payload)
+
+    def pending(self):
+        """Ids of every unacknowledged record, oldest first."""
+        with self._lock:
+            return sorted(self._positions)
+
+    # ------------------------------------------
+    #  writing
+    # ------------------------------------------
+    def _write(self, record_id, kind, payload=b''):
+        """Appends one record to the active segment. Caller holds the lock."""
+        body = struct.pack('>QB', record_id, kind) + payload
+        offset = self._size
+        self._file.write(struct.pack('>II', len(payload), zlib.crc32(body)) + body)
+        self._size += _HEADER.size + len(payload)
+        self._unsynced += 1
+        return offset
+
+    def append(self, data):
+        """Stores `data` (JSON serializable). Returns its record id."""
+        payload = json.dumps(data).encode('utf-8')
+        with self._lock:
+            if self._closed:
+                raise ValueError("Spool is closed")
+            if self._size >= self.segment_bytes:
+                self._roll()
+            record_id = self._next_id
+            self._next_id += 1
+            offset = self._write(record_id, PUT, payload)
+            self._positions[record_id] = (self._active, offset)
+            segment = self._segments[self._active]
+            segment[0] += 1
+            segment[1] += 1
+            self._after_write()
+        return record_id
+
+    def ack(self, record_id):
+        """Marks a record done. Unknown or already acknowledged ids are ignored."""
+        with self._lock:
+            if self._closed:
+                return
+            position = self._positions.pop(record_id, None)
+            if position is None:
+                return
+            self._segments[position[0]][1] -= 1
+            self._write(record_id, ACK)
+            self._after_write()
+            if position[0] != self._active:
+                self._delete_done_segments()
+
+    def _after_write(self):
+        if self._unsynced >= self.fsync_batch:
+            self._sync_locked()
+        else:
+            self.scheduler.schedule_once(self, self.fsync_interval, self.sync)
+
+    def _sync_locked(self):
+        if self._file is None or not self._unsynced:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        metrics.SPOOL_FSYNCS.inc()
+
+    def sync(self):
+        """Flushes buffered records to disk."""
+        with self._lock:
+            self._sync_locked()
+            self.scheduler.cancel(self)
+
+    # ------------------------------------------
+    #  segments and compaction
+    # ------------------------------------------
+    def _roll(self):
+        """Starts a new active segment, then compacts the oldest ones. Caller holds the lock (or is __init__)."""
+        if self._file is not None:
+            self._sync_locked()
+            self._file.close()
+        self._active = (self._active or 0) + 1
+        self._segments[self._active] = [0, 0]
+        self._file = open(self._segment_path(self._active), 'ab', buffering=1024 * 1024)
+        self._size = 0
+        self._delete_done_segments()
+        self._compact()
+
+    def _delete_done_segments(self):
+        """Deletes fully acknowledged segments from the oldest on; later ones may hold the acks of earlier ones."""
+        for number in sorted(self._segments):
+            written, pending = self._segments[number]
+            if number == self._active or pending > 0:
+                return
+            try:
+                os.remove(self._segment_path(number))
+            except FileNotFoundError:
+                pass
+            del self._segments[number]
+
+    def _compact(self):
+        """Copies the pending records of mostly acknowledged old segments forward, then deletes them."""
+        while True:
+            number = min(self._segments)
+            written, pending = self._segments[number]
+            if number == self._active or pending > written * self.compact_ratio:
+                return
+            moved = 0
+            for _, record_id, kind, payload in self._records(number):
+                if kind == PUT and self._positions.get(record_id, (None,))[0] == number:
+                    self._positions[record_id] = (self._active, self._write(record_id, PUT, payload))
+                    moved += 1
+            self._segments[self._active][0] += moved
+            self._segments[self._active][1] += moved
+            self._segments[number][1] = 0
+            # The copies must be on disk before the originals go away
+            self._sync_locked()
+            logger.info(f"Compacted spool segment {number}: moved {moved} pending entries")
+            self._delete_done_segments()
+
+    def disk_bytes(self):
+        with self._lock:
+            total = self._size
+            for number in self._segments:
+                if number != self._active:
+                    try:
+                        total += os.path.getsize(self._segment_path(number))
+                    except OSError:
+                        pass
+            return total
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._sync_locked()
+            self.scheduler.cancel(self)
+            self._file.close()
+            self._file = None
+            self._closed = True
+            # An empty active segment is just noise for the next start
+            if self._segments.get(self._active) == [0, 0] and self._size == 0:
+                os.remove(self._segment_path(self._active))
+                del self._segments[self._active]
+
+def from_config(config):
+    """Opens the spool configured under pipeline.spool, or returns None when it is disabled."""
+    spool_config = (config.get('pipeline', {}) or {}).get('spool', {}) or {}
+    if not spool_config.get('enabled', False):
+        return None
+    return Spool(
+        spool_config.get('path', '.cache/spool'),
+        segment_bytes=spool_config.get('segment_bytes', DEFAULT_SEGMENT_BYTES),
+        fsync_interval=spool_config.get('fsync_interval', DEFAULT_FSYNC_INTERVAL),
+        fsync_batch=spool_config.get('fsync_batch', DEFAULT_FSYNC_BATCH),
+        compact_ratio=spool_config.get('compact_ratio', DEFAULT_COMPACT_RATIO),
+    )
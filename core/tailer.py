@@ -0,0 +1,226 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_OPEN_FILES = 256
+# How much of the start of a file is hashed to recognize it again after a restart
+HEAD_BYTES = 1024
+
+class FileTailer:
+    """
+    Reads appended data from a file in binary mode.
+
+    Data is pulled with large readinto() calls into one reusable buffer and
+    split into lines without decoding. A trailing fragment without a newline
+    is held back until the rest of the line arrives, so a half-written line is
+    never reported as complete. `offset` is the byte position just after the
+    last complete line handed out.
+
+    Line endings are returned untouched so that line lengths add up to byte
+    offsets exactly; decode() normalizes CRLF.
+    """
+
+    def __init__(self, path, encoding='utf-8', errors='replace', chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+        self.chunk_size = chunk_size
+        self.file_handle = None
+        self.offset = 0
+        self._buffer = bytearray(chunk_size)
+        self._view = memoryview(self._buffer)
+        self._partial = b""
+        self.has_more = False
+        self.identity = None
+
+    def open(self, offset=None):
+        """Opens the file at `offset`, or at the end of the file when offset is None."""
+        self.close()
+        self.file_handle = open(self.path, 'rb', buffering=0)
+        stat = os.fstat(self.file_handle.fileno())
+        self.identity = (stat.st_ino, stat.st_dev)
+        if offset is None:
+            self.offset = self.file_handle.seek(0, os.SEEK_END)
+        else:
+            self.offset = self.file_handle.seek(offset)
+        self._partial = b""
+        return self
+
+    @property
+    def position(self):
+        """Byte position of the read cursor (includes a held-back partial line)."""
+        return self.offset + len(self._partial)
+
+    def head_hash(self, length=HEAD_BYTES):
+        """Returns (sha1, length) of the first bytes of the open file."""
+        if self.file_handle is None:
+            return None, 0
+        head = os.pread(self.file_handle.fileno(), length, 0)
+        return hashlib.sha1(head).hexdigest(), len(head)
+
+    def suspend(self):
+        """Closes the handle but keeps the position, so resume() continues where reading stopped."""
+        if self.file_handle is not None:
+            try:
+                self.file_handle.close()
+            except OSError:
+                pass
+            self.file_handle = None
+
+    @property
+    def is_suspended(self):
+        return self.file_handle is None and self.identity is not None
+
+    def resume(self):
+        """
+        Reopens a suspended file at its read position. Returns False when the
+        path now holds a different (or shorter) file, which is then left open
+        at its start. Raises OSError if the path can't be opened.
+        """
+        handle = open(self.path, 'rb', buffering=0)
+        stat = os.fstat(handle.fileno())
+        self.file_handle = handle
+        if (stat.st_ino, stat.st_dev) == self.identity and stat.st_size >= self.position:
+            handle.seek(self.position)
+            return True
+        self.identity = (stat.st_ino, stat.st_dev)
+        self.offset = 0
+        self._partial = b""
+        return False
+
+    def path_changed(self):
+        """
+        Compares the open (or suspended) file with what is at `path` now. Returns
+        'rotated' if the path points to a different file, 'truncated' if the
+        file shrank below our position, 'missing' if the path is gone, or None.
+        """
+        if self.identity is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 'missing'
+        if (stat.st_ino, stat.st_dev) != self.identity:
+            return 'rotated'
+        if stat.st_size < self.position:
+            return 'truncated'
+        return None
+
+    def drain(self):
+        """Reads everything left in the open file, including an unterminated last line."""
+        lines = self.read_lines()
+        while self.has_more:
+            lines.extend(self.read_lines())
+        if self._partial:
+            lines.append(self._partial + b"\n")
+            self.offset += len(self._partial)
+            self._partial = b""
+        return lines
+
+    @property
+    def is_open(self):
+        return self.file_handle is not None
+
+    def read_lines(self, max_chunks=16):
+        """
+        Returns the complete lines appended since the last call, as bytes (newline kept).
+        At most `max_chunks` chunks are read per call; `has_more` tells whether
+        the read stopped early.
+        """
+        self.has_more = False
+        if self.file_handle is None:
+            return []
+
+        chunks = [self._partial] if self._partial else []
+        for _ in range(max_chunks):
+            count = self.file_handle.readinto(self._buffer)
+            if not count:
+                break
+            chunks.append(bytes(self._view[:count]))
+            if count < self.chunk_size:
+                break
+        else:
+            self.has_more = True
+
+        if not chunks:
+            return []
+        data = b"".join(chunks) if len(chunks) > 1 else chunks[0]
+
+        last_newline = data.rfind(b"\n")
+        if last_newline == -1:
+            self._partial = data
+            return []
+
+        complete = data[:last_newline + 1]
+        self._partial = data[last_newline + 1:]
+        self.offset += len(complete)
+
+        return complete.splitlines(keepends=True)
+
+    def decode(self, data):
+        text = data.decode(self.encoding, self.errors)
+        return text.replace("\r\n", "\n") if "\r" in text else text
+
+    def close(self):
+        if self.file_handle is not None:
+            try:
+                self.file_handle.close()
+            except OSError:
+                pass
+        self.file_handle = None
+        self.identity = None
+        self._partial = b""
+
+def default_max_open_files():
+    """DEFAULT_MAX_OPEN_FILES, but never more than half of the process's file descriptor limit."""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return DEFAULT_MAX_OPEN_FILES
+    if soft == resource.RLIM_INFINITY:
+        return DEFAULT_MAX_OPEN_FILES
+    return max(1, min(DEFAULT_MAX_OPEN_FILES, soft // 2))
+
+class HandlePool:
+    """
+    Keeps at most `max_open` files open. Users call touch() whenever they
+    read; when that takes the pool over its limit, the least recently used
+    ones are suspended (their handle is closed, their offset kept) and reopen
+    themselves on their next read.
+
+    Pool members are any objects with a suspend() method (LogMonitor).
+    Suspension happens outside the pool's lock, so a member may hold its own
+    lock while calling touch().
+    """
+
+    def __init__(self, max_open=None):
+        self.max_open = max(1, max_open or default_max_open_files())
+        self.suspended = 0
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._open)
+
+    def touch(self, member):
+        """Marks `member` as open and most recently used, suspending the least recently used if needed."""
+        victims = []
+        with self._lock:
+            self._open[member] = True
+            self._open.move_to_end(member)
+            while len(self._open) > self.max_open:
+                victim, _ = self._open.popitem(last=False)
+                victims.append(victim)
+            self.suspended += len(victims)
+        for victim in victims:
+            victim.suspend()
+
+    def discard(self, member):
+        with self._lock:
+            self._open.pop(member, None)
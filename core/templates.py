@@ -0,0 +1,357 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from core import cache, metrics
+from core.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = '<*>'
+# Key of the template list inside a tree node (child keys are always strings)
+_LEAF = None
+
+# Unindented trace lines that aren't the exception itself
+_TRACE_HEADERS = re.compile(
+    r'Traceback \(most recent call last\)|\.\.\. \d+ more|During handling of the above exception'
+    r'|The above exception was the direct cause|goroutine \d+ \['
+)
+
+def exception_line(log_entry):
+    """
+    The trace's final exception line ("KeyError: 'id'", "Caused by: java.io.IOException: ...")
+    of a multi-line entry, or '' when there is none.
+    """
+    lines = log_entry.strip().split('\n')
+    for line in reversed(lines[1:]):
+        if line and not line[0].isspace() and not _TRACE_HEADERS.match(line):
+            return line.strip()
+    return ''
+
+def exception_type(line):
+    """KeyError for "KeyError: 'id'", java.io.IOException for "Caused by: java.io.IOException: disk"."""
+    if line.startswith('Caused by: '):
+        line = line[len('Caused by: '):]
+    return line.split(':', 1)[0].split(' ', 1)[0]
+
+def template_text(log_entry):
+    """
+    The text an entry is clustered on: its first line, plus the final exception
+    line of its trace, with timestamps, ids and numbers masked.
+    """
+    first_line = log_entry.strip().split('\n', 1)[0]
+    exception = exception_line(log_entry)
+    if exception:
+        first_line = f"{first_line} {exception}"
+    return cache.normalize_entry(first_line)
+
+def template_location(parsed_data, log_entry=''):
+    """
+    The key templates are split on before any text matching: the best frame's
+    location and the exception type, so two exceptions raised at the same
+    line never share a template however similar their messages are.
+    """
+    location = f"{parsed_data.get('filepath')}:{parsed_data.get('lineno')}" if parsed_data else ''
+    exception = exception_line(log_entry) if log_entry else ''
+    if exception:
+        location = f"{location} {exception_type(exception)}"
+    return location
+
+class Template:
+    __slots__ = ('id', 'tokens', 'path', 'count', 'first_seen', 'last_seen', 'windows', 'last_spike_window')
+
+    def __init__(self, template_id, tokens, path, now, history):
+        self.id = template_id
+        self.tokens = tokens
+        self.path = path
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        # [window index, count] for the current window and the baseline windows before it
+        self.windows = deque(maxlen=history)
+        self.last_spike_window = None
+
+    @property
+    def text(self):
+        return ' '.join(self.tokens)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tokens': self.tokens,
+            'path': self.path,
+            'count': self.count,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'windows': list(self.windows),
+            'last_spike_window': self.last_spike_window,
+        }
+
+class TemplateMiner:
+    """
+    Online log template miner in the style of Drain (He et al., 2017).
+
+    Token lists are routed through a fixed-depth tree: first by code location (so
+    the same message thrown from different places never merges), then by token count, then
+    by their first `depth - 2` tokens (tokens containing digits go to a wildcard
+    branch). The leaf holds candidate templates. An entry joins the most similar
+    one if at least `similarity_threshold` of the tokens are equal, and the
+    positions that differ become wildcards. Otherwise it starts a new template.
+    At most `max_templates` are kept; the least recently seen is evicted.
+
+    Each template counts occurrences per `window_seconds` window. observe()
+    reports a template as 'new' the first time it is seen, and as 'spike' (once per
+    window, not in the window it appeared) when the current window reaches `spike_min_count` and is
+    `spike_factor` times the average of the previous `baseline_windows` windows.
+    """
+
+    def __init__(self, similarity_threshold=0.4, depth=4, max_children=100, max_templates=1000,
+                 window_seconds=60, baseline_windows=10, spike_factor=5.0, spike_min_count=10,
+                 snapshot_path=None, snapshot_interval=30):
+        self.similarity_threshold = similarity_threshold
+        self.depth = max(depth, 3)
+        self.max_children = max_children
+        self.max_templates = max_templates
+        self.window_seconds = window_seconds
+        self.baseline_windows = baseline_windows
+        self.spike_factor = spike_factor
+        self.spike_min_count = spike_min_count
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._root = {}
+        self._templates = OrderedDict()
+        self._next_id = 1
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._scheduler = None
+        if snapshot_path:
+            self._load()
+
+    def __len__(self):
+        return len(self._templates)
+
+    # ------------------------------------------
+    #  Parse tree
+    # ------------------------------------------
+    def _route(self, tokens, location):
+        """Returns the key path for a token list, adding branches where there is room."""
+        path = [location, str(len(tokens))]
+        node = self._root.setdefault(location, {}).setdefault(path[1], {})
+        for token in tokens[:self.depth - 2]:
+            key = WILDCARD if (token == WILDCARD or any(c.isdigit() for c in token)) else token
+            if key not in node:
+                children = len(node) - (_LEAF in node)
+                if children >= self.max_children:
+                    key = WILDCARD
+                node.setdefault(key, {})
+            path.append(key)
+            node = node[key]
+        return path, node.setdefault(_LEAF, [])
+
+    def _leaf(self, path):
+        node = self._root
+        for key in path:
+            node = node.setdefault(key, {})
+        return node.setdefault(_LEAF, [])
+
+    @staticmethod
+    def _similarity(template_tokens, tokens):
+        equal = sum(1 for a, b in zip(template_tokens, tokens) if a == b and a != WILDCARD)
+        return equal / len(tokens) if tokens else 1.0
+
+    def _match(self, leaf, tokens):
+        best, best_similarity = None, -1.0
+        for template_id in leaf:
+            template = self._templates[template_id]
+            similarity = self._similarity(template.tokens, tokens)
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+        if best is not None and best_similarity >= self.similarity_threshold:
+            return best
+        return None
+
+    def _evict(self):
+        while len(self._templates) > self.max_templates:
+            _, template = self._templates.popitem(last=False)
+            leaf = self._leaf(template.path)
+            if template.id in leaf:
+                leaf.remove(template.id)
+
+    # ------------------------------------------
+    #  Counting
+    # ------------------------------------------
+    def _count(self, template, now):
+        window = int(now // self.window_seconds)
+        windows = template.windows
+        if windows and windows[-1][0] == window:
+            windows[-1][1] += 1
+        else:
+            windows.append([window, 1])
+        template.count += 1
+        template.last_seen = now
+
+        current = windows[-1][1]
+        if current < self.spike_min_count or template.last_spike_window == window:
+            return False
+        first_window = window - self.baseline_windows
+        baseline = sum(count for index, count in windows if first_window <= index < window) / self.baseline_windows
+        if current >= self.spike_factor * baseline:
+            template.last_spike_window = window
+            return True
+        return False
+
+    def observe(self, text, now=None, location=''):
+        """
+        Assigns `text` (seen at code `location`, if known) to a template. Returns
+        (template, reason), where reason is 'new', 'spike' or None for a known
+        template at its usual rate.
+        """
+        now = time.time() if now is None else now
+        tokens = text.split()
+        with self._lock:
+            path, leaf = self._route(tokens, location)
+            template = self._match(leaf, tokens)
+            reason = None
+            if template is None:
+                template = Template(self._next_id, tokens, path, now, self.baseline_windows + 1)
+                # The burst that created a template is not reported again as a spike
+                template.last_spike_window = int(now // self.window_seconds)
+                self._next_id += 1
+                self._templates[template.id] = template
+                leaf.append(template.id)
+                reason = 'new'
+                self._evict()
+            else:
+                if template.tokens != tokens:
+                    template.tokens = [a if a == b else WILDCARD for a, b in zip(template.tokens, tokens)]
+                self._templates.move_to_end(template.id)
+
+            spiking = self._count(template, now)
+            if reason is None and spiking:
+                reason = 'spike'
+            self._dirty = True
+        metrics.TEMPLATE_MATCHES.labels(reason or 'known').inc()
+        return template, reason
+
+    def observe_entry(self, log_entry, parsed_data=None, now=None):
+        return self.observe(template_text(log_entry), now, template_location(parsed_data, log_entry))
+
+    def templates(self):
+        with self._lock:
+            return list(self._templates.values())
+
+    # ------------------------------------------
+    #  Snapshots
+    # ------------------------------------------
+    def _load(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                state = json.load(f)
+            for data in state.get('templates', []):
+                template = Template(data['id'], data['tokens'], data['path'], data['first_seen'], self.baseline_windows + 1)
+                template.count = data['count']
+                template.last_seen = data['last_seen']
+                template.windows.extend(data['windows'])
+                template.last_spike_window = data['last_spike_window']
+                self._templates[template.id] = template
+                self._leaf(template.path).append(template.id)
+            self._next_id = state.get('next_id', len(self._templates) + 1)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Ignoring unreadable template snapshot {self.snapshot_path}: {e}")
+            self._root = {}
+            self._templates = OrderedDict()
+            self._next_id = 1
+            return
+        self._evict()
+        logger.info(f"Loaded {len(self._templates)} log templates from {self.snapshot_path}")
+
+    def snapshot(self):
+        """Writes the templates to disk if anything changed since the last snapshot."""
+        if not self.snapshot_path:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            state = json.dumps({
+                'next_id': self._next_id,
+                'templates': [template.to_dict() for template in self._templates.values()],
+            })
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(state)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Failed to write template snapshot to {self.snapshot_path}: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+        return True
+
+    def start(self, scheduler):
+        """Snapshots periodically on the given DeadlineScheduler."""
+        self._scheduler = scheduler
+        self._schedule_next()
+        return self
+
+    def _schedule_next(self):
+        self._scheduler.schedule(self, self.snapshot_interval, self._periodic_snapshot)
+
+    def _periodic_snapshot(self):
+        self.snapshot()
+        if self._scheduler is not None:
+            self._schedule_next()
+
+    def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel(self)
+            self._scheduler = None
+        self.snapshot()
+
+_miner = None
+_miner_lock = threading.Lock()
+
+def get_miner(config):
+    """
+    Returns the process-wide TemplateMiner configured under
+    ai_analysis.templates, or None when template mining is disabled.
+    """
+    global _miner
+    template_config = config.get('ai_analysis', {}).get('templates', {}) or {}
+    if not template_config.get('enabled', False):
+        return None
+    with _miner_lock:
+        if _miner is None:
+            _miner = TemplateMiner(
+                similarity_threshold=template_config.get('similarity_threshold', 0.4),
+                depth=template_config.get('depth', 4),
+                max_children=template_config.get('max_children', 100),
+                max_templates=template_config.get('max_templates', 1000),
+                window_seconds=template_config.get('window_seconds', 60),
+                baseline_windows=template_config.get('baseline_windows', 10),
+                spike_factor=template_config.get('spike_factor', 5.0),
+                spike_min_count=template_config.get('spike_min_count', 10),
+                snapshot_path=template_config.get('snapshot_path', '.cache/templates.json'),
+                snapshot_interval=template_config.get('snapshot_interval', 30),
+            )
+            _miner.start(get_scheduler())
+            metrics.TEMPLATE_COUNT.set_function(_miner.__len__)
+        return _miner
+
+def stop_miner():
+    """Stops periodic snapshots and writes a final one."""
+    global _miner
+    with _miner_lock:
+        if _miner is not None:
+            _miner.stop()
+            _miner = None
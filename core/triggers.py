@@ -0,0 +1,128 @@
+import re
+
+from core import parser
+
+def _default_trace_keywords():
+    """
+    The literal hints of parser.PATTERNS, so an entry holding a stack frame is
+    kept even without a trigger level. Rust's bare 'at' hint would match most
+    prose, so it is narrowed to the panic header and '.rs:' frames.
+    """
+    keywords = []
+    for pattern in parser.PATTERNS:
+        for hint in pattern.get('hints', ()):
+            if hint == 'at':
+                continue
+            if hint not in keywords:
+                keywords.append(hint)
+    return keywords + ['panicked at', '.rs:']
+
+DEFAULT_TRACE_KEYWORDS = _default_trace_keywords()
+
+class TriggerMatcher:
+    """
+    Decides at ingest time whether a log entry can trigger an analysis, so the
+    monitor can drop the rest before they are joined, decoded or queued.
+
+    An entry is kept when it contains one of `levels` (case-insensitive, like
+    detect_error) or one of `trace_keywords` (case-sensitive stack frame
+    markers). Each line is checked with one compiled regex, in bytes or str.
+
+    - `level_pattern`: optional regex with a `level` group, searched in the first
+      line. When it matches, only that field is compared with `levels`, so an
+      INFO line that merely mentions "error" is not kept. Trace keywords still count.
+    - `allow_patterns`: an entry whose first line matches is always kept.
+    - `deny_patterns`: an entry whose first line matches is always dropped.
+      Its remaining lines are not even buffered.
+    """
+
+    def __init__(self, levels, level_pattern=None, trace_keywords=None, allow_patterns=None, deny_patterns=None):
+        self.levels = [level.upper() for level in levels or []]
+        if trace_keywords is None:
+            trace_keywords = DEFAULT_TRACE_KEYWORDS
+        self.trace_keywords = list(trace_keywords)
+        self.has_level_field = bool(level_pattern)
+
+        level_source = '|'.join(re.escape(level) for level in self.levels)
+        trace_source = '|'.join(re.escape(keyword) for keyword in self.trace_keywords)
+        any_source = '|'.join(source for source in (f'(?i:{level_source})' if level_source else '', trace_source) if source)
+        sources = {
+            'any': any_source or None,
+            'trace': trace_source or None,
+            'level_field': level_pattern,
+            'allow': '|'.join(f'(?:{pattern})' for pattern in allow_patterns or []) or None,
+            'deny': '|'.join(f'(?:{pattern})' for pattern in deny_patterns or []) or None,
+        }
+        self._regexes = {
+            str: {name: re.compile(source) if source else None for name, source in sources.items()},
+            bytes: {name: re.compile(source.encode('utf-8')) if source else None for name, source in sources.items()},
+        }
+        self._level_set = {str: set(self.levels), bytes: {level.encode('utf-8') for level in self.levels}}
+
+    @staticmethod
+    def _search(regex, line):
+        return regex is not None and regex.search(line) is not None
+
+    def check_header(self, line):
+        """
+        Evaluates the first line of an entry. Returns True (keep), False (drop
+        the whole entry) or None (undecided: later lines may still match).
+        """
+        regexes = self._regexes[type(line)]
+        if self._search(regexes['deny'], line):
+            return False
+        if self._search(regexes['allow'], line):
+            return True
+        if regexes['level_field'] is not None:
+            match = regexes['level_field'].search(line)
+            if match:
+                if match.group('level').upper() in self._level_set[type(line)]:
+                    return True
+                return True if self._search(regexes['trace'], line) else None
+        return True if self._search(regexes['any'], line) else None
+
+    def check_line(self, line):
+        """Evaluates a continuation line of an undecided entry."""
+        regexes = self._regexes[type(line)]
+        if self._search(regexes['allow'], line):
+            return True
+        return self._search(regexes['trace'] if self.has_level_field else regexes['any'], line)
+
+    def matches(self, entry):
+        """Evaluates a whole entry at once."""
+        lines = entry.splitlines()
+        if not lines:
+            return False
+        keep = self.check_header(lines[0])
+        if keep is None:
+            keep = any(self.check_line(line) for line in lines[1:])
+        return bool(keep)
+
+def from_config(monitoring_config, service=None):
+    """
+    Builds the ingest-time matcher for a service: `trigger_levels` and `triggers`
+    may be set globally under monitoring and overridden per service. Returns
+    None (keep everything) when no trigger levels are configured or
+    `triggers.ingest_filter` is false.
+    """
+    service = service or {}
+    trigger_config = {**(monitoring_config.get('triggers') or {}), **(service.get('triggers') or {})}
+    if not trigger_config.get('ingest_filter', True):
+        return None
+    levels = service.get('trigger_levels', monitoring_config.get('trigger_levels'))
+    if not levels:
+        return None
+
+    trace_keywords = trigger_config.get('trace_keywords', True)
+    if trace_keywords is True:
+        trace_keywords = None
+    elif not trace_keywords:
+        trace_keywords = []
+
+    return TriggerMatcher(
+        levels,
+        level_pattern=trigger_config.get('level_pattern'),
+        trace_keywords=trace_keywords,
+        allow_patterns=trigger_config.get('allow_patterns'),
+        deny_patterns=trigger_config.get('deny_patterns'),
+    )
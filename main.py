@@ -1,11 +1,15 @@
 import os
 import sys
+import copy
+import glob
+import fnmatch
 import yaml
 import logging
+import argparse
 from dotenv import load_dotenv
 
 # Import our custom modules
-from core import monitor, parser, analyzer, notifier
+from core import monitor, parser, analyzer, batcher, notifier, pipeline, backfill, metrics, templates, shards, ingest, spool
 
 # Configure logging
 logging.basicConfig(
@@ -57,56 +61,161 @@ def load_config(path="config.yaml"):
         logger.error(f"Error parsing config file: {e}")
         sys.exit(1)
 
-def handle_new_log(entry, service_name,project_path, config):
+def service_trigger_levels(config, service_name=None):
+    """The trigger levels of a service: its own `trigger_levels`, or the global ones."""
+    monitoring_config = config.get('monitoring', {})
+    for service in monitoring_config.get('services', []) or []:
+        if service_name is not None and service.get('name') == service_name and 'trigger_levels' in service:
+            return service.get('trigger_levels') or []
+    return monitoring_config.get('trigger_levels', []) or []
+
+def detect_error(entry, config, service_name=None):
     """
-    Handles potentially multi-line log entries.
-    Scans for the best file/line match to provide context to the AI.
+    Decides whether an entry should be analyzed, by the trigger levels of the
+    service it came from. Returns (triggered, best_match) where best_match is
+    the parsed file/line, if any.
     """
     logger.debug(f"Received log entry: {entry[:50]}...")
-    trigger_levels = config['monitoring'].get('trigger_levels', [])
+    trigger_levels = service_trigger_levels(config, service_name)
     lines = entry.strip().split('\n')
     
     # 1. Determine if this entry should trigger analysis
     is_error_level = any(level in entry.upper() for level in trigger_levels)
     
-    # 2. Look for the best file path match (scanning bottom-up is usually better for traces)
-    best_match = None
-    ignored_keywords = ['site-packages', 'dist-packages', 'node_modules', '/usr/lib', 'lib/python']
-    
-    for line in reversed(lines):
-        parsed = parser.parse_log_line(line)
-        if parsed:
-            filepath = parsed['filepath']
-            # If it's not a library file, it's our best candidate
-            if not any(kw in filepath for kw in ignored_keywords):
-                best_match = parsed
-                break
-            # Store library matches as a fallback if nothing else is found
-            if not best_match:
-                best_match = parsed
+    # 2. Look for the best file path match (one pass over the whole entry, best frame is picked bottom-up)
+    best_match = parser.parse_entry(entry)['best_match']
 
     if not (is_error_level or best_match):
-        return
+        return False, None
 
     if best_match:
         logger.info(f"Trace detected: {best_match['filepath']} (Line {best_match['lineno']})")
     elif is_error_level:
         logger.info(f"Trigger Detected: {lines[0][:100]}...")
+    return True, best_match
+
+def is_new_or_spiking(entry, best_match, config):
+    """
+    Template mining for a triggering entry: True when its template is new or
+    its rate is spiking. Known templates are just counted.
+    """
+    miner = templates.get_miner(config)
+    if miner:
+        template, reason = miner.observe_entry(entry, best_match)
+        if reason is None:
+            logger.debug(f"Known template #{template.id} ({template.count} occurrences), skipping analysis.")
+            return False
+        logger.info(f"Template #{template.id} is {reason} ({template.count} occurrences): {template.text[:100]}")
+    return True
+
+def select_for_analysis(entry, config, service_name=None):
+    """
+    detect_error, then template mining: a triggering entry is only analyzed when
+    its template is new or its rate is spiking (see is_new_or_spiking).
+    Returns (analyze, best_match).
+    """
+    triggered, best_match = detect_error(entry, config, service_name)
+    if not triggered or not is_new_or_spiking(entry, best_match, config):
+        return False, None
+    return True, best_match
+
+def provisional_alerts_enabled(config):
+    streaming_config = config.get('ai_analysis', {}).get('streaming', {}) or {}
+    return bool(streaming_config.get('enabled') and streaming_config.get('provisional_alerts', True))
+
+def announce_unless_cached(entry, best_match, service_name, config):
+    """
+    Sends the provisional alert for an entry about to be analyzed, unless its
+    analysis is already cached: the full alert then follows at once anyway.
+    """
+    if analyzer.is_cached(entry, best_match, config):
+        return
+    notifier.get_dispatcher(config).dispatch_provisional(entry, best_match, service_name)
+
+def handle_new_log(entry, service_name,project_path, config):
+    """
+    Handles potentially multi-line log entries.
+    Scans for the best file/line match to provide context to the AI.
+    """
+    triggered, best_match = select_for_analysis(entry, config, service_name)
+    if not triggered:
+        return
 
     # 3. Analyze & Notify
+    if provisional_alerts_enabled(config):
+        announce_unless_cached(entry, best_match, service_name, config)
+
     # Pass best_match (parsed_data) to analyzer
     ai_suggestion = analyzer.analyze_error(entry, best_match, project_path, config)
     
     if ai_suggestion:
-        notifier.send_slack_alert(entry, ai_suggestion, service_name,  config)
-        notifier.send_email_alert(entry, ai_suggestion, service_name, config)
-        notifier.send_discord_alert(entry, ai_suggestion, service_name, config)
+        notifier.get_dispatcher(config).dispatch(entry, ai_suggestion, service_name)
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="AI Log Analyzer")
+    arg_parser.add_argument("--config", default="config.yaml", help="Path to the config file")
+    arg_parser.add_argument("--backfill", nargs="+", metavar="LOG",
+                            help="Analyze historical log files (plain or .gz) instead of tailing live ones")
+    arg_parser.add_argument("--service", help="Configured service whose project_path/segmentation apply to --backfill")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Backfill worker processes (default: CPU count)")
+    arg_parser.add_argument("--notify", action="store_true", help="Send backfill results to the notification channels")
+    return arg_parser.parse_args(argv)
+
+def find_service(config, service_name=None, log_path=None):
+    """Finds a configured service by name, or by the log file it writes (rotated names included)."""
+    services = config.get('monitoring', {}).get('services', [])
+    for service in services:
+        if service_name and service.get('name') == service_name:
+            return service
+        if log_path and service.get('log_file'):
+            name, pattern = os.path.basename(log_path), os.path.basename(service['log_file'])
+            if name.startswith(pattern) or (glob.has_magic(pattern) and fnmatch.fnmatch(name, pattern + '*')):
+                return service
+    return None
 
-def main():
+def run_backfill(config, args):
+    """Offline mode: analyze the distinct errors found in historical logs."""
+    service = find_service(config, args.service, args.backfill[0]) or {}
+    service_name = service.get('name', 'backfill')
+    project_path = os.path.abspath(service.get('project_path', '.'))
+
+    backfill_config = copy.deepcopy(config)
+    monitoring_config = backfill_config.setdefault('monitoring', {})
+    monitoring_config['segmentation'] = {**(monitoring_config.get('segmentation') or {}), **(service.get('segmentation') or {})}
+    monitoring_config['triggers'] = {**(monitoring_config.get('triggers') or {}), **(service.get('triggers') or {})}
+    if 'trigger_levels' in service:
+        monitoring_config['trigger_levels'] = service['trigger_levels']
+    if service.get('format'):
+        monitoring_config['format'] = service['format']
+    monitoring_config['json'] = {**(monitoring_config.get('json') or {}), **(service.get('json') or {})}
+
+    logger.info(f"Backfilling {len(args.backfill)} files for service '{service_name}'")
+    summary = backfill.run_backfill(
+        backfill_config,
+        args.backfill,
+        detect=detect_error,
+        analyze=lambda entry, parsed, path: analyzer.analyze_error(entry, parsed, path, config),
+        notify=notifier.get_dispatcher(config).dispatch if args.notify else None,
+        workers=args.workers,
+        service_name=service_name,
+        project_path=project_path,
+    )
+    backfill.print_summary(summary)
+    if args.notify:
+        notifier.get_dispatcher(config).close()
+        notifier.email_digest.flush_all()
+        notifier.close_smtp_connections()
+
+def main(argv=None):
+    args = parse_args(argv)
     logger.info("STARTING LOG ANALYZER")
 
     # 1. Load Config
-    config = load_config()
+    config = load_config(args.config)
+
+    if args.backfill:
+        run_backfill(config, args)
+        return
     
     # 2. Validation
     services = config.get('monitoring', {}).get('services', [])
@@ -114,19 +223,64 @@ def main():
         logger.error("No services defined in the configuration. Exiting.")
         sys.exit(1) 
     for service in services:
+        if ingest.is_network_service(service):
+            logger.info(f"Service '{service.get('name', 'unknown')}' is received over the network")
+            continue
         log_path = service.get('log_file')
         if not log_path:
             logger.error(f"Service '{service.get('name', 'unknown')}' is missing 'log_file' in config.")
             sys.exit(1)
         logger.info(f"Configured to monitor: {log_path} for service '{service.get('name', 'unknown')}'")
-        logger.info(f"Trigger Levels: {config['monitoring'].get('trigger_levels', [])}")
+        logger.info(f"Trigger Levels: {service.get('trigger_levels', config['monitoring'].get('trigger_levels', []))}")
     
     
   
+    metrics_server = metrics.from_config(config)
+
+    # 3. ingest -> parse/filter -> analyze -> notify
+    dispatcher = notifier.get_dispatcher(config)
+    # Triggered entries are kept on disk until their alert went out (pipeline.spool)
+    analysis_spool = spool.from_config(config)
+    analysis_pipeline = pipeline.AnalysisPipeline(
+        config,
+        detect=lambda entry, service_name: select_for_analysis(entry, config, service_name),
+        analyze=lambda entry, parsed, project_path: analyzer.analyze_error(entry, parsed, project_path, config),
+        notify=dispatcher.dispatch,
+        announce=(lambda entry, parsed, service_name: announce_unless_cached(entry, parsed, service_name, config))
+        if provisional_alerts_enabled(config) else None,
+        analyze_batch=lambda items: batcher.analyze_batch(items, config),
+        select=lambda entry, parsed: is_new_or_spiking(entry, parsed, config),
+        spool=analysis_spool
+    ).start()
+
     def on_new_line(line, service_name, project_path):
-        handle_new_log(line, service_name, project_path, config)
+        analysis_pipeline.submit(line, service_name, project_path)
+
+    # Syslog / HTTP sources feed the same pipeline as the log files
+    ingest_server = ingest.from_config(config, on_new_line)
+
+    # With monitoring.shards, worker processes tail and detect; this process only analyzes
+    coordinator = shards.from_config(config, detect_error, analysis_pipeline.submit_detected)
+    if coordinator is not None:
+        coordinator.start().run()
+    elif any(not ingest.is_network_service(service) for service in services):
+        monitor.start_monitoring(config, on_new_line)
+    elif ingest_server is not None:
+        ingest_server.run_until_interrupted()
+    if ingest_server is not None:
+        ingest_server.stop()
+    analysis_pipeline.stop()
+    dispatcher.close()
 
-    monitor.start_monitoring(config, on_new_line)
+    # Don't lose alerts still waiting in an email digest window
+    notifier.email_digest.flush_all()
+    # After the digests, which acknowledge their spooled entries once sent
+    if analysis_spool is not None:
+        analysis_spool.close()
+    notifier.close_smtp_connections()
+    templates.stop_miner()
+    if metrics_server:
+        metrics_server.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
 import pytest
+from unittest.mock import patch
 from core import analyzer
 
 def test_analyze_error(tmp_path):
@@ -42,7 +43,81 @@ calculate_total(None)
     with patch('core.analyzer.completion') as mock_completion:
         mock_completion.return_value.choices = [type('obj', (object,), {'message': type('obj', (object,), {'content': 'Mock AI Suggestion'})})]
         
-        result = analyzer.analyze_error(mock_log, mock_parsed_data, test_config)
+        result = analyzer.analyze_error(mock_log, mock_parsed_data, str(tmp_path), test_config)
         
         assert "Mock AI Suggestion" in result
         mock_completion.assert_called_once()
+
+def test_snippet_window_and_cache(tmp_path):
+    source = tmp_path / "module.py"
+    source.write_text("".join(f"line_{i} = {i}\n" for i in range(1, 101)))
+    snippet_cache = analyzer.SnippetCache(max_files=1)
+
+    with patch.object(analyzer, 'snippet_cache', snippet_cache):
+        snippet = analyzer.get_safe_code_snippet(str(source), 50, context_window=2)
+        assert snippet.split("\n") == [
+            "   48: line_48 = 48",
+            "   49: line_49 = 49",
+            ">> 50: line_50 = 50",
+            "   51: line_51 = 51",
+            "   52: line_52 = 52",
+        ]
+        assert analyzer.get_safe_code_snippet(str(source), 1, context_window=1).split("\n") == [
+            ">> 1: line_1 = 1",
+            "   2: line_2 = 2",
+        ]
+        assert snippet_cache.stats()['hits'] == 1
+        assert snippet_cache.stats()['misses'] == 1
+
+        # A modified file gets a fresh index
+        source.write_text("changed\n")
+        os.utime(source, ns=(1, 1))
+        assert analyzer.get_safe_code_snippet(str(source), 1) == ">> 1: changed"
+        assert snippet_cache.stats()['files'] == 1
+
+        assert analyzer.get_safe_code_snippet(str(tmp_path / "missing.py"), 1).startswith("File not found")
+
+def test_snippet_lines_match_the_index_with_unusual_line_breaks(tmp_path):
+    source = tmp_path / "generated.py"
+    source.write_bytes(b"line_1 = 1\r\n\x0c\r\nline_3 = '\x0b'\nline_4 = 4  # a\xe2\x80\xa8b\nline_5 = 5\n")
+
+    with patch.object(analyzer, 'snippet_cache', analyzer.SnippetCache()):
+        assert analyzer.get_safe_code_snippet(str(source), 4, context_window=1).split("\n") == [
+            "   3: line_3 = '\x0b'",
+            ">> 4: line_4 = 4  # a\u2028b",
+            "   5: line_5 = 5",
+        ]
+        assert analyzer.get_safe_code_snippet(str(source), 2, context_window=1).split("\n") == [
+            "   1: line_1 = 1",
+            ">> 2: ",
+            "   3: line_3 = '\x0b'",
+        ]
+
+def _chunk(text):
+    delta = type('delta', (object,), {'content': text})
+    return type('chunk', (object,), {'choices': [type('choice', (object,), {'delta': delta})]})
+
+def test_streaming_collects_chunks_and_falls_back_to_partial_text():
+    import time
+    config = {'ai_analysis': {'enabled': True, 'model': 'openai/stub',
+                              'streaming': {'enabled': True, 'deadline_seconds': 0.3}}}
+
+    def fast_stream(**kwargs):
+        assert kwargs['stream'] is True
+        yield _chunk("Add a ")
+        yield _chunk("None check.")
+
+    def stalled_stream(**kwargs):
+        yield _chunk("Partial ")
+        time.sleep(2)
+        yield _chunk("never arrives")
+
+    with patch('core.analyzer.completion', side_effect=fast_stream):
+        assert analyzer.analyze_error("ERROR boom", None, ".", config) == "Add a None check."
+
+    started = time.monotonic()
+    with patch('core.analyzer.completion', side_effect=stalled_stream):
+        result = analyzer.analyze_error("ERROR boom", None, ".", config)
+    assert time.monotonic() - started < 1.5
+    assert result.startswith("Partial ")
+    assert "cut off" in result
@@ -0,0 +1,74 @@
+import gzip
+from core import backfill
+
+CONFIG = {'monitoring': {'trigger_levels': ['ERROR'], 'segmentation': {'record_start_patterns': [r'\d{4}-\d{2}-\d{2}']}}}
+
+def detect(entry, config):
+    return 'ERROR' in entry, None
+
+def write_log(path, repeats=40):
+    lines = []
+    for i in range(repeats):
+        lines.append(f"2024-01-31 12:00:{i % 60:02d} INFO request {i} ok\n")
+        lines.append(f"2024-01-31 12:00:{i % 60:02d} ERROR request {i} failed\n")
+        lines.append('Traceback (most recent call last):\n')
+        lines.append('  File "app/views.py", line 42, in index\n')
+        lines.append('ZeroDivisionError: division by zero\n')
+    data = "".join(lines).encode()
+    path.write_bytes(data)
+    return data
+
+def test_chunks_never_split_or_duplicate_records(tmp_path):
+    log_file = tmp_path / "app.log"
+    write_log(log_file)
+
+    whole = backfill.scan_task((str(log_file), 0, log_file.stat().st_size), CONFIG, detect)
+    tasks = backfill.plan_tasks([str(log_file)], chunk_size=97)
+    assert len(tasks) > 10
+
+    results = [backfill.scan_task(task, CONFIG, detect) for task in tasks]
+    assert sum(r['entries'] for r in results) == whole['entries'] == 80
+    assert sum(r['triggered'] for r in results) == whole['triggered'] == 40
+    assert sum(r['bytes'] for r in results) == log_file.stat().st_size
+    for result in results:
+        for error in result['errors'].values():
+            assert error['entry'].count('ERROR') == 1
+            assert error['entry'].rstrip().endswith('division by zero')
+
+def test_backfill_dedups_and_reads_archives(tmp_path):
+    plain = tmp_path / "app.log"
+    data = write_log(plain)
+    archive = tmp_path / "app.log.1.gz"
+    with gzip.open(archive, 'wb') as f:
+        f.write(data)
+
+    analyzed = []
+    def analyze(entry, parsed, project_path):
+        analyzed.append(entry)
+        return "fix it"
+
+    summary = backfill.run_backfill(CONFIG, [str(plain), str(archive)], detect, analyze, workers=2, chunk_size=500)
+
+    assert summary['triggered'] == 80
+    assert summary['distinct_errors'] == 1   # numbers and timestamps are normalized away
+    assert len(analyzed) == 1
+    assert summary['errors'][0]['count'] == 80
+    assert summary['errors'][0]['analysis'] == "fix it"
+    assert summary['entries_per_second'] > 0
+
+def test_fallback_segmentation_keeps_the_exception_line_with_its_trace(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(
+        "2024-01-31 12:00:00 INFO started\n"
+        "2024-01-31 12:00:01 ERROR request failed\n"
+        "Traceback (most recent call last):\n"
+        '  File "app/views.py", line 42, in index\n'
+        "ValueError: bad\n"
+        "ERROR worker died\n"
+    )
+    config = {'monitoring': {'trigger_levels': ['ERROR']}}
+    result = backfill.scan_task((str(log_file), 0, log_file.stat().st_size), config, detect)
+    entries = sorted(error['entry'] for error in result['errors'].values())
+    assert result['entries'] == 3
+    assert entries[0].startswith("2024-01-31 12:00:01 ERROR") and entries[0].rstrip().endswith("ValueError: bad")
+    assert entries[1].strip() == "ERROR worker died"
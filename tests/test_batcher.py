@@ -0,0 +1,60 @@
+import json
+from unittest.mock import patch
+from core import batcher
+
+CONFIG = {
+    'ai_analysis': {
+        'enabled': True,
+        'enable_code_context': False,
+        'model': 'openai/stub',
+        'batching': {'enabled': True, 'max_errors': 8},
+    }
+}
+
+def reply(content):
+    message = type('obj', (object,), {'content': content})
+    return type('obj', (object,), {'choices': [type('obj', (object,), {'message': message})], 'usage': None})
+
+def test_parse_batch_response_tolerates_wrapping():
+    text = '<think>E1 looks like...</think>\n```json\n{"E1": "Fix one", "E2": "", "E3": {"cause": "x"}}\n```'
+    analyses = batcher.parse_batch_response(text, ["E1", "E2", "E3", "E4"])
+    assert analyses["E1"] == "Fix one"
+    assert json.loads(analyses["E3"]) == {"cause": "x"}
+    assert "E2" not in analyses and "E4" not in analyses
+
+    assert batcher.parse_batch_response("I can't answer in JSON", ["E1"]) == {}
+    assert batcher.parse_batch_response('["E1"]', ["E1"]) == {}
+
+def test_distinct_errors_share_one_request():
+    items = [
+        ("2024-01-31 12:00:01 ERROR KeyError: 'user'", None, "."),
+        ("2024-01-31 12:00:02 ERROR Connection refused", None, "."),
+        ("2024-01-31 12:00:09 ERROR KeyError: 'user'", None, "."),
+    ]
+    with patch('core.analyzer.completion', return_value=reply('{"E1": "Check the key", "E2": "Start the db"}')) as mock_completion:
+        analyses = batcher.analyze_batch(items, CONFIG)
+
+    assert mock_completion.call_count == 1
+    prompt = mock_completion.call_args.kwargs['messages'][1]['content']
+    assert "### E1" in prompt and "### E2" in prompt and "### E3" not in prompt
+    assert analyses == ["Check the key", "Start the db", "Check the key"]
+
+def test_uncovered_errors_fall_back_to_single_requests():
+    items = [("ERROR disk full", None, "."), ("ERROR out of memory", None, ".")]
+    responses = [reply('{"E1": "Free some space"}'), reply("Add more memory")]
+    with patch('core.analyzer.completion', side_effect=responses) as mock_completion:
+        analyses = batcher.analyze_batch(items, CONFIG)
+    assert mock_completion.call_count == 2
+    assert analyses == ["Free some space", "Add more memory"]
+
+    responses = [reply("not json at all"), reply("single 1"), reply("single 2")]
+    with patch('core.analyzer.completion', side_effect=responses):
+        assert batcher.analyze_batch(items, CONFIG) == ["single 1", "single 2"]
+
+def test_batches_are_split_by_size():
+    config = {'ai_analysis': {**CONFIG['ai_analysis'], 'batching': {'enabled': True, 'max_errors': 2}}}
+    items = [(f"ERROR failure kind {kind}", None, ".") for kind in "abc"]
+    responses = [reply('{"E1": "a", "E2": "b"}'), reply("c")]
+    with patch('core.analyzer.completion', side_effect=responses) as mock_completion:
+        assert batcher.analyze_batch(items, config) == ["a", "b", "c"]
+    assert mock_completion.call_count == 2
@@ -0,0 +1,32 @@
+from core import parser, notifier
+from benchmarks import generator
+from benchmarks.stubs import StubSMTPServer, StubWebhookServer
+
+def test_generated_traces_parse_for_every_language():
+    for lang in generator.LANGUAGES:
+        entry = "\n".join(generator.generate_trace(lang))
+        best_match = parser.parse_entry(entry)['best_match']
+        assert best_match is not None, lang
+        assert best_match['type'] == lang
+
+def test_generate_lines_is_reproducible():
+    first = list(generator.generate_lines(lines=500, error_ratio=0.1, seed=7))
+    second = list(generator.generate_lines(lines=500, error_ratio=0.1, seed=7))
+    assert first == second
+    assert any('| ERROR |' in line for line in first)
+
+def test_stub_servers_receive_alerts():
+    with StubWebhookServer() as webhooks, StubSMTPServer() as smtp:
+        config = {'notifications': {
+            'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack')},
+            'email': {'enabled': True, 'smtp_server': '127.0.0.1', 'smtp_port': smtp.port, 'starttls': False,
+                      'sender_email': 'bench@example.com', 'password': 'stub', 'recipients': ['oncall@example.com']},
+        }}
+        try:
+            assert notifier.send_slack_alert("ERROR boom", "fix", "svc", config) is True
+            assert notifier.send_email_alert("ERROR boom", "fix", "svc", config) is True
+        finally:
+            notifier.close_smtp_connections()
+
+    assert webhooks.requests[0]['path'] == '/slack'
+    assert smtp.requests[0]['to'] == ['oncall@example.com']
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+from core import cache, analyzer
+
+def test_fingerprint_ignores_volatile_parts():
+    first = '2024-01-31 12:00:01,123 ERROR request 8f14e45fceea167a5a36 failed at 0x7f3a2c1b4e10 after 42 ms'
+    second = '2024-02-01T08:30:59.999Z ERROR request 1679091c5a880faf6fb5 failed at 0x10ab after 7 ms'
+    parsed = {'filepath': 'app/db.py', 'lineno': 12, 'type': 'python'}
+
+    assert cache.normalize_entry(first) == cache.normalize_entry(second)
+    assert cache.error_fingerprint(first, parsed) == cache.error_fingerprint(second, parsed)
+
+    other_location = {'filepath': 'app/db.py', 'lineno': 99, 'type': 'python'}
+    assert cache.error_fingerprint(first, parsed) != cache.error_fingerprint(first, other_location)
+
+def test_cache_ttl_lru_and_persistence(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    response_cache = cache.AnalysisCache(db_path, ttl_seconds=60, max_entries=2)
+
+    response_cache.put("a", "fix a")
+    response_cache.put("b", "fix b")
+    assert response_cache.get("a") == "fix a"   # "a" is now most recently used
+    response_cache.put("c", "fix c")             # evicts "b"
+
+    assert response_cache.get("b") is None
+    assert response_cache.stats()['hits'] == 1
+    assert response_cache.stats()['misses'] == 1
+    response_cache.close()
+
+    reopened = cache.AnalysisCache(db_path, ttl_seconds=60, max_entries=2)
+    assert reopened.get("a") == "fix a"
+    assert reopened.get("c") == "fix c"
+
+    with patch('core.cache.time.time', return_value=10**12):
+        assert reopened.get("a") is None
+    reopened.close()
+
+def test_analyze_error_uses_cache(tmp_path):
+    test_config = {
+        'ai_analysis': {
+            'enabled': True,
+            'enable_code_context': False,
+            'model': 'ollama/deepseek-r1:1.5b',
+            'cache': {'enabled': True, 'path': str(tmp_path / "cache.sqlite3")}
+        }
+    }
+
+    with patch('core.analyzer.completion') as mock_completion:
+        mock_completion.return_value.choices = [type('obj', (object,), {'message': type('obj', (object,), {'content': 'Mock AI Suggestion'})})]
+
+        first = analyzer.analyze_error("ERROR timeout after 30s", None, str(tmp_path), test_config)
+        second = analyzer.analyze_error("ERROR timeout after 31s", None, str(tmp_path), test_config)
+
+        assert first == second == 'Mock AI Suggestion'
+        mock_completion.assert_called_once()
@@ -0,0 +1,123 @@
+import os
+from core import monitor
+from core.checkpoint import CheckpointStore
+
+class MockEvent:
+    def __init__(self, src_path):
+        self.src_path = src_path
+
+def make_monitor(log_file, detected, checkpoints):
+    return monitor.LogMonitor(str(log_file), detected.append, buffer_delay=60,
+                              segmentation={'record_start_patterns': ['ERROR|INFO']},
+                              checkpoints=checkpoints)
+
+def test_resume_from_checkpoint_after_restart(tmp_path):
+    log_file = tmp_path / "app.log"
+    store_path = str(tmp_path / "checkpoints.json")
+    log_file.write_text("INFO booted\n")
+    detected = []
+
+    store = CheckpointStore(store_path)
+    first = make_monitor(log_file, detected, store)
+    with open(log_file, "a") as f:
+        f.write("ERROR one\nINFO pending record\n")
+    first.on_modified(MockEvent(str(log_file)))
+    assert detected == ["ERROR one\n"]
+    assert store.flush()
+    first.tailer.close()
+
+    # Written while the analyzer was down
+    with open(log_file, "a") as f:
+        f.write("ERROR two\n")
+
+    detected.clear()
+    second = make_monitor(log_file, detected, CheckpointStore(store_path))
+    second.on_modified(MockEvent(str(log_file)))
+    # The record that was still pending at shutdown is re-read, then the new one follows
+    assert detected == ["INFO pending record\n"]
+    second._flush_buffer()
+    assert detected == ["INFO pending record\n", "ERROR two\n"]
+    second.tailer.close()
+
+def test_checkpoint_of_replaced_file_restarts_from_zero(tmp_path):
+    log_file = tmp_path / "app.log"
+    store_path = str(tmp_path / "checkpoints.json")
+    log_file.write_text("INFO old contents that will be rotated away\n")
+
+    store = CheckpointStore(store_path)
+    make_monitor(log_file, [], store).tailer.close()
+    store.flush()
+
+    log_file.write_text("ERROR new file\n")
+    detected = []
+    restarted = make_monitor(log_file, detected, CheckpointStore(store_path))
+    restarted._flush_buffer()
+    restarted.process_new_lines()
+    restarted._flush_buffer()
+    assert detected == ["ERROR new file\n"]
+    restarted.tailer.close()
+
+def test_copytruncate_is_detected(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("INFO " + "x" * 100 + "\n")
+    detected = []
+    event_handler = make_monitor(log_file, detected, None)
+
+    # copytruncate: same inode, size drops to zero, then new writes
+    with open(log_file, "w") as f:
+        f.write("ERROR after truncate\n")
+    event_handler.on_modified(MockEvent(str(log_file)))
+    event_handler._flush_buffer()
+
+    assert detected == ["ERROR after truncate\n"]
+    event_handler.tailer.close()
+
+def test_move_then_create_drains_old_file(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("")
+    detected = []
+    event_handler = make_monitor(log_file, detected, None)
+
+    with open(log_file, "a") as f:
+        f.write("ERROR last words of the old file\nunterminated tail")
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text("INFO fresh file\n")
+
+    event_handler.on_created(MockEvent(str(log_file)))
+    event_handler._flush_buffer()
+
+    assert detected == ["ERROR last words of the old file\nunterminated tail\n", "INFO fresh file\n"]
+    event_handler.tailer.close()
+
+def test_store_only_writes_when_dirty(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.json"))
+    assert not store.flush()
+    store.update("/var/log/app.log", 1, 2, 100, "abc", 10)
+    assert store.flush()
+    assert not store.flush()
+    assert CheckpointStore(str(tmp_path / "checkpoints.json")).get("/var/log/app.log")['offset'] == 100
+
+def test_checkpoint_of_file_opened_empty_does_not_match_a_replacement(tmp_path):
+    log_file = tmp_path / "app.log"
+    store_path = str(tmp_path / "checkpoints.json")
+    log_file.write_text("")
+
+    store = CheckpointStore(store_path)
+    first = make_monitor(log_file, [], store)
+    with open(log_file, "a") as f:
+        f.write("INFO line 1\nINFO line 2\nINFO line 3\n")
+    first.on_modified(MockEvent(str(log_file)))
+    first._flush_buffer()
+    assert store.get(str(log_file))['head_length'] > 0
+    store.flush()
+    first.tailer.close()
+
+    replacement = tmp_path / "replacement.log"
+    replacement.write_text("ERROR first line of the new file\n" + "INFO x\n" * 10)
+    os.replace(replacement, log_file)
+    detected = []
+    restarted = make_monitor(log_file, detected, CheckpointStore(store_path))
+    restarted.process_new_lines()
+    restarted._flush_buffer()
+    assert detected[0] == "ERROR first line of the new file\n"
+    restarted.tailer.close()
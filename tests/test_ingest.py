@@ -0,0 +1,142 @@
+import gzip
+import threading
+import time
+import socket
+import http.client
+from core import ingest
+
+def test_parse_syslog_formats():
+    message = ingest.parse_syslog(
+        b'<11>1 2024-05-01T10:00:00Z web-1 api 4242 ID47 [meta x="a ] b"][origin ip="10.0.0.1"] \xef\xbb\xbfERROR boom')
+    assert message == ingest.SyslogMessage(11, b'web-1', b'api', b'4242', b'ERROR boom')
+    assert ingest.parse_syslog(b'<14>1 - - - - - - plain').message == b'plain'
+
+    bsd = ingest.parse_syslog(b'<27>Oct 11 22:14:15 db-2 postgres[77]: FATAL: no space left')
+    assert bsd == ingest.SyslogMessage(27, b'db-2', b'postgres', b'77', b'FATAL: no space left')
+    assert ingest.parse_syslog(b'  File "app.py", line 3, in f') is None
+
+def _server(received, **kwargs):
+    monitoring_config = {
+        'trigger_levels': ['ERROR'],
+        'segmentation': {'record_start_patterns': [r'\d{4}-\d\d-\d\d ']},
+    }
+    services = [
+        ingest.NetworkService({'name': 'api', 'source': 'network', 'project_path': '/srv/api',
+                               'match': {'app_name': 'api*'}}, monitoring_config),
+        ingest.NetworkService({'name': 'rest', 'source': 'network'}, monitoring_config),
+    ]
+    return ingest.IngestServer(services, lambda *item: received.append(item), buffer_delay=0.05,
+                               udp_port=0, tcp_port=0, http_port=0, **kwargs).start()
+
+def _wait(received, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(received) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return received
+
+def test_syslog_over_tcp_keeps_multi_line_traces_together():
+    received = []
+    server = _server(received)
+    try:
+        with socket.create_connection(server.addresses['tcp']) as connection:
+            connection.sendall(
+                b'<11>1 - web-1 api-gw 1 - - 2024-05-01 10:00:00 ERROR Traceback (most recent call last):\n'
+                b'  File "app/views.py", line 7, in index\n'
+                b"AttributeError: 'NoneType' object has no attribute 'name'\n"
+                b'<14>1 - web-1 api-gw 1 - - 2024-05-01 10:00:01 INFO all good\n'
+                b'<11>1 - web-2 worker 9 - - 2024-05-01 10:00:02 ERROR worker died\n'
+            )
+        _wait(received, 2)
+    finally:
+        server.stop()
+
+    by_service = {service_name: (entry, project_path) for entry, service_name, project_path in received}
+    assert len(received) == 2
+    entry, project_path = by_service['api']
+    assert project_path == '/srv/api'
+    assert entry.splitlines() == [
+        '2024-05-01 10:00:00 ERROR Traceback (most recent call last):',
+        '  File "app/views.py", line 7, in index',
+        "AttributeError: 'NoneType' object has no attribute 'name'",
+    ]
+    assert by_service['rest'][0].strip() == '2024-05-01 10:00:02 ERROR worker died'
+
+def test_syslog_octet_counting_and_udp():
+    received = []
+    server = _server(received)
+    try:
+        frames = [b'<11>1 - host api 1 - - ERROR first', b'<11>1 - host api 1 - - ERROR second']
+        with socket.create_connection(server.addresses['tcp']) as connection:
+            connection.sendall(b''.join(b'%d %s' % (len(frame), frame) for frame in frames))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+            udp.sendto(b'<11>1 - host other 2 - - ERROR over udp', server.addresses['udp'])
+        _wait(received, 2)
+    finally:
+        server.stop()
+    entries = sorted(entry.strip() for entry, _, _ in received)
+    # Without a record start pattern match the two TCP messages share one quiet-period entry
+    assert entries == ['ERROR first\nERROR second', 'ERROR over udp']
+
+def test_http_batches():
+    received = []
+    server = _server(received, token='secret')
+    try:
+        connection = http.client.HTTPConnection(*server.addresses['http'])
+        connection.request('POST', '/ingest/api', body=b'ERROR nope\n')
+        response = connection.getresponse()
+        assert response.status == 401
+        response.read()
+
+        headers = {'Authorization': 'Bearer secret', 'Content-Encoding': 'gzip'}
+        body = gzip.compress(b'2024-05-01 10:00:00 ERROR one\n  at frame\n2024-05-01 10:00:01 INFO fine\n'
+                             b'2024-05-01 10:00:02 ERROR two\n')
+        connection.request('POST', '/ingest/api', body=body, headers=headers)
+        response = connection.getresponse()
+        assert response.status == 202
+        assert b'"lines": 4' in response.read()
+
+        connection.request('POST', '/ingest?app_name=nightly', body=b'ERROR routed by tag\n',
+                           headers={'Authorization': 'Bearer secret'})
+        response = connection.getresponse()
+        assert response.status == 202
+        response.read()
+        connection.close()
+    finally:
+        server.stop()
+
+    # Batches are flushed as soon as they are received
+    assert [(entry.strip(), service_name) for entry, service_name, _ in received] == [
+        ('2024-05-01 10:00:00 ERROR one\n  at frame', 'api'),
+        ('2024-05-01 10:00:02 ERROR two', 'api'),
+        ('ERROR routed by tag', 'rest'),
+    ]
+
+def test_a_slow_pipeline_never_blocks_the_listeners():
+    received = []
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_append(item):
+        entered.set()
+        release.wait(5)
+        received.append(item)
+
+    server = _server(received, handoff_queue_size=1)
+    server.callback = lambda *item: slow_append(item)
+    try:
+        connection = http.client.HTTPConnection(*server.addresses['http'], timeout=2)
+        statuses = []
+        for i in range(3):
+            connection.request('POST', '/ingest/api', body=f'ERROR batch {i}\n'.encode())
+            response = connection.getresponse()
+            response.read()
+            statuses.append(response.status)
+            if i == 0:
+                assert entered.wait(2)
+        connection.close()
+        # The first batch is in the callback, the second waits in the queue, the third is refused
+        assert statuses == [202, 202, 503]
+    finally:
+        release.set()
+        server.stop()
+
+    assert [entry.strip() for entry, _, _ in received] == ['ERROR batch 0', 'ERROR batch 1']
@@ -0,0 +1,47 @@
+import json
+from core import jsonl, parser, triggers
+
+TRACE = 'Traceback (most recent call last):\n  File "app/views.py", line 7, in index\n    user.name\nAttributeError: boom'
+
+def line(**record):
+    return (json.dumps(record) + "\n").encode('utf-8')
+
+def test_records_become_text_entries_with_real_stack_lines():
+    decoder = jsonl.JsonLineDecoder(levels=['ERROR'])
+    entry = decoder.convert(line(timestamp="2024-01-31T12:00:00Z", level="error", message="request failed", exc_info=TRACE))
+    assert entry == f"2024-01-31T12:00:00Z ERROR request failed\n{TRACE}\n"
+    assert parser.parse_entry(entry)['best_match'] == {'filepath': 'app/views.py', 'lineno': 7, 'type': 'python'}
+
+def test_level_field_decides_not_the_message():
+    decoder = jsonl.JsonLineDecoder(levels=['ERROR'])
+    assert decoder.convert(line(level="info", message="0 errors found")) is None
+    assert decoder.convert(line(level="warn", msg="retrying", stack=["at a (/app/x.js:1:2)", "at b (/app/y.js:3:4)"])) == \
+        "WARN retrying\nat a (/app/x.js:1:2)\nat b (/app/y.js:3:4)\n"
+    # pino numeric levels and nested fields
+    assert decoder.convert(line(level=50, msg="db down", err={'stack': "Error: db down\n    at q (/app/db.js:9:1)"})) == \
+        "ERROR db down\nError: db down\n    at q (/app/db.js:9:1)\n"
+    assert decoder.convert(line(level=30, msg="ok")) is None
+
+def test_nested_level_field_does_not_hide_the_real_level():
+    decoder = jsonl.JsonLineDecoder(levels=['ERROR'])
+    raw = b'{"req":{"level":"info"},"level":"error","message":"db down"}\n'
+    assert decoder.prefilter(raw)
+    assert decoder.convert(raw) == "ERROR db down\n"
+    assert decoder.convert(b'{"req":{"level":"info"},"level":"debug","message":"ok"}\n') is None
+
+def test_non_trigger_lines_are_not_decoded(monkeypatch):
+    decoder = jsonl.JsonLineDecoder(levels=['ERROR'])
+    decoded = []
+    monkeypatch.setattr(jsonl, '_loads', lambda data: decoded.append(data) or json.loads(data))
+    assert decoder.convert(line(level="DEBUG", message="x" * 1000, exc_info=None)) is None
+    assert decoded == []
+    decoder.convert(line(level="ERROR", message="boom"))
+    assert len(decoded) == 1
+
+def test_plain_text_lines_pass_through_and_deny_patterns_apply():
+    matcher = triggers.TriggerMatcher(['ERROR'], deny_patterns=['healthcheck'])
+    decoder = jsonl.from_config({'trigger_levels': ['ERROR']}, {'format': 'jsonl', 'json': {'message_fields': 'text'}}, matcher)
+    assert decoder.convert(b"ERROR not json at all\n") == "ERROR not json at all\n"
+    assert decoder.convert(line(level="ERROR", text="healthcheck failed")) is None
+    assert decoder.convert(line(level="ERROR", text="disk full")) == "ERROR disk full\n"
+    assert jsonl.from_config({}, {'name': 'plain'}) is None
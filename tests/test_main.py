@@ -0,0 +1,29 @@
+from unittest.mock import patch
+import main
+from core import cache
+
+def test_detection_uses_the_services_own_trigger_levels():
+    config = {'monitoring': {'trigger_levels': ['ERROR'], 'services': [
+        {'name': 'db', 'trigger_levels': ['CRITICAL']},
+        {'name': 'web', 'trigger_levels': ['ERROR', 'WARNING']},
+        {'name': 'api'},
+    ]}}
+    assert not main.detect_error("WARNING slow query", config, 'db')[0]
+    assert main.detect_error("CRITICAL disk full", config, 'db')[0]
+    assert main.detect_error("WARNING slow request", config, 'web')[0]
+    assert not main.detect_error("WARNING slow request", config, 'api')[0]
+    assert main.detect_error("ERROR boom", config, 'api')[0]
+
+def test_no_provisional_alert_when_the_analysis_is_cached(tmp_path):
+    config = {'ai_analysis': {'enabled': True, 'cache': {'enabled': True, 'path': str(tmp_path / "cache.sqlite3")}}}
+    parsed = {'filepath': 'app/db.py', 'lineno': 12, 'type': 'python'}
+    response_cache = cache.get_cache(config)
+
+    with patch.object(main.notifier, 'get_dispatcher') as get_dispatcher:
+        main.announce_unless_cached("ERROR db down", parsed, 'db', config)
+        assert get_dispatcher.return_value.dispatch_provisional.call_count == 1
+
+        response_cache.put(cache.error_fingerprint("ERROR db down", parsed), "restart the db")
+        main.announce_unless_cached("ERROR db down", parsed, 'db', config)
+        assert get_dispatcher.return_value.dispatch_provisional.call_count == 1
+    assert response_cache.stats()['hits'] == 0
@@ -0,0 +1,60 @@
+import urllib.request
+import urllib.error
+
+import pytest
+
+from core import metrics
+
+def test_counter_and_gauge_render():
+    registry = metrics.Registry()
+    counter = metrics.Counter('test_events_total', 'Events.', ['service'], registry=registry)
+    gauge = metrics.Gauge('test_depth', 'Depth.', registry=registry)
+    counter.labels('web').inc()
+    counter.labels('web').inc(2)
+    counter.labels('db "primary"').inc()
+    gauge.set_function(lambda: 7)
+
+    text = registry.render()
+    assert '# TYPE test_events_total counter' in text
+    assert 'test_events_total{service="web"} 3' in text
+    assert 'test_events_total{service="db \\"primary\\""} 1' in text
+    assert 'test_depth 7' in text
+
+def test_histogram_buckets_are_cumulative():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram('test_seconds', 'Latency.', buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+
+    text = registry.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert 'test_seconds_count 4' in text
+    assert 'test_seconds_sum 6.05' in text
+
+def test_wrong_label_count_is_rejected():
+    registry = metrics.Registry()
+    counter = metrics.Counter('test_labelled_total', 'Events.', ['service'], registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels('a', 'b')
+
+def test_metrics_endpoint_serves_registry():
+    metrics.BYTES_READ.labels('endpoint-test').inc(42)
+    server = metrics.start_server(port=0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode('utf-8')
+            assert response.headers['Content-Type'].startswith('text/plain')
+        assert 'log_analyzer_bytes_read_total{service="endpoint-test"} 42' in body
+        assert 'log_analyzer_threads ' in body
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_from_config_disabled_by_default():
+    assert metrics.from_config({}) is None
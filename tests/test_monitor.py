@@ -52,3 +52,169 @@ def test_monitoring(tmp_path):
     time.sleep(0.5)
 
     assert "Manual Trigger Line" in detected_lines
+
+def test_monitor_max_flush_latency(tmp_path):
+    log_file = tmp_path / "busy.log"
+    log_file.write_text("")
+    detected = []
+
+    class MockEvent:
+        src_path = str(log_file)
+
+    # The file never goes quiet for buffer_delay, but max_flush_latency still forces a flush
+    event_handler = monitor.LogMonitor(str(log_file), detected.append, buffer_delay=0.5,
+                                       segmentation={'max_flush_latency': 0.3})
+    for i in range(8):
+        with open(log_file, "a") as f:
+            f.write(f"line {i}\n")
+        event_handler.on_modified(MockEvent())
+        time.sleep(0.1)
+
+    assert detected, "max_flush_latency should flush a continuously written log"
+    assert detected[0].startswith("line 0\n")
+
+def test_monitor_emits_records_on_boundaries(tmp_path):
+    log_file = tmp_path / "records.log"
+    log_file.write_text("")
+    detected = []
+
+    class MockEvent:
+        src_path = str(log_file)
+
+    event_handler = monitor.LogMonitor(str(log_file), detected.append, buffer_delay=5,
+                                       segmentation={'record_start_patterns': [r'\d{4}-\d{2}-\d{2}']})
+    with open(log_file, "a") as f:
+        f.write("2024-01-31 ERROR boom\n  File \"app.py\", line 1, in <module>\n2024-01-31 INFO ok\n")
+    event_handler.on_modified(MockEvent())
+
+    assert detected == ["2024-01-31 ERROR boom\n  File \"app.py\", line 1, in <module>\n"]
+
+def test_monitor_counts_bytes_lines_and_entries(tmp_path):
+    from core import metrics
+    log_file = tmp_path / "counted.log"
+    log_file.write_text("")
+
+    class MockEvent:
+        src_path = str(log_file)
+
+    event_handler = monitor.LogMonitor(str(log_file), lambda entry: None, buffer_delay=5, service_name="counted",
+                                       segmentation={'record_start_patterns': [r'\d{4}-\d{2}-\d{2}']})
+    data = "2024-01-31 ERROR boom\n  at x\n2024-01-31 INFO ok\n"
+    with open(log_file, "a") as f:
+        f.write(data)
+    event_handler.on_modified(MockEvent())
+
+    assert metrics.BYTES_READ.labels("counted").value == len(data)
+    assert metrics.LINES_READ.labels("counted").value == 3
+    assert metrics.ENTRIES_FLUSHED.labels("counted").value == 1
+    assert metrics.ENTRY_SIZE.labels("counted").count == 1
+
+def test_monitor_drops_entries_without_triggers(tmp_path):
+    from core import triggers
+    log_file = tmp_path / "filtered.log"
+    log_file.write_text("")
+    detected = []
+
+    class MockEvent:
+        src_path = str(log_file)
+
+    event_handler = monitor.LogMonitor(str(log_file), detected.append, buffer_delay=5,
+                                       segmentation={'record_start_patterns': [r'\d{4}-\d{2}-\d{2}']},
+                                       matcher=triggers.TriggerMatcher(['ERROR']))
+    with open(log_file, "a") as f:
+        f.write("2024-01-31 INFO ok\n2024-01-31 ERROR boom\n  at x\n2024-01-31 INFO ok\n")
+    event_handler.on_modified(MockEvent())
+    event_handler._flush_buffer()
+
+    assert detected == ["2024-01-31 ERROR boom\n  at x\n"]
+
+class FileEvent:
+    is_directory = False
+
+    def __init__(self, path):
+        self.src_path = str(path)
+
+def test_glob_services_share_a_bounded_handle_pool(tmp_path):
+    logs = tmp_path / "workers"
+    logs.mkdir()
+    for i in range(3):
+        (logs / f"worker-{i}.log").write_text("old line\n")
+    (logs / "ignored.txt").write_text("")
+    detected = []
+    config = {'monitoring': {
+        'max_open_files': 2,
+        'poll_interval': 5,
+        'services': [{'name': 'workers', 'log_file': str(logs / "*.log")}],
+    }}
+
+    dispatcher = monitor.create_dispatcher(config, lambda entry, service, path: detected.append((service, entry)))
+    assert len(dispatcher) == 3
+    assert dispatcher.directories() == [str(logs)]
+
+    # A file created later is discovered and read from its start
+    new_file = logs / "worker-3.log"
+    new_file.write_text("")
+    dispatcher.on_created(FileEvent(new_file))
+    dispatcher.on_created(FileEvent(logs / "ignored.txt"))
+    assert len(dispatcher) == 4
+
+    for round_number in range(2):
+        for i in range(4):
+            path = logs / f"worker-{i}.log"
+            with open(path, "a") as f:
+                f.write(f"line {round_number} from {i}\n")
+            dispatcher.on_modified(FileEvent(path))
+            dispatcher.get(str(path))._flush_buffer()
+
+    assert sorted(entry for _, entry in detected) == sorted(
+        f"line {r} from {i}\n" for r in range(2) for i in range(4))
+    pool = dispatcher.get(str(new_file)).handle_pool
+    assert len(pool) <= 2
+    assert sum(m.file_handle is not None for m in map(dispatcher.get, map(str, logs.glob("*.log")))) <= 2
+
+    new_file.unlink()
+    dispatcher.on_deleted(FileEvent(new_file))
+    assert len(dispatcher) == 3
+
+def test_suspended_monitor_resumes_at_its_offset(tmp_path):
+    from core.tailer import HandlePool
+    log_file = tmp_path / "idle.log"
+    log_file.write_text("")
+    detected = []
+    pool = HandlePool(max_open=1)
+    first = monitor.LogMonitor(str(log_file), detected.append, buffer_delay=5, handle_pool=pool)
+    other = tmp_path / "other.log"
+    other.write_text("")
+    monitor.LogMonitor(str(other), lambda entry: None, buffer_delay=5, handle_pool=pool)
+    assert first.file_handle is None
+
+    with open(log_file, "a") as f:
+        f.write("written while closed\n")
+    first.on_modified(FileEvent(log_file))
+    first._flush_buffer()
+    assert detected == ["written while closed\n"]
+
+    # Replaced while suspended: the new file is read from the start
+    first.suspend()
+    log_file.unlink()
+    log_file.write_text("fresh file\n")
+    first.on_modified(FileEvent(log_file))
+    first._flush_buffer()
+    assert detected[-1] == "fresh file\n"
+
+def test_jsonl_service_emits_each_triggering_line(tmp_path):
+    import json
+    from core import jsonl, triggers
+    log_file = tmp_path / "app.jsonl"
+    log_file.write_text("")
+    detected = []
+    matcher = triggers.TriggerMatcher(['ERROR'])
+    event_handler = monitor.LogMonitor(str(log_file), detected.append, buffer_delay=5,
+                                       decoder=jsonl.JsonLineDecoder(levels=matcher.levels, matcher=matcher))
+    with open(log_file, "a") as f:
+        f.write(json.dumps({"level": "INFO", "message": "ok"}) + "\n")
+        f.write(json.dumps({"level": "ERROR", "message": "boom", "stack": "  File \"a.py\", line 1, in f"}) + "\n")
+    event_handler.on_modified(FileEvent(log_file))
+
+    # No quiet period needed: a JSON line is a complete record
+    assert detected == ['ERROR boom\n  File "a.py", line 1, in f\n']
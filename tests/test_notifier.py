@@ -1,4 +1,8 @@
 import os
+import json
+import time
+import email
+import email.header
 from unittest.mock import patch, MagicMock
 from core import notifier
 
@@ -12,14 +16,16 @@ def test_slack_alert():
         }
     }
     
-    with patch('requests.post') as mock_post:
+    with patch('core.notifier._get_session') as mock_get_session:
+        mock_post = mock_get_session.return_value.post
         mock_post.return_value.status_code = 200
         
-        notifier.send_slack_alert("Error: Test", "Fix: Test", test_config)
+        assert notifier.send_slack_alert("Error: Test", "Fix: Test", "web_server", test_config)
         
         mock_post.assert_called_once()
         args, kwargs = mock_post.call_args
         assert kwargs['data'] is not None
+        assert kwargs['timeout'] == notifier.DEFAULT_TIMEOUT
 
 def test_email_alert():
     test_config = {
@@ -38,9 +44,272 @@ def test_email_alert():
     with patch('smtplib.SMTP') as mock_smtp:
         instance = mock_smtp.return_value
         
-        notifier.send_email_alert("Error: Test", "Fix: Test", test_config)
+        notifier.send_email_alert("Error: Test", "Fix: Test", "web_server", test_config)
         
-        mock_smtp.assert_called_with('smtp.test.com', 587)
+        mock_smtp.assert_called_with('smtp.test.com', 587, timeout=notifier.DEFAULT_TIMEOUT)
         instance.starttls.assert_called_once()
         instance.login.assert_called_with('sender@test.com', 'password')
         instance.sendmail.assert_called_once()
+
+def test_sessions_are_pooled_per_host():
+    first = notifier._get_session('https://hooks.slack.com/services/A')
+    second = notifier._get_session('https://hooks.slack.com/services/B')
+    other = notifier._get_session('https://discord.com/api/webhooks/1/x')
+
+    assert first is second
+    assert first is not other
+
+def test_dispatcher_isolates_slow_channels():
+    test_config = {
+        'notifications': {
+            'slack': {'enabled': True},
+            'email': {'enabled': True},
+            'discord': {'enabled': False},
+        }
+    }
+    delivered = []
+
+    def slow_email(log_entry, ai_analysis, service_name, config):
+        time.sleep(0.3)
+        delivered.append('email')
+        return True
+
+    def fast_slack(log_entry, ai_analysis, service_name, config):
+        delivered.append('slack')
+        return True
+
+    dispatcher = notifier.NotificationDispatcher(test_config, channels={'slack': fast_slack, 'email': slow_email, 'discord': MagicMock()})
+
+    start = time.monotonic()
+    dispatcher.dispatch("Error: Test", "Fix: Test", "web_server")
+    assert time.monotonic() - start < 0.1
+
+    dispatcher.join()
+    assert delivered == ['slack', 'email']
+
+    stats = dispatcher.stats()
+    assert 'discord' not in stats
+    assert stats['email']['sent'] == 1
+    assert stats['email']['last_latency'] >= 0.3
+    dispatcher.close()
+
+def test_dispatcher_drops_when_queue_is_full():
+    test_config = {'notifications': {'slack': {'enabled': True}}}
+    release = MagicMock()
+
+    def blocked_slack(log_entry, ai_analysis, service_name, config):
+        while not release.called:
+            time.sleep(0.01)
+        return True
+
+    dispatcher = notifier.NotificationDispatcher(test_config, channels={'slack': blocked_slack}, queue_size=1)
+    for _ in range(5):
+        dispatcher.dispatch("Error: Test", "Fix: Test", "web_server")
+
+    assert dispatcher.stats()['slack']['dropped'] >= 3
+    release()
+    dispatcher.close()
+
+def test_email_connection_is_reused_and_reconnects():
+    test_config = {
+        'notifications': {
+            'email': {
+                'enabled': True,
+                'smtp_server': 'smtp.reuse.com',
+                'smtp_port': 587,
+                'sender_email': 'sender@test.com',
+                'password': 'password',
+                'recipients': ['receiver@test.com']
+            }
+        }
+    }
+    notifier.close_smtp_connections()
+
+    with patch('smtplib.SMTP') as mock_smtp:
+        instance = mock_smtp.return_value
+        for _ in range(3):
+            assert notifier.send_email_alert("ERROR: Test", "Fix: Test", "web_server", test_config)
+
+        assert mock_smtp.call_count == 1
+        assert instance.login.call_count == 1
+        assert instance.sendmail.call_count == 3
+
+        instance.sendmail.side_effect = [notifier.smtplib.SMTPServerDisconnected("idle timeout"), None]
+        assert notifier.send_email_alert("ERROR: Test", "Fix: Test", "web_server", test_config)
+        assert mock_smtp.call_count == 2
+        assert instance.login.call_count == 2
+
+        instance.sendmail.side_effect = [notifier.smtplib.SMTPResponseException(421, b"try again later"), None]
+        assert notifier.send_email_alert("ERROR: Test", "Fix: Test", "web_server", test_config)
+        assert mock_smtp.call_count == 3
+
+        # A rejected message is not resent over a new session
+        instance.sendmail.side_effect = notifier.smtplib.SMTPDataError(554, b"message rejected")
+        assert not notifier.send_email_alert("ERROR: Test", "Fix: Test", "web_server", test_config)
+        assert mock_smtp.call_count == 3
+        assert instance.login.call_count == 3
+
+    notifier.close_smtp_connections()
+
+def test_email_digest_batches_alerts_per_service():
+    email_config = {
+        'enabled': True,
+        'smtp_server': 'smtp.digest.com',
+        'smtp_port': 587,
+        'sender_email': 'sender@test.com',
+        'password': 'password',
+        'recipients': ['receiver@test.com'],
+        'digest': {'enabled': True, 'window_seconds': 60}
+    }
+    test_config = {'notifications': {'email': email_config}}
+    notifier.close_smtp_connections()
+
+    with patch('smtplib.SMTP') as mock_smtp:
+        instance = mock_smtp.return_value
+        for i in range(3):
+            notifier.send_email_alert(f"ERROR: failure {i}", "Fix: Test", "web_server", test_config)
+        notifier.send_email_alert("ERROR: other", "Fix: Test", "database", test_config)
+        instance.sendmail.assert_not_called()
+
+        notifier.email_digest.flush_all()
+
+        assert instance.sendmail.call_count == 2
+        subjects = []
+        for call in instance.sendmail.call_args_list:
+            message = email.message_from_string(call.args[2])
+            subjects.append(str(email.header.make_header(email.header.decode_header(message['Subject']))))
+        assert "🚨 3 Log Errors Detected in web_server" in subjects
+
+    notifier.close_smtp_connections()
+
+def test_notify_on_filters_channels():
+    assert notifier.should_notify({'notify_on': ['CRITICAL']}, "2024 critical: disk full")
+    assert not notifier.should_notify({'notify_on': ['CRITICAL']}, "ERROR: timeout")
+    assert notifier.should_notify({}, "anything")
+
+def test_provisional_alerts_are_updated_or_followed_up():
+    from benchmarks.stubs import StubWebhookServer
+    with StubWebhookServer() as webhooks:
+        config = {'notifications': {
+            'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack')},
+            'discord': {'enabled': True, 'webhook_url': webhooks.url_for('/discord/123/token')},
+        }}
+        dispatcher = notifier.NotificationDispatcher(config)
+        parsed = {'filepath': 'app/views.py', 'lineno': 42}
+        dispatcher.dispatch_provisional("ERROR boom", parsed, "web")
+        dispatcher.dispatch("ERROR boom", "Add a None check.", "web")
+        dispatcher.close()
+
+    requests_by_path = [(r['method'], r['path']) for r in webhooks.requests]
+    assert requests_by_path.count(('POST', '/slack')) == 2
+    assert ('POST', '/discord/123/token?wait=true') in requests_by_path
+    discord_edits = [r for r in webhooks.requests if r['method'] == 'PATCH']
+    assert len(discord_edits) == 1
+    assert discord_edits[0]['path'].startswith('/discord/123/token/messages/')
+    fields = discord_edits[0]['body']['embeds'][0]['fields']
+    assert fields[0]['value'] == '`app/views.py:42`'
+    assert fields[-1]['value'] == "Add a None check."
+
+def test_rate_limited_webhook_alert_is_retried():
+    from benchmarks.stubs import StubWebhookServer
+    with StubWebhookServer(responses=[(429, {'Retry-After': '0.2'})]) as webhooks:
+        config = {'notifications': {'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack'),
+                                              'retry': {'base_delay': 0.05}}}}
+        dispatcher = notifier.NotificationDispatcher(config)
+        start = time.monotonic()
+        dispatcher.dispatch("ERROR boom", "Add a None check.", "web")
+        dispatcher.close()
+        elapsed = time.monotonic() - start
+
+    assert len(webhooks.requests) == 2
+    assert elapsed >= 0.2
+    stats = dispatcher.stats()['slack']
+    assert (stats['sent'], stats['retried'], stats['failed']) == (1, 1, 0)
+
+def test_long_retry_after_does_not_hold_up_shutdown():
+    from benchmarks.stubs import StubWebhookServer
+    with StubWebhookServer(responses=[(429, {'Retry-After': '3600'})]) as webhooks:
+        config = {'notifications': {'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack'),
+                                              'coalesce': False}}}
+        dispatcher = notifier.NotificationDispatcher(config)
+        dispatcher.dispatch("ERROR one", "Fix one", "web")
+        dispatcher.dispatch("ERROR two", "Fix two", "web")
+        time.sleep(0.2)
+        start = time.monotonic()
+        dispatcher.close()
+        elapsed = time.monotonic() - start
+
+    # The second alert waits for the limiter on the retry heap, so close() gives both up at once
+    assert elapsed < 1
+    assert len(webhooks.requests) == 1
+    assert dispatcher.stats()['slack']['failed'] == 2
+
+def test_alerts_are_merged_while_the_webhook_is_rate_limited():
+    from benchmarks.stubs import StubWebhookServer
+    with StubWebhookServer() as webhooks:
+        config = {'notifications': {'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack'),
+                                              'rate_limit': {'rate': 4, 'burst': 1}}}}
+        dispatcher = notifier.NotificationDispatcher(config)
+        for i in range(4):
+            dispatcher.dispatch(f"ERROR boom {i % 2}\n  at frame", f"Fix {i}", "web")
+        dispatcher.dispatch("ERROR other", "Fix other", "db")
+        dispatcher.close()
+
+    texts = [request['body']['blocks'][1]['text']['text'] for request in webhooks.requests]
+    assert len(texts) == 3
+    assert "ERROR boom 0" in texts[0]
+    assert "3 alerts for web, merged while rate limited" in texts[1]
+    assert "ERROR boom 1 (x2)" in texts[1] and "2. ERROR boom 0" in texts[1]
+    assert "ERROR other" in texts[2]
+    assert dispatcher.stats()['slack']['coalesced'] == 2
+
+def test_dispatch_reports_when_every_channel_is_done():
+    test_config = {'notifications': {'slack': {'enabled': True}, 'discord': {'enabled': True}}}
+    outcomes = []
+    discord_ok = [True]
+    channels = {'slack': lambda *args: True, 'discord': lambda *args: discord_ok[0]}
+    dispatcher = notifier.NotificationDispatcher(test_config, channels=channels, provisional={}, updaters={})
+
+    dispatcher.dispatch("Error: Test", "Fix: Test", "web_server", on_done=outcomes.append)
+    dispatcher.join()
+    discord_ok[0] = False
+    dispatcher.dispatch("Error: Test", "Fix: Test", "web_server", on_done=outcomes.append)
+    dispatcher.join()
+    dispatcher.close()
+    assert outcomes == [True, False]
+
+def test_alerts_with_a_queued_provisional_are_not_merged():
+    from benchmarks.stubs import StubWebhookServer
+    with StubWebhookServer() as webhooks:
+        config = {'notifications': {'slack': {'enabled': True, 'webhook_url': webhooks.url_for('/slack'),
+                                              'rate_limit': {'rate': 4, 'burst': 1}}}}
+        dispatcher = notifier.NotificationDispatcher(config)
+        dispatcher.dispatch("ERROR a", "Fix a", "web")
+        dispatcher.dispatch("ERROR b", "Fix b", "web")
+        dispatcher.dispatch_provisional("ERROR c", {'filepath': 'app.py', 'lineno': 3}, "web")
+        dispatcher.dispatch("ERROR c", "Fix c", "web")
+        dispatcher.close()
+
+    bodies = [json.dumps(request['body']) for request in webhooks.requests]
+    # The provisional for c is answered by its own full alert instead of vanishing into a summary
+    assert len(bodies) == 4
+    assert "analysis in progress" in bodies[2] and "ERROR c" in bodies[2]
+    assert "Fix c" in bodies[3] and "merged" not in bodies[3]
+
+def test_digested_email_is_done_when_the_digest_is_sent():
+    email_config = {'enabled': True, 'smtp_server': 'smtp.digest.com', 'smtp_port': 587,
+                    'sender_email': 'sender@test.com', 'password': 'password',
+                    'recipients': ['receiver@test.com'], 'digest': {'enabled': True, 'window_seconds': 60}}
+    notifier.close_smtp_connections()
+    outcomes = []
+    with patch('smtplib.SMTP') as mock_smtp:
+        dispatcher = notifier.NotificationDispatcher({'notifications': {'email': email_config}})
+        dispatcher.dispatch("ERROR: digested", "Fix: Test", "digest_service", on_done=outcomes.append)
+        dispatcher.join()
+        assert outcomes == []
+
+        notifier.email_digest.flush("digest_service")
+        assert mock_smtp.return_value.sendmail.call_count == 1
+        assert outcomes == [True]
+        dispatcher.close()
+    notifier.close_smtp_connections()
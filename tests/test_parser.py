@@ -22,3 +22,31 @@ def test_parse_log_line():
 
 def test_parse_invalid_line():
     assert parser.parse_log_line("Just a random log line") is None
+
+def test_parse_entry_matches_per_line_parsing():
+    entry = "\n".join([
+        "2024-01-31 12:00:01 ERROR Traceback (most recent call last):",
+        '  File "/usr/lib/python3.11/site-packages/flask/app.py", line 1478, in wsgi_app',
+        '  File "app/views.py", line 42, in index',
+        "    at com.mycompany.app.App.main(App.java:15)",
+        "\t/home/user/project/main.go:24 +0x123",
+        "ZeroDivisionError: division by zero",
+    ])
+
+    result = parser.parse_entry(entry)
+    expected = [p for p in map(parser.parse_log_line, entry.strip().split('\n')) if p]
+
+    assert result['frames'] == expected
+    assert [frame['type'] for frame in result['frames']] == ['python', 'python', 'java', 'go']
+    assert result['best_match']['filepath'] == '/home/user/project/main.go'
+
+def test_parse_entry_prefers_project_frames():
+    entry = "\n".join([
+        'File "app/models.py", line 7, in save',
+        'File "/usr/lib/python3/dist-packages/sqlalchemy/orm.py", line 99, in flush',
+    ])
+    assert parser.parse_entry(entry)['best_match']['filepath'] == 'app/models.py'
+
+    library_only = 'File "/usr/lib/python3/dist-packages/sqlalchemy/orm.py", line 99, in flush'
+    assert parser.parse_entry(library_only)['best_match']['lineno'] == 99
+    assert parser.parse_entry("nothing to see here") == {'frames': [], 'best_match': None}
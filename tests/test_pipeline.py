@@ -0,0 +1,114 @@
+import time
+import threading
+from core import pipeline
+
+def test_fair_queue_round_robins_services():
+    fair_queue = pipeline.FairQueue(maxsize=10)
+    for i in range(3):
+        fair_queue.put("noisy", f"noisy-{i}")
+    fair_queue.put("quiet", "quiet-0")
+
+    order = [fair_queue.get() for _ in range(4)]
+    assert order == ["noisy-0", "quiet-0", "noisy-1", "noisy-2"]
+
+def test_fair_queue_shed_policies():
+    drop_oldest = pipeline.FairQueue(maxsize=2, shed_policy='drop_oldest')
+    drop_oldest.put("noisy", "a")
+    drop_oldest.put("noisy", "b")
+    assert drop_oldest.put("quiet", "c") == "a"
+    assert drop_oldest.depths() == {"noisy": 1, "quiet": 1}
+
+    drop_newest = pipeline.FairQueue(maxsize=1, shed_policy='drop_newest')
+    drop_newest.put("svc", "a")
+    assert drop_newest.put("svc", "b") == "b"
+    assert drop_newest.dropped == 1
+
+    blocking = pipeline.FairQueue(maxsize=1, shed_policy='block')
+    blocking.put("svc", "a")
+    producer = threading.Thread(target=blocking.put, args=("svc", "b"))
+    producer.start()
+    time.sleep(0.05)
+    assert producer.is_alive()
+    assert blocking.get() == "a"
+    producer.join(timeout=1)
+    assert blocking.get() == "b"
+    blocking.put("svc", "c")
+    assert not blocking.put_nowait("svc", "d")
+    assert blocking.get() == "c" and blocking.put_nowait("svc", "d")
+
+def test_pipeline_bounds_concurrent_analyses():
+    config = {'pipeline': {'analyze_workers': 2, 'parse_workers': 1}}
+    active = []
+    peak = []
+    lock = threading.Lock()
+    notified = []
+
+    def detect(entry, service_name):
+        return "ERROR" in entry, None
+
+    def analyze(entry, parsed_data, project_path):
+        with lock:
+            active.append(entry)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(entry)
+        return f"fix for {entry}"
+
+    def notify(entry, analysis, service_name):
+        notified.append((service_name, analysis))
+
+    analysis_pipeline = pipeline.AnalysisPipeline(config, detect, analyze, notify).start()
+    for i in range(6):
+        analysis_pipeline.submit(f"ERROR {i}", "web_server", ".")
+    analysis_pipeline.submit("INFO all good", "web_server", ".")
+    analysis_pipeline.stop()
+
+    assert max(peak) <= 2
+    assert len(notified) == 6
+    stats = analysis_pipeline.stats()
+    assert stats['analyzed'] == 6
+    assert stats['filtered'] == 1
+
+def test_batched_pipeline_groups_queued_entries():
+    config = {'pipeline': {'analyze_workers': 1, 'parse_workers': 1},
+              'ai_analysis': {'batching': {'enabled': True, 'max_errors': 4, 'window_seconds': 0.2}}}
+    batches = []
+    notified = []
+
+    def analyze_batch(items):
+        batches.append(len(items))
+        return [f"fix for {entry}" for entry, _, _ in items]
+
+    analysis_pipeline = pipeline.AnalysisPipeline(
+        config, lambda entry, service_name: (True, None), None,
+        lambda entry, analysis, service_name: notified.append(analysis),
+        analyze_batch=analyze_batch).start()
+    for i in range(6):
+        analysis_pipeline.submit(f"ERROR {i}", "web_server" if i % 2 else "db", ".")
+    analysis_pipeline.stop()
+
+    assert sum(batches) == 6 and max(batches) <= 4 and len(batches) < 6
+    assert sorted(notified) == [f"fix for ERROR {i}" for i in range(6)]
+    assert analysis_pipeline.stats()['analyzed'] == 6
+
+def test_detected_entries_skip_detect_and_go_through_select():
+    detected = []
+    analyzed = []
+
+    def detect(entry, service_name):
+        detected.append(entry)
+        return True, None
+
+    analysis_pipeline = pipeline.AnalysisPipeline(
+        {'pipeline': {'analyze_workers': 1}}, detect,
+        lambda entry, parsed_data, project_path: analyzed.append((entry, parsed_data)) or "fix",
+        lambda entry, analysis, service_name: None,
+        select=lambda entry, parsed_data: "known" not in entry).start()
+    analysis_pipeline.submit_detected("ERROR new", {'lineno': 3}, "web_server", ".")
+    analysis_pipeline.submit_detected("ERROR known", {'lineno': 4}, "web_server", ".")
+    analysis_pipeline.stop()
+
+    assert detected == []
+    assert analyzed == [("ERROR new", {'lineno': 3})]
+    assert analysis_pipeline.stats()['filtered'] == 1
@@ -0,0 +1,89 @@
+import os
+import time
+from core import poller
+
+class RecordingHandler:
+    def __init__(self, glob_paths=()):
+        self.events = []
+        self.glob_paths = set(glob_paths)
+
+    def get(self, path):
+        return None
+
+    def is_glob_path(self, path):
+        return path in self.glob_paths
+
+    def on_created(self, event):
+        self.events.append(('created', event.src_path))
+
+    def on_modified(self, event):
+        self.events.append(('modified', event.src_path))
+
+    def on_deleted(self, event):
+        self.events.append(('deleted', event.src_path))
+
+def test_changes_are_reported_as_events(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("existing\n")
+    missing = tmp_path / "later.log"
+    handler = RecordingHandler()
+    start = time.monotonic()
+    stat_poller = poller.StatPoller(handler, [str(log_file), str(missing)], min_interval=1, max_interval=8)
+
+    assert stat_poller.poll_once(now=start) == 0
+    assert stat_poller.poll_once(now=start + 10) == 2
+    assert handler.events == []
+
+    with open(log_file, "a") as f:
+        f.write("appended\n")
+    missing.write_text("hello\n")
+    stat_poller.poll_once(now=start + 20)
+    assert sorted(handler.events) == [('created', str(missing)), ('modified', str(log_file))]
+
+    # Rotation: a new file takes the path
+    handler.events.clear()
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text("new\n")
+    stat_poller.poll_once(now=start + 30)
+    assert handler.events == [('created', str(log_file))]
+
+def test_idle_files_back_off_and_active_files_speed_up(tmp_path):
+    paths = []
+    for i in range(200):
+        path = tmp_path / f"{i}.log"
+        path.write_text("")
+        paths.append(str(path))
+    start = time.monotonic()
+    stat_poller = poller.StatPoller(RecordingHandler(), paths, min_interval=0.25, max_interval=4, backoff=2)
+
+    # Simulate 60s of polling every 0.25s with no activity
+    checks = sum(stat_poller.poll_once(now=start + t * 0.25) for t in range(1, 241))
+    # Polling every file at min_interval would be 48000 checks; backing off to 4s is ~3000
+    assert checks < 4000
+
+    # A write is noticed within max_interval, and the file is then checked at min_interval again
+    with open(paths[0], "a") as f:
+        f.write("x\n")
+    handler = stat_poller.handler
+    t = 240
+    while not handler.events:
+        t += 1
+        stat_poller.poll_once(now=start + t * 0.25)
+    assert (t - 240) * 0.25 <= 4
+    assert stat_poller._files[paths[0]].interval == 0.25
+
+def test_globs_discover_and_forget_files(tmp_path):
+    pattern = str(tmp_path / "*.log")
+    handler = RecordingHandler()
+    start = time.monotonic()
+    stat_poller = poller.StatPoller(handler, globs=[pattern], discovery_interval=5)
+    new_file = tmp_path / "worker.log"
+    new_file.write_text("")
+    stat_poller.poll_once(now=start + 10)
+    assert handler.events == [('created', str(new_file))]
+
+    handler.glob_paths.add(str(new_file))
+    new_file.unlink()
+    stat_poller.poll_once(now=start + 20)
+    assert handler.events[-1] == ('deleted', str(new_file))
+    assert len(stat_poller) == 0
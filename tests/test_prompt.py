@@ -0,0 +1,77 @@
+from core import prompt
+
+def test_repeated_frames_are_collapsed():
+    lines = ["RecursionError: too deep"] + ['  File "app.py", line 3, in f', '    return f()'] * 500 + ["end"]
+    collapsed = prompt.collapse_repeats(lines)
+    assert collapsed == [
+        "RecursionError: too deep",
+        '  File "app.py", line 3, in f',
+        '    return f()',
+        "  [Previous 2 lines repeated 499 more times]",
+        "end",
+    ]
+    # Short repeats are left alone
+    assert prompt.collapse_repeats(["a", "a", "b"]) == ["a", "a", "b"]
+
+def test_library_frames_are_folded_and_project_frames_kept():
+    lines = [
+        "Traceback (most recent call last):",
+        '  File "/venv/lib/python3.11/site-packages/flask/app.py", line 1, in wsgi',
+        '    return self.app()',
+        '  File "/venv/lib/python3.11/site-packages/flask/app.py", line 2, in dispatch',
+        '    return view()',
+        '  File "app/views.py", line 7, in index',
+        '    user.name',
+        "AttributeError: 'NoneType' object has no attribute 'name'",
+    ]
+    folded = prompt.fold_library_frames(lines, ['site-packages'])
+    assert folded == [
+        "Traceback (most recent call last):",
+        "  ... 2 library frames omitted ...",
+        '  File "app/views.py", line 7, in index',
+        '    user.name',
+        "AttributeError: 'NoneType' object has no attribute 'name'",
+    ]
+
+def test_compact_entry_fits_the_budget_and_keeps_the_header():
+    entry = "\n".join(["java.lang.IllegalStateException: boom"] +
+                      [f"\tat com.example.Service.step{i}(Service.java:{i})" for i in range(2000)])
+    text, before, after = prompt.compact_entry(entry, 300, model='gpt-4o')
+    assert before > 300 >= after
+    assert after == prompt.count_tokens(text, 'gpt-4o')
+    lines = text.split("\n")
+    assert lines[0] == "java.lang.IllegalStateException: boom"
+    assert lines[-1] == "\tat com.example.Service.step1999(Service.java:1999)"
+    assert any("lines omitted" in line for line in lines)
+
+    # Small entries are untouched
+    assert prompt.compact_entry("ERROR boom\n", 300, model='gpt-4o')[0] == "ERROR boom"
+
+def test_build_prompt_budget_includes_the_code_context():
+    entry = "\n".join(["ValueError: bad"] + [f'  File "app.py", line {i}, in f{i}' for i in range(1000)])
+    context = "Here is the surrounding code:\n```python\nx = 1\n```\n\n"
+    text = prompt.build_prompt(entry, context, 'gpt-4o', {'max_tokens': 500})
+    assert prompt.count_tokens(text, 'gpt-4o') <= 500
+    assert "ValueError: bad" in text and context in text
+
+    assert entry in prompt.build_prompt(entry, None, 'gpt-4o', {'max_tokens': 0})
+
+def test_tiny_budgets_still_terminate():
+    entry = "ValueError: " + "x" * 400 + "\n" + "\n".join(f'  File "app.py", line {i}, in f{i}' for i in range(50))
+    for budget in (0, 1, 3, 20):
+        text, before, after = prompt.compact_entry(entry, budget, model='gpt-4o')
+        assert after <= budget
+        assert entry.startswith(text.split("\n")[0][:10])
+    assert "ValueError" in prompt.build_prompt(entry, None, 'gpt-4o', {'max_tokens': 20})
+
+def test_project_frames_outlive_other_lines_when_cutting():
+    lines = (["RuntimeError: boom"] + [f"DEBUG request state {i}" for i in range(300)] +
+             ['  File "/srv/app/views.py", line 7, in index', '    user.name',
+              '  File "/venv/lib/python3.11/site-packages/flask/app.py", line 1, in wsgi',
+              "RuntimeError: boom"])
+    text, before, after = prompt.compact_entry("\n".join(lines), 60, model='gpt-4o')
+    assert after <= 60
+    kept = text.split("\n")
+    assert kept[0] == "RuntimeError: boom"
+    assert '  File "/srv/app/views.py", line 7, in index' in kept and '    user.name' in kept
+    assert "site-packages" not in text
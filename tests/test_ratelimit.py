@@ -0,0 +1,50 @@
+from unittest.mock import MagicMock
+from core import ratelimit
+
+def test_token_bucket_rate_burst_and_pause():
+    bucket = ratelimit.TokenBucket(rate=2, burst=2)
+    start = bucket._updated
+    assert bucket.try_acquire(start) and bucket.try_acquire(start)
+    assert not bucket.try_acquire(start)
+    assert bucket.delay(start) == 0.5
+    assert bucket.try_acquire(start + 0.5)
+
+    bucket.pause(10, now=start + 1)
+    assert bucket.delay(start + 5) == 6
+    assert not bucket.try_acquire(start + 10.9)
+    assert bucket.try_acquire(start + 11.5)
+
+def test_acquire_gives_up_past_its_timeout():
+    bucket = ratelimit.TokenBucket(rate=1, burst=1)
+    assert bucket.acquire(timeout=0)
+    bucket.pause(60)
+    assert not bucket.acquire(timeout=0.1)
+
+def _response(headers=None, body=None):
+    response = MagicMock()
+    response.headers = headers or {}
+    response.json.return_value = body or {}
+    return response
+
+def test_retry_after_sources():
+    assert ratelimit.retry_after(_response({'Retry-After': '3'})) == 3
+    assert ratelimit.retry_after(_response({'X-RateLimit-Reset-After': '1.25'})) == 1.25
+    assert ratelimit.retry_after(_response({'X-RateLimit-Reset': '1000012'}), now=1000000) == 12
+    assert ratelimit.retry_after(_response({'Retry-After': 'Thu, 01 Jan 1970 00:01:40 GMT'}), now=40) == 60
+    assert ratelimit.retry_after(_response(body={'retry_after': 0.5})) == 0.5
+    assert ratelimit.retry_after(_response()) is None
+    assert ratelimit.retry_after(_response({'Retry-After': '999999'})) == ratelimit.MAX_RETRY_AFTER
+
+def test_backoff_is_jittered_and_capped():
+    delays = [ratelimit.backoff_delay(attempt, base_delay=1, max_delay=8) for attempt in range(1, 10) for _ in range(20)]
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert len(set(delays)) > 1
+    assert 5 <= ratelimit.backoff_delay(3, base_delay=1, retry_after=5) <= 6
+
+def test_limits_are_per_webhook():
+    first = ratelimit.for_webhook('discord', {'webhook_url': 'https://discord.test/api/webhooks/limits-a'})
+    assert first is ratelimit.for_webhook('discord', {'webhook_url': 'https://discord.test/api/webhooks/limits-a'})
+    assert first is not ratelimit.for_webhook('discord', {'webhook_url': 'https://discord.test/api/webhooks/limits-b'})
+    assert (first.rate, first.capacity) == (0.5, 5)
+    assert ratelimit.for_webhook('discord', {'webhook_url': 'https://x.test', 'rate_limit': False}) is None
+    assert ratelimit.for_webhook('email', {}) is None
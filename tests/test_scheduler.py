@@ -0,0 +1,61 @@
+import time
+import threading
+from core import scheduler
+
+def test_reschedule_pushes_deadline_back():
+    deadline_scheduler = scheduler.DeadlineScheduler()
+    fired = threading.Event()
+    fired_at = []
+
+    def callback():
+        fired_at.append(time.monotonic())
+        fired.set()
+
+    start = time.monotonic()
+    for _ in range(1000):
+        deadline_scheduler.schedule("log", 0.1, callback)
+    time.sleep(0.05)
+    deadline_scheduler.schedule("log", 0.1, callback)
+
+    assert fired.wait(1)
+    assert len(fired_at) == 1
+    assert fired_at[0] - start >= 0.15
+    # Rescheduling to a later deadline must not grow the heap
+    assert len(deadline_scheduler._heap) == 0
+    deadline_scheduler.stop()
+
+def test_earlier_deadline_and_cancel():
+    deadline_scheduler = scheduler.DeadlineScheduler()
+    fired = []
+    done = threading.Event()
+
+    deadline_scheduler.schedule("a", 5, lambda: fired.append("a-late"))
+    deadline_scheduler.schedule("a", 0.01, lambda: (fired.append("a"), done.set()))
+    deadline_scheduler.schedule("b", 0.01, lambda: fired.append("b"))
+    deadline_scheduler.cancel("b")
+
+    assert done.wait(1)
+    time.sleep(0.05)
+    assert fired == ["a"]
+    assert deadline_scheduler.pending() == 0
+    deadline_scheduler.stop()
+
+def test_schedule_once_keeps_first_deadline():
+    deadline_scheduler = scheduler.DeadlineScheduler()
+    done = threading.Event()
+
+    assert deadline_scheduler.schedule_once("k", 0.05, done.set)
+    assert not deadline_scheduler.schedule_once("k", 10, done.set)
+    assert done.wait(1)
+    deadline_scheduler.stop()
+
+def test_single_thread_for_many_keys():
+    deadline_scheduler = scheduler.DeadlineScheduler()
+    before = threading.active_count()
+    counter = []
+    for i in range(200):
+        deadline_scheduler.schedule(i, 0.01, lambda: counter.append(1))
+    assert threading.active_count() <= before + 1
+    time.sleep(0.2)
+    assert len(counter) == 200
+    deadline_scheduler.stop()
@@ -0,0 +1,47 @@
+from core.segmenter import RecordSegmenter
+
+TIMESTAMP = r'\d{4}-\d{2}-\d{2} '
+
+def test_start_patterns_split_records_and_keep_traces_together():
+    segmenter = RecordSegmenter(start_patterns=[TIMESTAMP])
+    lines = [
+        "2024-01-31 12:00:00 INFO starting\n",
+        "2024-01-31 12:00:01 ERROR boom\n",
+        "Traceback (most recent call last):\n",
+        '  File "app/main.py", line 3, in <module>\n',
+        "ZeroDivisionError: division by zero\n",
+        "2024-01-31 12:00:02 INFO recovered\n",
+    ]
+    completed = []
+    for line in lines:
+        completed.extend(segmenter.feed(line))
+
+    assert completed == [
+        "2024-01-31 12:00:00 INFO starting\n",
+        "2024-01-31 12:00:01 ERROR boom\nTraceback (most recent call last):\n"
+        '  File "app/main.py", line 3, in <module>\nZeroDivisionError: division by zero\n',
+    ]
+    assert segmenter.flush() == "2024-01-31 12:00:02 INFO recovered\n"
+    assert segmenter.flush() is None
+
+def test_continuation_patterns_override_start_patterns():
+    segmenter = RecordSegmenter(start_patterns=[r'\S'])
+    assert segmenter.feed("ERROR failed\n") == []
+    assert segmenter.feed("\tat com.example.Main.main(Main.java:14)\n") == []
+    assert segmenter.feed("Caused by: java.io.IOException\n") == []
+    assert segmenter.feed("INFO next\n") == ["ERROR failed\n\tat com.example.Main.main(Main.java:14)\nCaused by: java.io.IOException\n"]
+
+def test_max_entry_bytes_bounds_records():
+    segmenter = RecordSegmenter(max_entry_bytes=20)
+    completed = []
+    for _ in range(5):
+        completed.extend(segmenter.feed("0123456789\n"))
+
+    assert completed == ["0123456789\n"] * 4
+    assert all(len(record) <= 20 for record in completed)
+
+def test_legacy_mode_groups_until_flush():
+    segmenter = RecordSegmenter()
+    assert segmenter.feed("ERROR one\n") == []
+    assert segmenter.feed("ERROR two\n") == []
+    assert segmenter.flush() == "ERROR one\nERROR two\n"
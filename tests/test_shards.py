@@ -0,0 +1,73 @@
+import os
+import time
+import signal
+from core import shards
+
+def detect(entry, config, service_name):
+    return "ERROR" in entry, {'filepath': 'app.py', 'lineno': 1}
+
+def test_partition_spreads_by_weight_and_honors_pins():
+    services = [
+        {'name': 'a'}, {'name': 'b', 'shard_weight': 3}, {'name': 'c'},
+        {'name': 'd', 'shard': 1}, {'name': 'e'},
+    ]
+    partition = shards.partition_services(services, 2)
+    names = [sorted(service['name'] for service in shard) for shard in partition]
+    # b (weight 3) goes first onto shard 0; d is pinned to 1, which then takes a and c; e breaks the tie
+    assert names == [['b', 'e'], ['a', 'c', 'd']]
+    assert shards.partition_services(services, 2) == partition
+
+def test_shard_config_keeps_its_services_and_checkpoint_file():
+    config = {'monitoring': {'services': [{'name': 'a'}, {'name': 'b'}],
+                             'checkpoints': {'enabled': True, 'path': '.cache/checkpoints.json'}}}
+    worker_config = shards.shard_config(config, 1, [{'name': 'b'}])
+    assert worker_config['monitoring']['services'] == [{'name': 'b'}]
+    assert worker_config['monitoring']['checkpoints']['path'] == '.cache/checkpoints.shard1.json'
+    assert config['monitoring']['checkpoints']['path'] == '.cache/checkpoints.json'
+
+def _wait_for(coordinator, received, count, log_file, timeout=30):
+    """Keeps writing errors to `log_file` until `count` entries came through (the worker may still be starting)."""
+    deadline = time.monotonic() + timeout
+    while len(received) < count and time.monotonic() < deadline:
+        with open(log_file, 'a') as f:
+            f.write("ERROR boom\n")
+        coordinator.poll(0.2)
+    return len(received) >= count
+
+def test_workers_forward_triggered_entries_and_are_restarted(tmp_path):
+    logs = [tmp_path / "web.log", tmp_path / "db.log"]
+    for log in logs:
+        log.write_text("")
+    config = {'monitoring': {
+        'poll_interval': 0.05,
+        'trigger_levels': ['ERROR'],
+        'services': [{'name': log.stem, 'log_file': str(log), 'project_path': str(tmp_path)} for log in logs],
+    }}
+    received = []
+    coordinator = shards.ShardCoordinator(
+        config, detect, lambda *item: received.append(item), workers=2, restart_backoff=0.1
+    ).start()
+    try:
+        assert coordinator.alive() == 2
+        assert _wait_for(coordinator, received, 1, logs[0])
+        entry, parsed_data, service_name, project_path = received[0]
+        assert "ERROR boom" in entry and service_name == "web" and parsed_data['lineno'] == 1
+
+        # Info lines are dropped inside the worker
+        with open(logs[1], 'a') as f:
+            f.write("INFO fine\n")
+
+        killed = coordinator.shards[1]
+        os.kill(killed.process.pid, signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while killed.failures == 0 and time.monotonic() < deadline:
+            coordinator.poll(0.1)
+        assert killed.failures == 1
+
+        received.clear()
+        assert _wait_for(coordinator, received, 1, logs[1])
+        assert all(service_name == "db" for _, _, service_name, _ in received)
+        assert coordinator.alive() == 2
+    finally:
+        coordinator.stop()
+    assert coordinator.alive() == 0
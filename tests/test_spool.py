@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+from core import pipeline, spool
+
+def _segments(path):
+    return sorted(name for name in os.listdir(path) if name.startswith('segment-'))
+
+def test_unacknowledged_records_survive_a_restart(tmp_path):
+    first = spool.Spool(str(tmp_path))
+    ids = [first.append({'entry': f"ERROR {i}"}) for i in range(3)]
+    first.ack(ids[1])
+    assert first.read(ids[2]) == {'entry': "ERROR 2"}
+    first.close()
+
+    # A record torn by a crash mid-write is ignored
+    with open(tmp_path / _segments(tmp_path)[-1], 'ab') as f:
+        f.write(b'\x00\x00\x01\x00garbage')
+
+    second = spool.Spool(str(tmp_path))
+    assert second.pending() == [ids[0], ids[2]]
+    assert second.read(ids[0]) == {'entry': "ERROR 0"}
+    assert second.append({'entry': "ERROR 3"}) > ids[2]
+    second.close()
+
+def test_acknowledged_segments_are_deleted_and_old_ones_compacted(tmp_path):
+    store = spool.Spool(str(tmp_path), segment_bytes=200)
+    ids = [store.append({'entry': "x" * 60}) for i in range(8)]
+    assert len(_segments(tmp_path)) > 2
+
+    # Everything but the first record: its segment is mostly done, so it is compacted on the next roll
+    for record_id in ids[1:]:
+        store.ack(record_id)
+    for _ in range(3):
+        store.ack(store.append({'entry': "y" * 60}))
+    assert store.pending() == [ids[0]]
+    assert len(_segments(tmp_path)) <= 2
+    assert store.read(ids[0]) == {'entry': "x" * 60}
+    store.close()
+
+    reopened = spool.Spool(str(tmp_path))
+    assert reopened.pending() == [ids[0]]
+    reopened.ack(ids[0])
+    reopened.close()
+    assert spool.Spool(str(tmp_path)).pending() == []
+
+def _pipeline(config, analyze, notify, store):
+    return pipeline.AnalysisPipeline(config, lambda entry, service_name: (True, None), analyze, notify, spool=store).start()
+
+def test_pipeline_spills_over_the_high_water_mark_and_acks_delivered_alerts(tmp_path):
+    config = {'pipeline': {'analyze_workers': 1, 'spool': {'memory_high_water': 20}}}
+    store = spool.Spool(str(tmp_path))
+    release = threading.Event()
+    notified = []
+
+    def analyze(entry, parsed_data, project_path):
+        release.wait(5)
+        return f"fix for {entry}"
+
+    def notify(entry, analysis, service_name, on_done):
+        notified.append(analysis)
+        on_done(True)
+
+    analysis_pipeline = _pipeline(config, analyze, notify, store)
+    for i in range(10):
+        analysis_pipeline.submit(f"ERROR number {i}", "web" if i % 2 else "db", ".")
+    analysis_pipeline.ingest_queue.join()
+    stats = analysis_pipeline.stats()
+    assert stats['spilled'] >= 7 and stats['analyze_queue'] <= 2
+    assert stats['spooled'] == 10
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while len(notified) < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    analysis_pipeline.stop()
+    assert sorted(notified) == sorted(f"fix for ERROR number {i}" for i in range(10))
+    assert len(store) == 0
+    store.close()
+
+def test_undelivered_entries_are_replayed_on_the_next_start(tmp_path):
+    config = {'pipeline': {'analyze_workers': 1}}
+    store = spool.Spool(str(tmp_path))
+    analysis_pipeline = _pipeline(config, lambda entry, parsed_data, project_path: "fix",
+                                  lambda entry, analysis, service_name, on_done: on_done(entry != "ERROR lost"), store)
+    analysis_pipeline.submit("ERROR sent", "web", "/srv/web")
+    analysis_pipeline.submit("ERROR lost", "web", "/srv/web")
+    analysis_pipeline.stop()
+    store.close()
+
+    replayed = []
+    store = spool.Spool(str(tmp_path))
+    analysis_pipeline = _pipeline(
+        config, lambda entry, parsed_data, project_path: replayed.append((entry, project_path)) or "fix",
+        lambda entry, analysis, service_name, on_done: on_done(True), store)
+    analysis_pipeline.stop()
+    assert replayed == [("ERROR lost", "/srv/web")]
+    assert len(store) == 0
+    store.close()
+
+def test_refill_never_blocks_on_a_full_blocking_queue(tmp_path):
+    config = {'pipeline': {'analyze_workers': 1, 'parse_workers': 4, 'analyze_queue_size': 1, 'shed_policy': 'block'}}
+    store = spool.Spool(str(tmp_path))
+    notified = []
+
+    def notify(entry, analysis, service_name, on_done):
+        notified.append(entry)
+        on_done(True)
+
+    analysis_pipeline = _pipeline(config, lambda entry, parsed_data, project_path: "fix", notify, store)
+    for i in range(200):
+        analysis_pipeline.submit(f"ERROR {i}", f"service-{i % 3}", ".")
+    analysis_pipeline.ingest_queue.join()
+    deadline = time.monotonic() + 10
+    while len(notified) < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    analysis_pipeline.stop()
+    assert len(notified) == 200
+    assert len(store) == 0
+    store.close()
@@ -0,0 +1,47 @@
+from core.tailer import FileTailer
+
+def test_partial_lines_are_held_back(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_bytes(b"old line\n")
+    tailer = FileTailer(str(log_file)).open()
+    assert tailer.offset == 9
+
+    with open(log_file, "ab") as f:
+        f.write(b"first\nsecond half-wri")
+    assert tailer.read_lines() == [b"first\n"]
+    assert tailer.offset == 15
+
+    with open(log_file, "ab") as f:
+        f.write(b"tten\r\nthird\n")
+    lines = tailer.read_lines()
+    assert lines == [b"second half-written\r\n", b"third\n"]
+    assert tailer.decode(b"".join(lines)) == "second half-written\nthird\n"
+    assert tailer.offset == log_file.stat().st_size
+    assert tailer.read_lines() == []
+    tailer.close()
+
+def read_all(tailer):
+    lines = tailer.read_lines()
+    while tailer.has_more:
+        lines.extend(tailer.read_lines())
+    return lines
+
+def test_small_chunks_and_offsets(tmp_path):
+    log_file = tmp_path / "app.log"
+    lines = [f"line {i} {'x' * i}\n".encode() for i in range(50)]
+    log_file.write_bytes(b"".join(lines))
+
+    tailer = FileTailer(str(log_file), chunk_size=16).open(offset=0)
+    assert read_all(tailer) == lines
+    assert tailer.offset == log_file.stat().st_size
+
+    tailer.open(offset=len(lines[0]))
+    assert read_all(tailer) == lines[1:]
+    tailer.close()
+
+def test_decode_policy(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_bytes(b"")
+    tailer = FileTailer(str(log_file), encoding='utf-8', errors='replace')
+    assert tailer.decode(b"caf\xc3\xa9 \xff") == "café �"
+    assert tailer.read_lines() == []
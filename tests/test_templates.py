@@ -0,0 +1,73 @@
+from core import templates
+
+def test_similar_messages_share_a_template():
+    miner = templates.TemplateMiner()
+    first, reason = miner.observe("Connection to db-1 refused after 3 retries", now=0)
+    assert reason == 'new'
+    second, reason = miner.observe("Connection to db-2 refused after 5 retries", now=1)
+    assert reason is None
+    assert second is first
+    assert first.count == 2
+    assert first.text == "Connection to <*> refused after <*> retries"
+
+    _, reason = miner.observe("Disk quota exceeded for user alice", now=2)
+    assert reason == 'new'
+    assert len(miner) == 2
+
+def test_entries_are_masked_and_keyed_on_location():
+    miner = templates.TemplateMiner()
+    parsed = {'filepath': 'app/views.py', 'lineno': 42}
+    _, reason = miner.observe_entry("2024-01-31 12:00:01 ERROR request 17 failed\n  trace", parsed)
+    assert reason == 'new'
+    _, reason = miner.observe_entry("2024-01-31 12:05:09 ERROR request 99 failed\n  other trace", parsed)
+    assert reason is None
+    _, reason = miner.observe_entry("2024-01-31 12:05:09 ERROR request 99 failed", {'filepath': 'app/models.py', 'lineno': 7})
+    assert reason == 'new'
+
+def test_burst_is_one_analysis_and_spikes_are_reported_once():
+    miner = templates.TemplateMiner(window_seconds=60, baseline_windows=2, spike_factor=5, spike_min_count=10)
+    reasons = [miner.observe("ERROR queue full", now=1)[1] for _ in range(10000)]
+    assert reasons.count('new') == 1
+    assert reasons.count('spike') == 0
+
+    # A quiet period, then a sudden burst
+    for window in range(2, 5):
+        miner.observe("ERROR queue full", now=window * 60)
+    burst = [miner.observe("ERROR queue full", now=5 * 60 + 1)[1] for _ in range(50)]
+    assert burst.count('spike') == 1
+
+def test_least_recently_seen_templates_are_evicted():
+    miner = templates.TemplateMiner(max_templates=2)
+    miner.observe("alpha happened", now=0)
+    miner.observe("beta failed badly now", now=1)
+    miner.observe("alpha happened", now=2)
+    miner.observe("gamma went wrong here again today", now=3)
+    assert sorted(t.text for t in miner.templates()) == ["alpha happened", "gamma went wrong here again today"]
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "templates.json")
+    miner = templates.TemplateMiner(snapshot_path=path)
+    miner.observe("Connection to db-1 refused", now=0)
+    miner.observe("Connection to db-2 refused", now=1)
+    assert miner.snapshot() is True
+    assert miner.snapshot() is False
+
+    restored = templates.TemplateMiner(snapshot_path=path)
+    template, reason = restored.observe("Connection to db-3 refused", now=2)
+    assert reason is None
+    assert template.count == 3
+    assert template.text == "Connection to <*> refused"
+
+def test_different_exceptions_from_the_same_frame_get_their_own_templates():
+    miner = templates.TemplateMiner()
+    parsed = {'filepath': 'app/views.py', 'lineno': 42}
+    trace = '2024-01-31 12:00:01 ERROR request failed\nTraceback (most recent call last):\n  File "app/views.py", line 42, in index\n'
+    key_error, reason = miner.observe_entry(trace + "KeyError: 'user'", parsed)
+    assert reason == 'new'
+    assert "KeyError" in key_error.text
+    _, reason = miner.observe_entry(trace + "KeyError: 'account'", parsed)
+    assert reason is None
+    type_error, reason = miner.observe_entry(trace + "TypeError: 'NoneType' object is not subscriptable", parsed)
+    assert reason == 'new' and type_error is not key_error
+    assert templates.exception_line("ERROR x\njava.lang.IllegalStateException: boom\n\tat A.b(A.java:3)\n... 4 more") == \
+        "java.lang.IllegalStateException: boom"
@@ -0,0 +1,58 @@
+from core import triggers
+from core.segmenter import RecordSegmenter
+
+def test_levels_are_case_insensitive_and_traces_are_kept():
+    matcher = triggers.TriggerMatcher(['ERROR'])
+    assert matcher.matches("2024-01-31 error: disk full")
+    assert matcher.matches(b"2024-01-31 Error: disk full")
+    assert not matcher.matches("2024-01-31 INFO request done")
+    # No level, but a stack frame the parser would find
+    assert matcher.matches('2024-01-31 INFO retrying\n  File "app.py", line 3, in <module>\n')
+    assert matcher.matches("thread 'main' panicked at src/main.rs:4:5:\n")
+
+def test_level_field_ignores_keywords_in_the_message():
+    matcher = triggers.TriggerMatcher(['ERROR'], level_pattern=r'\| (?P<level>[A-Z]+) \|')
+    assert matcher.matches("2024-01-31 | ERROR | disk full")
+    assert not matcher.matches("2024-01-31 | INFO | 0 errors found")
+    assert not matcher.matches("2024-01-31 | INFO | done\n  ERROR in detail\n")
+    # Lines without the field fall back to keyword matching
+    assert matcher.matches("ERROR without a level field")
+
+def test_allow_and_deny_patterns():
+    matcher = triggers.TriggerMatcher(['ERROR'], allow_patterns=['OutOfMemory'], deny_patterns=['healthcheck'])
+    assert matcher.matches("2024-01-31 WARN OutOfMemory soon")
+    assert not matcher.matches("2024-01-31 ERROR healthcheck failed")
+
+def test_segmenter_drops_non_matching_records():
+    dropped = []
+    segmenter = RecordSegmenter(start_patterns=[r'\d{4}'], matcher=triggers.TriggerMatcher(['ERROR']),
+                                on_drop=lambda: dropped.append(1))
+    records = []
+    for line in [b"2024 INFO a\n", b"2024 ERROR b\n", b"  at x\n", b"2024 INFO c\n",
+                 b'  File "app.py", line 1, in f\n', b"2024 INFO d\n"]:
+        records.extend(segmenter.feed(line))
+    assert segmenter.flush() is None
+
+    assert records == [b"2024 ERROR b\n  at x\n", b'2024 INFO c\n  File "app.py", line 1, in f\n']
+    assert len(dropped) == 2
+
+def test_denied_records_are_not_buffered():
+    matcher = triggers.TriggerMatcher(['ERROR'], deny_patterns=['noisy'])
+    segmenter = RecordSegmenter(start_patterns=[r'\d{4}'], matcher=matcher)
+    segmenter.feed("2024 ERROR noisy\n")
+    segmenter.feed("  at x\n")
+    assert segmenter.pending_lines == 0
+    assert segmenter.has_pending()
+    assert segmenter.flush() is None
+
+def test_from_config_per_service_overrides():
+    monitoring = {'trigger_levels': ['ERROR'], 'triggers': {'deny_patterns': ['noisy']}}
+    service = {'trigger_levels': ['WARN'], 'triggers': {'allow_patterns': ['OOM']}}
+    matcher = triggers.from_config(monitoring, service)
+    assert matcher.matches("WARN slow query")
+    assert not matcher.matches("ERROR boom")
+    assert not matcher.matches("WARN noisy")
+    assert matcher.matches("INFO OOM")
+
+    assert triggers.from_config({}) is None
+    assert triggers.from_config({'trigger_levels': ['ERROR'], 'triggers': {'ingest_filter': False}}) is None